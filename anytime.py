@@ -0,0 +1,78 @@
+"""
+anytime.py
+Shared pieces of the anytime search API: snapshots of a search in
+progress and a cancellation token.
+
+MCTS.iter_search() and BoardSearcher.iter_search() are generators of
+Snapshot objects. The last snapshot (final=True) holds the answer; a
+caller that stops iterating early, or cancels the token, can play the
+best move of the latest snapshot instead.
+"""
+
+import time
+
+
+class CancelToken(object):
+    """Cancellation flag shared between a caller and a search, optionally
+    with a deadline. Calling the token returns True once it is cancelled,
+    so it can also serve as BoardSearcher.abort."""
+
+    def __init__(self, timeout=None):
+        self._cancelled = False
+        self.deadline = None if timeout is None else time.time() + timeout
+
+    def cancel(self):
+        self._cancelled = True
+
+    @property
+    def cancelled(self):
+        if not self._cancelled and self.deadline is not None and time.time() >= self.deadline:
+            self._cancelled = True
+        return self._cancelled
+
+    def __call__(self):
+        return self.cancelled
+
+
+class Snapshot(object):
+    """State of a search at one point in time.
+
+    best_move: the move to play now (a board move for MCTS, (row, col) for
+        BoardSearcher), or None if nothing is known yet.
+    score: value of best_move (MCTS: mean value in [-1, 1]; BoardSearcher:
+        evaluation score).
+    top: the best root moves as (move, visits, value) for MCTS or
+        (move, score) for BoardSearcher.
+    pv: principal variation starting with best_move.
+    nodes: playouts (MCTS) or nodes (BoardSearcher) so far.
+    depth: completed search depth (BoardSearcher), or the length of the pv.
+    elapsed: seconds since the search started.
+    final: True for the last snapshot of a search.
+    """
+
+    def __init__(self, best_move=None, score=None, top=(), pv=(), nodes=0, depth=0,
+                 elapsed=0.0, final=False):
+        self.best_move = best_move
+        self.score = score
+        self.top = list(top)
+        self.pv = list(pv)
+        self.nodes = nodes
+        self.depth = depth
+        self.elapsed = elapsed
+        self.final = final
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    def __repr__(self):
+        return 'Snapshot(best_move={}, score={}, pv={}, nodes={}, depth={}, final={})'.format(
+            self.best_move, self.score, self.pv, self.nodes, self.depth, self.final)
+
+
+def run(snapshots, callback):
+    """Drive a snapshot generator, passing every snapshot to callback;
+    return the last one."""
+    last = None
+    for last in snapshots:
+        callback(last)
+    return last
@@ -0,0 +1,272 @@
+"""
+arena.py
+Headless engine-vs-engine matches.
+
+Plays N games between two engine configurations in parallel worker
+processes, alternating colours, and prints each result as it comes in,
+followed by the win/draw/loss count, an Elo estimate with a 95% error bar
+and the time and nodes per move of each engine. With --sprt the match
+stops as soon as the sequential probability ratio test accepts one of the
+two hypotheses.
+
+An engine is given as name[:option=value,...], where name is random,
+mcts or searcher and the options are passed to RandomPlayer, MCTSPlayer
+or SearcherPlayer:
+
+    python arena.py mcts:run_time=None,n_playout=400 searcher:depth=2 \\
+        --games 20 --workers 2 --sprt 0 50
+
+--size plays on a larger board, e.g. --size 15.
+"""
+
+import argparse
+import ast
+import json
+import math
+import multiprocessing as mp
+import random
+import sys
+import time
+import warnings
+from game_board import Board
+from game_record import GameWriter, result_of
+from mcts import MCTSPlayer
+from player import RandomPlayer, SearcherPlayer
+warnings.filterwarnings("ignore")
+
+ENGINES = {
+    'random': RandomPlayer,
+    'mcts': MCTSPlayer,
+    'searcher': SearcherPlayer,
+}
+
+
+def parse_engine(spec):
+    """Return (name, options) of an engine spec like 'mcts:n_playout=400'."""
+    name, _, rest = spec.partition(':')
+    if name not in ENGINES:
+        raise ValueError('unknown engine {!r}, expected one of {}'.format(
+            name, ', '.join(sorted(ENGINES))))
+    options = {}
+    for item in filter(None, rest.split(',')):
+        key, _, value = item.partition('=')
+        try:
+            options[key] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            options[key] = value
+    return name, options
+
+
+def make_player(spec):
+    name, options = parse_engine(spec)
+    return ENGINES[name](**options)
+
+
+def play_game(task):
+    """Play one game in a worker process.
+
+    task is (index, spec1, spec2, engine1_black, opening, seed, size);
+    the opening is a list of moves played before the engines take over
+    on a size x size board.
+    Return a dict with the result from engine 1's point of view (1, 0.5
+    or 0) and the moves, seconds and nodes of each engine.
+    """
+    index, spec1, spec2, engine1_black, opening, seed, size = task
+    random.seed(seed)
+    engines = [make_player(spec1), make_player(spec2)]
+    board = Board(width=size, height=size)
+    board.init_board()
+    black, white = (0, 1) if engine1_black else (1, 0)
+    players = {1: black, 2: white}
+    moves = [0, 0]
+    seconds = [0.0, 0.0]
+    nodes = [0, 0]
+    for move in opening:
+        board.do_move(move)
+
+    end, winner = board.game_end()
+    forfeit = None
+    while not end:
+        engine = players[board.get_current_player()]
+        start = time.perf_counter()
+        move = engines[engine].get_action(board)
+        seconds[engine] += time.perf_counter() - start
+        moves[engine] += 1
+        nodes[engine] += getattr(engines[engine], 'nodes', 0)
+        if move not in board.availables:
+            # an illegal move loses the game
+            forfeit = engine
+            winner = 2 if board.get_current_player() == 1 else 1
+            break
+        board.do_move(move)
+        end, winner = board.game_end()
+
+    if winner == -1:
+        result = 0.5
+    else:
+        result = 1.0 if players[winner] == 0 else 0.0
+    return {
+        'game': index,
+        'engine1_black': engine1_black,
+        'result': result,
+        'plies': len(board.states),
+        'forfeit': forfeit,
+        'moves': moves,
+        'seconds': seconds,
+        'nodes': nodes,
+        'line': list(board.states),
+        'winner': winner,
+    }
+
+
+def random_openings(count, plies, seed, size=9):
+    """Return count random openings of plies moves in the 5x5 square at
+    the centre of a size x size board."""
+    rng = random.Random(seed)
+    span = range(size // 2 - 2, size // 2 + 3)
+    centre = [row * size + col for row in span for col in span]
+    return [rng.sample(centre, plies) for _ in range(count)]
+
+
+def elo(score):
+    """Return the Elo difference of an expected score in (0, 1)."""
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def score_stats(wins, draws, losses):
+    """Return (mean, variance) of the per-game score."""
+    n = wins + draws + losses
+    mean = (wins + 0.5 * draws) / n
+    variance = (wins * (1 - mean) ** 2 + draws * (0.5 - mean) ** 2
+                + losses * mean ** 2) / n
+    return mean, variance
+
+
+def elo_interval(wins, draws, losses):
+    """Return (elo, margin) with the 95% error margin of the estimate."""
+    n = wins + draws + losses
+    mean, variance = score_stats(wins, draws, losses)
+    margin = 1.96 * math.sqrt(variance / n)
+    low = elo(mean - margin)
+    high = elo(mean + margin)
+    return elo(mean), (high - low) / 2
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """Return the log-likelihood ratio of H1 (elo1) against H0 (elo0),
+    with the normal approximation of the per-game score."""
+    n = wins + draws + losses
+    mean, variance = score_stats(wins, draws, losses)
+    if variance == 0:
+        return 0.0
+    s0 = 1 / (1 + 10 ** (-elo0 / 400))
+    s1 = 1 / (1 + 10 ** (-elo1 / 400))
+    return n * (s1 - s0) * (2 * mean - s0 - s1) / (2 * variance)
+
+
+def sprt_bounds(alpha, beta):
+    """Return the (lower, upper) LLR bounds of the test."""
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[1],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='\n'.join(__doc__.strip().splitlines()[3:]))
+    parser.add_argument('engine1')
+    parser.add_argument('engine2')
+    parser.add_argument('--games', type=int, default=20,
+                        help='number of games, rounded up to an even number')
+    parser.add_argument('--workers', type=int, default=mp.cpu_count())
+    parser.add_argument('--opening', type=int, default=2,
+                        help='random plies before the engines play; both '
+                             'colours play each opening')
+    parser.add_argument('--seed', type=int, default=2018)
+    parser.add_argument('--size', type=int, default=9, help='board width and height')
+    parser.add_argument('--sprt', type=float, nargs=2, metavar=('ELO0', 'ELO1'),
+                        help='stop when the SPRT of ELO0 against ELO1 is decided')
+    parser.add_argument('--alpha', type=float, default=0.05)
+    parser.add_argument('--beta', type=float, default=0.05)
+    parser.add_argument('--jsonl', help='also write each game result to this file')
+    parser.add_argument('--record', help='append the games to this game record file')
+    args = parser.parse_args(argv)
+    if args.size < 5:
+        parser.error('--size must be at least 5')
+
+    names = [args.engine1, args.engine2]
+    for spec in names:
+        parse_engine(spec)
+    pairs = (args.games + 1) // 2
+    openings = random_openings(pairs, args.opening, args.seed, args.size)
+    tasks = []
+    for i in range(pairs * 2):
+        tasks.append((i, args.engine1, args.engine2, i % 2 == 0, openings[i // 2],
+                      args.seed + i, args.size))
+
+    wins = draws = losses = 0
+    moves = [0, 0]
+    seconds = [0.0, 0.0]
+    nodes = [0, 0]
+    decision = None
+    bounds = sprt_bounds(args.alpha, args.beta) if args.sprt else None
+    output = open(args.jsonl, 'w') if args.jsonl else None
+    record = GameWriter(args.record, args.size, args.size) if args.record else None
+    pool = mp.Pool(args.workers)
+    try:
+        for game in pool.imap_unordered(play_game, tasks):
+            if game['result'] == 1:
+                wins += 1
+            elif game['result'] == 0:
+                losses += 1
+            else:
+                draws += 1
+            for k in range(2):
+                moves[k] += game['moves'][k]
+                seconds[k] += game['seconds'][k]
+                nodes[k] += game['nodes'][k]
+            colour = 'black' if game['engine1_black'] else 'white'
+            print('game %3d  engine1 %-5s  %-4s  %2d plies   +%d =%d -%d'
+                  % (game['game'] + 1, colour, {1: '1-0', 0: '0-1'}.get(game['result'], '1/2'),
+                     game['plies'], wins, draws, losses))
+            sys.stdout.flush()
+            if output:
+                output.write(json.dumps(game) + '\n')
+                output.flush()
+            if record:
+                record.write(game['line'], result_of(game['winner']))
+            if bounds:
+                llr = sprt_llr(wins, draws, losses, *args.sprt)
+                if llr <= bounds[0]:
+                    decision = 'H0 accepted (elo <= %g)' % args.sprt[0]
+                elif llr >= bounds[1]:
+                    decision = 'H1 accepted (elo >= %g)' % args.sprt[1]
+                if decision:
+                    break
+    finally:
+        pool.terminate()
+        pool.join()
+        if output:
+            output.close()
+        if record:
+            record.close()
+
+    games = wins + draws + losses
+    print()
+    print('%s vs %s: %d games, +%d =%d -%d' % (names[0], names[1], games, wins, draws, losses))
+    if games:
+        rating, margin = elo_interval(wins, draws, losses)
+        print('Elo difference: %+.1f +/- %.1f' % (rating, margin))
+    if bounds:
+        llr = sprt_llr(wins, draws, losses, *args.sprt) if games else 0.0
+        print('SPRT: llr %.2f (%.2f, %.2f) %s' % (llr, bounds[0], bounds[1],
+                                                  decision or 'undecided'))
+    print('%-40s %10s %12s' % ('engine', 's/move', 'nodes/move'))
+    for k in range(2):
+        n = max(moves[k], 1)
+        print('%-40s %10.3f %12.0f' % (names[k], seconds[k] / n, nodes[k] / n))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""
+batch_analyze.py
+Analyse many stored positions in parallel and stream the results to JSONL.
+
+    python batch_analyze.py POSITIONS OUT.jsonl [--engine searcher|mcts]
+        [--depth 4] [--time S] [--n-playout N] [--workers W] [--size 9]
+
+POSITIONS is a text file with one position per line, optionally preceded
+by an id and a tab; blank lines and lines starting with # are skipped.
+A position is either
+
+    a move list from the empty board, moves as numbers (row * size + col)
+    or GUI coordinates (E5 is row E, column 5): "40,41,31" or "E5 E6 D5"
+
+    a board of size * size cells, row by row, . for empty, X for black and O for
+    white, with / or spaces allowed between rows and an optional side to
+    move at the end ("x" or "o"; otherwise it follows from the counts)
+
+or POSITIONS is a game record file (.gmr, see game_record.py); then every
+position of every game is analysed, with the move actually played. The
+board is 9x9 unless --size gives another size; a game record file is read
+at its own size.
+
+Every result is written as soon as it is done, one JSON object per line:
+the id, the best move as [row, col] and as a number, the score, the
+principal variation, the depth, nodes and time, and engine statistics.
+Positions whose id is already in OUT.jsonl are skipped, so an interrupted
+run picks up where it stopped.
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+import warnings
+from anytime import CancelToken
+from game_board import Board
+
+CELLS = {'.': 0, 'X': 1, 'O': 2}
+
+_engine = None
+
+
+def parse_moves(text, size=9):
+    """Return the moves of a move list like "40,41" or "E5 E6" on a size x
+    size board."""
+    moves = []
+    for token in text.replace(',', ' ').split():
+        if token.isdigit():
+            move = int(token)
+        else:
+            row = ord(token[0].upper()) - ord('A')
+            col = int(token[1:]) - 1
+            if not (0 <= row < size and 0 <= col < size):
+                raise ValueError('bad coordinate %s' % token)
+            move = row * size + col
+        if not 0 <= move < size * size or move in moves:
+            raise ValueError('bad move %s' % token)
+        moves.append(move)
+    return moves
+
+
+def parse_position(text, size=9):
+    """Return (grid, side to move, last move, moves) of a position line on
+    a size x size board; last move is -1 and moves is None for a board
+    diagram."""
+    text = text.strip()
+    cells = [ch for ch in text.upper() if ch in CELLS]
+    if len(cells) >= size * size:
+        stones = cells[:size * size]
+        grid = [[CELLS[ch] for ch in stones[row * size:(row + 1) * size]]
+                for row in range(size)]
+        black = sum(line.count(1) for line in grid)
+        white = sum(line.count(2) for line in grid)
+        side = 1 if black == white else 2
+        tail = text.split()[-1].lower() if text.split() else ''
+        if tail in ('x', 'o'):
+            side = 1 if tail == 'x' else 2
+        return grid, side, -1, None
+    moves = parse_moves(text, size)
+    grid = [[0] * size for _ in range(size)]
+    for ply, move in enumerate(moves):
+        grid[move // size][move % size] = 1 if ply % 2 == 0 else 2
+    return grid, 1 if len(moves) % 2 == 0 else 2, moves[-1] if moves else -1, moves
+
+
+def read_positions(path):
+    """Yield (id, position text, played move or None) for the positions of
+    a text or .gmr file."""
+    if path.endswith('.gmr'):
+        from game_record import GameReader
+        with GameReader(path) as reader:
+            for game, (moves, _) in enumerate(reader):
+                moves = list(bytearray(moves))
+                for ply in range(len(moves)):
+                    yield ('g%d:%d' % (game, ply), ','.join(map(str, moves[:ply])),
+                           moves[ply])
+        return
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.rstrip('\n')
+            if not line.strip() or line.lstrip().startswith('#'):
+                continue
+            if '\t' in line:
+                position_id, text = line.split('\t', 1)
+            else:
+                position_id, text = 'line%d' % number, line
+            yield position_id, text, None
+
+
+def done_ids(path):
+    """Return the ids already in the output file, cutting off a last line
+    left incomplete by an interruption."""
+    ids = set()
+    if not os.path.exists(path):
+        return ids
+    good = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                ids.add(json.loads(line.decode())['id'])
+            except (ValueError, KeyError):
+                break
+            good += len(line)
+    if good != os.path.getsize(path):
+        with open(path, 'r+b') as f:
+            f.truncate(good)
+    return ids
+
+
+class Analyzer(object):
+    """One engine with its budget and board size, as set up in a worker
+    process."""
+
+    def __init__(self, engine='searcher', depth=4, time_limit=None, n_playout=2000, size=9):
+        warnings.filterwarnings("ignore")
+        self.engine = engine
+        self.depth = depth
+        self.time_limit = time_limit
+        self.size = size
+        if engine == 'mcts':
+            from mcts import MCTSPlayer
+            self.player = MCTSPlayer(n_playout=n_playout,
+                                     run_time=time_limit if time_limit else None)
+        else:
+            from board_searcher import BoardSearcher
+            self.searcher = BoardSearcher(rows=size, cols=size)
+
+    def analyse(self, grid, side, last_move):
+        token = CancelToken(self.time_limit) if self.time_limit else None
+        if self.engine == 'mcts':
+            return self._mcts(grid, side, last_move, token)
+        return self._searcher(grid, side, token)
+
+    def _searcher(self, grid, side, token):
+        searcher = self.searcher
+        searcher.board = [list(line) for line in grid]
+        before = searcher.evaluator.counters()
+        snapshot = None
+        for snapshot in searcher.iter_search(side, self.depth, token):
+            pass
+        after = searcher.evaluator.counters()
+        cutoffs = sum(searcher.cutoffs.values())
+        stats = {
+            'ply_nodes': list(searcher.ply_nodes),
+            'qnodes': searcher.qnodes,
+            'cutoffs': cutoffs,
+            'first_move_cutoff_rate': searcher.cutoffs.get(0, 0) / cutoffs if cutoffs else 0.0,
+            'eval_calls': after['calls'] - before['calls'],
+        }
+        row, col = snapshot.best_move
+        return ([row, col], snapshot.score, [list(m) for m in snapshot.pv], snapshot.depth,
+                snapshot.nodes, stats)
+
+    def _mcts(self, grid, side, last_move, token):
+        size = self.size
+        board = Board(width=size, height=size)
+        board.set_position(grid, side, last_move)
+        player = self.player
+        mcts = player.mcts
+        mcts.update_with_move(-1)
+        snapshot = None
+        for snapshot in mcts.iter_search(board, interval=3600, token=token):
+            pass
+        mcts.update_with_move(-1)
+        move = snapshot.best_move
+        stats = {
+            'playouts': snapshot.nodes,
+            'top': [[m, visits, value] for m, visits, value in snapshot.top],
+        }
+        return ([move // size, move % size], snapshot.score,
+                [[m // size, m % size] for m in snapshot.pv], snapshot.depth,
+                snapshot.nodes, stats)
+
+
+def _init_worker(options):
+    global _engine
+    _engine = Analyzer(**options)
+
+
+def _analyse(task):
+    position_id, text, played = task
+    result = {'id': position_id, 'position': text}
+    if played is not None:
+        result['played'] = played
+    size = _engine.size
+    start = time.perf_counter()
+    try:
+        grid, side, last_move, _ = parse_position(text, size)
+        board = Board(width=size, height=size)
+        board.set_position(grid, side, last_move)
+        won, winner = board.has_a_winner()
+        if won:
+            raise ValueError('the game is over, %s has five' % 'XO'[winner - 1])
+        if not board.availables:
+            raise ValueError('the board is full')
+        best, score, pv, depth, nodes, stats = _engine.analyse(grid, side, last_move)
+        result.update({
+            'side': side,
+            'best_move': best,
+            'move': best[0] * size + best[1],
+            'score': score,
+            'pv': pv,
+            'depth': depth,
+            'nodes': nodes,
+            'stats': stats,
+        })
+    except ValueError as error:
+        result['error'] = str(error)
+    except Exception as error:
+        # recorded like a bad line rather than stopping the whole batch
+        result['error'] = '%s: %s' % (type(error).__name__, error)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[1],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='\n'.join(__doc__.strip().splitlines()[2:]))
+    parser.add_argument('positions')
+    parser.add_argument('output')
+    parser.add_argument('--engine', choices=('searcher', 'mcts'), default='searcher')
+    parser.add_argument('--depth', type=int, default=4, help='searcher depth (default 4)')
+    parser.add_argument('--time', type=float, help='seconds per position')
+    parser.add_argument('--n-playout', type=int, default=2000,
+                        help='MCTS playouts per position when --time is not given')
+    parser.add_argument('--workers', type=int, default=mp.cpu_count())
+    parser.add_argument('--size', type=int,
+                        help='board width and height of the positions (default 9, '
+                             'or that of a game record file)')
+    args = parser.parse_args()
+
+    size = args.size or 9
+    if args.positions.endswith('.gmr'):
+        from game_record import GameReader
+        with GameReader(args.positions) as reader:
+            if reader.width != reader.height:
+                parser.error('%s is not a square board' % args.positions)
+            if args.size and args.size != reader.width:
+                parser.error('%s is a %dx%d record' % (args.positions, reader.width,
+                                                        reader.width))
+            size = reader.width
+    if size < 5:
+        parser.error('--size must be at least 5')
+
+    skip = done_ids(args.output)
+    tasks = [task for task in read_positions(args.positions) if task[0] not in skip]
+    if skip:
+        print('resuming: %d positions done, %d to go' % (len(skip), len(tasks)))
+    options = {'engine': args.engine, 'depth': args.depth, 'time_limit': args.time,
+               'n_playout': args.n_playout, 'size': size}
+
+    start = time.time()
+    count = errors = 0
+    pool = mp.Pool(args.workers, initializer=_init_worker, initargs=(options,))
+    try:
+        with open(args.output, 'a') as output:
+            for result in pool.imap_unordered(_analyse, tasks):
+                output.write(json.dumps(result) + '\n')
+                output.flush()
+                count += 1
+                errors += 'error' in result
+                if count % 50 == 0 or count == len(tasks):
+                    elapsed = time.time() - start
+                    sys.stdout.write('\r%d/%d positions, %.2f positions/s' % (
+                        count, len(tasks), count / elapsed if elapsed else 0.0))
+                    sys.stdout.flush()
+    finally:
+        pool.terminate()
+        pool.join()
+    elapsed = time.time() - start
+    print('\n%d positions (%d errors) in %.1f s, %.2f positions/s with %d workers'
+          % (count, errors, elapsed, count / elapsed if elapsed else 0.0, args.workers))
+
+
+if __name__ == '__main__':
+    main()
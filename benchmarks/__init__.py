@@ -0,0 +1,4 @@
+"""
+Benchmarks for the search engines. Run the scripts from the repository
+root as modules, e.g. python -m benchmarks.bench_solver
+"""
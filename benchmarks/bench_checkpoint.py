@@ -0,0 +1,110 @@
+"""
+bench_checkpoint.py
+Size and speed of tree_checkpoint on a large synthetic MCTS tree: saving
+it, opening the file, finding a position and restoring its subtree, for
+several visit thresholds.
+
+The tree is random but shaped like an MCTS tree: the visits of a node are
+split among its children with a strong preference for the first few, and
+a node is expanded once it has been visited.
+
+    python -m benchmarks.bench_checkpoint [--visits V] [--dir DIR]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from game_board import Board
+from mcts import TreeNode
+from tree_checkpoint import TreeCheckpoint, write_tree
+
+
+def make_tree(visits, rng, branching=20, moves=81):
+    """Return (root, nodes) of a random tree whose root has visits visits."""
+    root = TreeNode(None, 1.0)
+    root._n_visits = visits
+    count = 1
+    stack = [(root, visits, [])]
+    while stack:
+        node, n, used = stack.pop()
+        if n < 2:
+            continue
+        free = [m for m in range(moves) if m not in used]
+        children = rng.sample(free, min(branching, len(free)))
+        weights = [1.0 / (k + 1) ** 2 for k in range(len(children))]
+        total = sum(weights)
+        left = n - 1
+        for move, weight in zip(children, weights):
+            child = TreeNode(node, weight / total)
+            child._n_visits = int(left * weight / total)
+            child._Q = rng.uniform(-1, 1)
+            node._children[move] = child
+            count += 1
+            stack.append((child, child._n_visits, used + [move]))
+    return root, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of tree_checkpoint')
+    parser.add_argument('--visits', type=int, default=200000, help='visits at the root')
+    parser.add_argument('--dir', help='directory for the files (default: a temporary one)')
+    parser.add_argument('--seed', type=int, default=2018)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    root, count = make_tree(args.visits, rng)
+    print('tree of %d nodes, %d visits, built in %.1f s' % (
+        count, args.visits, time.perf_counter() - start))
+
+    board = Board()
+    board.init_board()
+    # the position two plies down the most visited line
+    line = []
+    node = root
+    for _ in range(2):
+        move, node = max(node._children.items(), key=lambda item: item[1]._n_visits)
+        line.append(move)
+    deep = Board()
+    deep.init_board()
+    for move in line:
+        deep.do_move(move)
+
+    directory = args.dir or tempfile.mkdtemp()
+    path = os.path.join(directory, 'bench.gmt')
+    try:
+        print('%10s %10s %9s %9s %9s %10s %10s %10s' % (
+            'min visits', 'nodes', 'MB', 'save s', 'open ms', 'find ms', 'root s', 'deep s'))
+        for min_visits in (1, 4, 16, 64):
+            start = time.perf_counter()
+            saved = write_tree(path, root, board.get_2d_board(), board.get_current_player(),
+                               min_visits)
+            save = time.perf_counter() - start
+
+            start = time.perf_counter()
+            checkpoint = TreeCheckpoint(path)
+            opened = time.perf_counter() - start
+            start = time.perf_counter()
+            index = checkpoint.find(deep.get_2d_board(), deep.get_current_player())
+            find = time.perf_counter() - start
+            start = time.perf_counter()
+            checkpoint.tree(0)
+            load_root = time.perf_counter() - start
+            start = time.perf_counter()
+            subtree = checkpoint.tree(index)
+            load_deep = time.perf_counter() - start
+            assert subtree._n_visits == node._n_visits
+            del checkpoint
+            print('%10d %10d %9.1f %9.2f %9.2f %10.2f %10.2f %10.3f' % (
+                min_visits, saved, os.path.getsize(path) / 1e6, save, opened * 1e3,
+                find * 1e3, load_root, load_deep))
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
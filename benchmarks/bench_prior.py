@@ -0,0 +1,85 @@
+"""
+bench_prior.py
+The MCTS priors compared: GoBoardUtil.minimax_policy_value, which
+evaluates the board once per empty point, and the fitted pattern weights
+of pattern_policy. For each board size it prints the cost of one call
+(one expansion), the MCTS playouts per second with each prior, and how
+often the most likely pattern move is a best move of the evaluator, or
+one of its top 5 moves is.
+
+    python -m benchmarks.bench_prior [--sizes 9 15 19] [--positions N]
+
+Playing strength is measured with arena.py and benchmarks.tactics, e.g.
+
+    python arena.py mcts:prior=pattern,run_time=1 mcts:run_time=1 --games 20
+"""
+
+import argparse
+import time
+import warnings
+from board_evaluator import BoardEvaluator
+from board_util import GoBoardUtil
+from game_board import Board
+from mcts import MCTSPlayer
+from pattern_policy import PatternPolicy, agreement, sample_positions
+from benchmarks.positions import random_positions
+
+warnings.filterwarnings("ignore")
+
+
+def time_call(fn, boards, min_time=0.2):
+    """Return the seconds per call of fn over boards."""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        for board in boards:
+            fn(board)
+        calls += len(boards)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls
+
+
+def playout_rate(prior, boards, seconds):
+    """Return the MCTS playouts per second with prior on boards."""
+    playouts = 0
+    for board in boards:
+        player = MCTSPlayer(run_time=seconds / len(boards), solver_mode=None, prior=prior)
+        player.mcts.get_move(board)
+        playouts += player.mcts.playouts
+    return playouts / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cost and accuracy of the MCTS priors')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[9, 15, 19])
+    parser.add_argument('--positions', type=int, default=200,
+                        help='evaluator-labelled positions for the agreement')
+    parser.add_argument('--seconds', type=float, default=2.0,
+                        help='MCTS time per prior and size')
+    args = parser.parse_args()
+
+    policy = PatternPolicy.load()
+    print('%5s %12s %12s %8s %13s %13s %8s %8s' % (
+        'size', 'minimax us', 'pattern us', 'speedup', 'minimax po/s', 'pattern po/s',
+        'best', 'top 5'))
+    for size in args.sizes:
+        boards = []
+        for grid, turn in random_positions(6, stones=10, seed=2018, size=size):
+            board = Board(width=size, height=size)
+            board.set_position(grid, turn)
+            boards.append(board)
+        evaluator = BoardEvaluator(rows=size, cols=size)
+        minimax = time_call(lambda board: GoBoardUtil.minimax_policy_value(board, evaluator),
+                            boards)
+        pattern = time_call(policy, boards)
+        rates = [playout_rate(prior, boards[:2], args.seconds)
+                 for prior in ('minimax', 'pattern')]
+        best, in_top = agreement(policy, sample_positions(args.positions, seed=7, size=size))
+        print('%5s %12.0f %12.0f %7.0fx %13.0f %13.0f %7.1f%% %7.1f%%' % (
+            '%dx%d' % (size, size), minimax * 1e6, pattern * 1e6, minimax / pattern,
+            rates[0], rates[1], best * 100, in_top * 100))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+bench_records.py
+Size and speed of game_record on a synthetic database: writing games,
+building the position index, and looking positions up.
+
+Games are random sequences of distinct moves, which is enough for timing;
+lookups use prefixes of stored games in a random orientation, so every
+one of them has at least one hit.
+
+    python -m benchmarks.bench_records [--games N] [--lookups L] [--dir DIR]
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from game_record import GameWriter, GameDatabase, symmetries, BLACK_WIN, WHITE_WIN, DRAW
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of game_record')
+    parser.add_argument('--games', type=int, default=200000)
+    parser.add_argument('--lookups', type=int, default=2000)
+    parser.add_argument('--dir', help='directory for the files (default: a temporary one)')
+    parser.add_argument('--seed', type=int, default=2018)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    directory = args.dir or tempfile.mkdtemp()
+    path = os.path.join(directory, 'bench.gmr')
+    try:
+        lines = []
+        start = time.perf_counter()
+        with GameWriter(path) as writer:
+            for _ in range(args.games):
+                moves = rng.sample(range(81), rng.randint(20, 60))
+                writer.write(moves, rng.choice((BLACK_WIN, WHITE_WIN, DRAW)))
+                if len(lines) < 1000:
+                    lines.append(moves)
+        write = time.perf_counter() - start
+
+        db = GameDatabase(path)
+        start = time.perf_counter()
+        db.build_index()
+        build = time.perf_counter() - start
+        db.close()
+
+        start = time.perf_counter()
+        db = GameDatabase(path)
+        load = time.perf_counter() - start
+
+        sym = symmetries(9, 9)
+        queries = []
+        for _ in range(args.lookups):
+            line = rng.choice(lines)
+            s = rng.randrange(8)
+            queries.append([int(sym[s][m]) for m in line[:rng.randint(1, 12)]])
+        start = time.perf_counter()
+        hits = sum(len(db.games(q)[0]) for q in queries)
+        lookup = time.perf_counter() - start
+        start = time.perf_counter()
+        for q in queries[:200]:
+            db.continuations(q[:1])
+        opening = time.perf_counter() - start
+        positions = len(db.index.entries)
+        db.close()
+
+        size = os.path.getsize(path)
+        index_size = os.path.getsize(path + '.idx.npy') + os.path.getsize(path + '.hash.npy')
+        print('%d games, %d positions' % (args.games, positions))
+        print('records      %8.1f MB  %6.1f bytes/game' % (size / 1e6, size / float(args.games)))
+        print('index        %8.1f MB' % (index_size / 1e6))
+        print('write        %8.2f s   %8.0f games/s' % (write, args.games / write))
+        print('build index  %8.2f s   %8.0f positions/s' % (build, positions / build))
+        print('open         %8.3f s' % load)
+        print('lookup       %8.1f us  (%.1f hits per lookup)' % (
+            lookup / len(queries) * 1e6, hits / float(len(queries))))
+        print('first-move statistics %8.1f ms' % (opening / 200 * 1e3))
+    finally:
+        if not args.dir:
+            shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+bench_searcher.py
+Compare principal variation search against the plain alpha-beta
+BoardSearcher at equal depth: nodes, time and best move per position.
+
+    python -m benchmarks.bench_searcher [--depth D] [--positions N]
+"""
+
+import argparse
+import time
+from board_searcher import BoardSearcher
+from benchmarks.positions import random_positions
+
+
+def run(board, turn, depth, pvs):
+    searcher = BoardSearcher()
+    searcher.solver_mode = None
+    searcher.use_pvs = pvs
+    # PVS at every depth, not only from BoardSearcher.pvs_depth on
+    searcher.pvs_depth = 1
+    searcher.board = [list(row) for row in board]
+    start = time.perf_counter()
+    score, row, col = searcher.search(turn, depth)
+    return (row, col), score, searcher.nodes, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--positions', type=int, default=10)
+    parser.add_argument('--stones', type=int, default=8)
+    args = parser.parse_args()
+
+    total = {False: [0, 0.0], True: [0, 0.0]}
+    same = 0
+    positions = random_positions(args.positions, args.stones)
+    print('%3s  %-8s %8s %9s  %-8s %8s %9s  %s' % (
+        '#', 'plain', 'nodes', 'ms', 'pvs', 'nodes', 'ms', 'same'))
+    for n, (board, turn) in enumerate(positions):
+        results = {}
+        for pvs in (False, True):
+            move, score, nodes, elapsed = run(board, turn, args.depth, pvs)
+            results[pvs] = (move, score, nodes, elapsed)
+            total[pvs][0] += nodes
+            total[pvs][1] += elapsed
+        plain, fast = results[False], results[True]
+        match = plain[0] == fast[0] and plain[1] == fast[1]
+        same += match
+        print('%3d  %-8s %8d %9.1f  %-8s %8d %9.1f  %s' % (
+            n, plain[0], plain[2], plain[3] * 1000,
+            fast[0], fast[2], fast[3] * 1000, 'yes' if match else 'NO'))
+    print('depth %d: nodes %d -> %d (%.1f%% fewer), time %.2fs -> %.2fs, '
+          'identical best move and score on %d/%d positions' % (
+              args.depth, total[False][0], total[True][0],
+              100.0 * (1 - total[True][0] / max(total[False][0], 1)),
+              total[False][1], total[True][1], same, len(positions)))
+
+
+if __name__ == '__main__':
+    main()
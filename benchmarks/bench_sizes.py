@@ -0,0 +1,85 @@
+"""
+bench_sizes.py
+Cost per move at each board size: one evaluation, the searcher at each
+depth and MCTS playouts, on seeded openings placed around the centre.
+Use it to choose the depth or time budget for a board size.
+
+    python -m benchmarks.bench_sizes [--sizes 9 15 19] [--depth 3]
+        [--positions N] [--stones S] [--playouts P]
+"""
+
+import argparse
+import time
+import warnings
+from board_evaluator import BoardEvaluator
+from board_searcher import BoardSearcher
+from game_board import Board
+from mcts import MCTSPlayer
+from benchmarks.positions import random_positions
+
+warnings.filterwarnings("ignore")
+
+
+def time_evaluate(positions, repeat=20):
+    """Return the seconds per evaluate() call."""
+    evaluator = BoardEvaluator()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for board, turn in positions:
+            evaluator.evaluate(board, turn)
+    return (time.perf_counter() - start) / (repeat * len(positions))
+
+
+def time_search(positions, depth):
+    """Return (seconds, nodes) per move of a depth-limited search."""
+    seconds = nodes = 0
+    for board, turn in positions:
+        searcher = BoardSearcher()
+        searcher.board = [list(row) for row in board]
+        start = time.perf_counter()
+        searcher.search(turn, depth)
+        seconds += time.perf_counter() - start
+        nodes += searcher.nodes + searcher.qnodes
+    return seconds / len(positions), nodes / float(len(positions))
+
+
+def time_mcts(positions, playouts):
+    """Return the seconds per MCTS playout."""
+    seconds = 0
+    for board, turn in positions:
+        size = len(board)
+        game = Board(width=size, height=size)
+        game.set_position(board, turn)
+        player = MCTSPlayer(n_playout=playouts, run_time=None, solver_mode=None)
+        start = time.perf_counter()
+        player.mcts.get_move(game)
+        seconds += time.perf_counter() - start
+    return seconds / (playouts * len(positions))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search cost per board size')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[9, 15, 19])
+    parser.add_argument('--depth', type=int, default=3, help='deepest searcher depth')
+    parser.add_argument('--positions', type=int, default=6)
+    parser.add_argument('--stones', type=int, default=8)
+    parser.add_argument('--playouts', type=int, default=200)
+    args = parser.parse_args()
+
+    header = '%5s %10s' % ('size', 'eval us')
+    for depth in range(1, args.depth + 1):
+        header += ' %12s %9s' % ('depth%d ms' % depth, 'nodes')
+    header += ' %12s' % 'playout ms'
+    print(header)
+    for size in args.sizes:
+        positions = random_positions(args.positions, args.stones, seed=2018, size=size)
+        line = '%5s %10.1f' % ('%dx%d' % (size, size), time_evaluate(positions) * 1e6)
+        for depth in range(1, args.depth + 1):
+            seconds, nodes = time_search(positions, depth)
+            line += ' %12.1f %9.0f' % (seconds * 1e3, nodes)
+        line += ' %12.2f' % (time_mcts(positions, args.playouts) * 1e3)
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
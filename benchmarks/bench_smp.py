@@ -0,0 +1,46 @@
+"""
+bench_smp.py
+Speedup curve of the Lazy SMP searcher: time to a result of the requested
+depth on a fixed position set, for several worker counts.
+
+    python -m benchmarks.bench_smp [--depth D] [--positions N] [--workers 1 2 4 8]
+"""
+
+import argparse
+import os
+import time
+from lazy_smp import LazySMPSearcher
+from benchmarks.positions import random_positions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--depth', type=int, default=2)
+    parser.add_argument('--positions', type=int, default=6)
+    parser.add_argument('--stones', type=int, default=10)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    positions = random_positions(args.positions, args.stones)
+    print('%d CPUs, depth %d, %d positions' % (os.cpu_count(), args.depth, len(positions)))
+    print('%7s %9s %9s %8s' % ('workers', 'seconds', 'nodes', 'speedup'))
+    base = None
+    for workers in args.workers:
+        with LazySMPSearcher(workers) as searcher:
+            # start the pool outside the timing
+            searcher.search(positions[0][0], positions[0][1], 1)
+            searcher.clear()
+            nodes = 0
+            start = time.perf_counter()
+            for board, turn in positions:
+                searcher.search(board, turn, args.depth)
+                nodes += searcher.nodes
+                searcher.clear()
+            elapsed = time.perf_counter() - start
+        if base is None:
+            base = elapsed
+        print('%7d %9.2f %9d %8.2f' % (workers, elapsed, nodes, base / elapsed))
+
+
+if __name__ == '__main__':
+    main()
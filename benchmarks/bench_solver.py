@@ -0,0 +1,69 @@
+"""
+bench_solver.py
+Time the threat-space solver against the full-width BoardSearcher on the
+tactical positions.
+
+    python -m benchmarks.bench_solver [--nodes N] [--depth D] [--search-depth D]
+"""
+
+import argparse
+import time
+from board_searcher import BoardSearcher
+from threat_solver import ThreatSpaceSolver
+from benchmarks.positions import TACTICAL, parse_diagram
+
+
+def run_solver(solver, board, turn, mode, depth, nodes):
+    start = time.perf_counter()
+    if mode == 'vcf':
+        line = solver.vcf(board, turn, depth, nodes)
+    else:
+        line = solver.vct(board, turn, depth, nodes)
+    return line, solver.nodes, solver.aborted, time.perf_counter() - start
+
+
+def run_searcher(board, turn, depth):
+    searcher = BoardSearcher()
+    searcher.use_threats = False
+    searcher.solver_mode = None
+    searcher.board = [list(row) for row in board]
+    start = time.perf_counter()
+    score, row, col = searcher.search(turn, depth)
+    return (row, col), score, time.perf_counter() - start
+
+
+def fmt_line(line):
+    if line is None:
+        return '-'
+    return ' '.join('%s%s' % (chr(ord('A') + r), c + 1) for r, c in line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=5000, help='solver node limit')
+    parser.add_argument('--depth', type=int, default=10, help='solver depth limit')
+    parser.add_argument('--search-depth', type=int, default=2,
+                        help='BoardSearcher depth, 0 to skip')
+    args = parser.parse_args()
+
+    solver = ThreatSpaceSolver()
+    print('%-22s %-6s %-4s %8s %9s  %-4s %8s %9s  %s' % (
+        'position', 'expect', 'VCF', 'nodes', 'ms', 'VCT', 'nodes', 'ms', 'line'))
+    for name, diagram, turn, expect in TACTICAL:
+        board = parse_diagram(diagram)
+        vcf, vcf_nodes, vcf_cut, vcf_time = run_solver(
+            solver, board, turn, 'vcf', args.depth, args.nodes)
+        vct, vct_nodes, vct_cut, vct_time = run_solver(
+            solver, board, turn, 'vct', args.depth, args.nodes)
+        found = lambda line, cut: 'yes' if line else ('cut' if cut else 'no')
+        print('%-22s %-6s %-4s %8d %9.1f  %-4s %8d %9.1f  %s' % (
+            name, expect or '-', found(vcf, vcf_cut), vcf_nodes, vcf_time * 1000,
+            found(vct, vct_cut), vct_nodes, vct_time * 1000, fmt_line(vcf or vct)))
+        if args.search_depth:
+            move, score, elapsed = run_searcher(board, turn, args.search_depth)
+            print('%-22s BoardSearcher depth %d: %s score %d in %.1f ms' % (
+                '', args.search_depth, fmt_line([move]), score, elapsed * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+bench_startup.py
+Cold start of the headless engine (gomocup.py): time from launching the
+process to its answer to START, and to its first move after TURN, for
+each engine. Also checks that tkinter is never imported.
+
+    python -m benchmarks.bench_startup [--runs N] [--turn-time S]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _cold_start(engine, turn_time):
+    """Return (seconds to OK, seconds to the first move) of one launch."""
+    began = time.time()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, 'gomocup.py'), '--engine', engine],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True, cwd=ROOT)
+    try:
+        process.stdin.write('START 9\n')
+        process.stdin.flush()
+        assert process.stdout.readline().strip() == 'OK'
+        ready = time.time() - began
+        process.stdin.write('INFO timeout_turn %d\nTURN 4,4\n' % (turn_time * 1000))
+        process.stdin.flush()
+        process.stdout.readline()
+        first = time.time() - began
+        process.stdin.write('END\n')
+        process.stdin.flush()
+        process.wait(10)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    return ready, first
+
+
+def _imports_tkinter():
+    code = 'import sys, gomocup; sys.exit("tkinter" in sys.modules)'
+    return subprocess.call([sys.executable, '-c', code], cwd=ROOT) != 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cold start of gomocup.py')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--turn-time', type=float, default=0.5,
+                        help='INFO timeout_turn for the first move, in seconds')
+    args = parser.parse_args()
+
+    print('tkinter imported: %s' % _imports_tkinter())
+    print('%-9s %10s %12s %12s' % ('engine', 'START->OK', 'first move', 'move time'))
+    for engine in ('mcts', 'searcher'):
+        runs = [_cold_start(engine, args.turn_time) for _ in range(args.runs)]
+        ready = min(r for r, _ in runs)
+        first = min(f for _, f in runs)
+        print('%-9s %9.0fms %11.0fms %11.0fms' % (
+            engine, ready * 1000, first * 1000, (first - ready) * 1000))
+
+
+if __name__ == '__main__':
+    main()
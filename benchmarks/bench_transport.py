@@ -0,0 +1,106 @@
+"""
+bench_transport.py
+Per-task dispatch overhead of sending positions to worker processes:
+pickled game_board.Board objects and 2D grids against slot indexes into a
+PositionRing.
+
+Each task rebuilds the Board (or the grid, as BoardSearcher workers do) in
+the worker and returns its move count, so the timings are dominated by the
+transport.
+
+    python -m benchmarks.bench_transport [--tasks N] [--workers W] [--stones S]
+"""
+
+import argparse
+import multiprocessing as mp
+import pickle
+import random
+import time
+from game_board import Board
+from position_ring import PositionRing
+
+_ring = None
+
+
+def _init_worker(ring_name):
+    global _ring
+    if ring_name is not None:
+        _ring = PositionRing.attach(ring_name)
+
+
+def _board_task(board):
+    return len(board.states)
+
+
+def _slot_task(slot):
+    return len(_ring.board(slot).states)
+
+
+def _grid_task(grid):
+    return sum(1 for line in grid for stone in line if stone)
+
+
+def _slot_grid_task(slot):
+    return _grid_task(_ring.grid(slot)[0])
+
+
+def _random_boards(count, stones, seed=2018):
+    rng = random.Random(seed)
+    boards = []
+    for _ in range(count):
+        board = Board()
+        board.init_board()
+        for move in rng.sample(board.availables, stones):
+            board.do_move(move)
+        boards.append(board)
+    return boards
+
+
+def _run(pool, task, args):
+    pool.map(task, args[:8])
+    start = time.perf_counter()
+    results = pool.map(task, args, chunksize=1)
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--tasks', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--stones', type=int, default=30)
+    args = parser.parse_args()
+
+    boards = _random_boards(64, args.stones)
+    print('pickled Board: %d bytes, ring slot: %d bytes'
+          % (len(pickle.dumps(boards[0])), len(pickle.dumps(0))))
+
+    tasks = [boards[i % len(boards)] for i in range(args.tasks)]
+    grids = [board.get_2d_board() for board in tasks]
+    timings = []
+    with mp.Pool(args.workers, _init_worker, (None,)) as pool:
+        elapsed, expected = _run(pool, _board_task, tasks)
+        timings.append(('pickled Board', elapsed))
+        elapsed, results = _run(pool, _grid_task, grids)
+        assert results == expected
+        timings.append(('pickled grid', elapsed))
+
+    with PositionRing(slots=len(boards)) as ring:
+        # the writes are part of the dispatch cost
+        start = time.perf_counter()
+        slots = [ring.put_board(board) for board in boards]
+        written = (time.perf_counter() - start) / len(boards) * args.tasks
+        slots = [slots[i % len(slots)] for i in range(args.tasks)]
+        with mp.Pool(args.workers, _init_worker, (ring.name,)) as pool:
+            for name, task in (('ring -> Board', _slot_task), ('ring -> grid', _slot_grid_task)):
+                elapsed, results = _run(pool, task, slots)
+                assert results == expected
+                timings.append((name, elapsed + written))
+
+    print('%d tasks, %d workers, %d stones' % (args.tasks, args.workers, args.stones))
+    print('%-14s %9s %12s' % ('transport', 'seconds', 'us per task'))
+    for name, elapsed in timings:
+        print('%-14s %9.3f %12.1f' % (name, elapsed, elapsed / args.tasks * 1e6))
+
+
+if __name__ == '__main__':
+    main()
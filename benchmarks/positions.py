@@ -0,0 +1,246 @@
+"""
+positions.py
+Fixed positions used by the benchmarks.
+
+Diagrams are written row by row, X for black, O for white and . for empty.
+"""
+
+from board_util import EMPTY, BLACK, WHITE
+
+_CELLS = {'.': EMPTY, 'X': BLACK, 'O': WHITE}
+
+
+def parse_diagram(diagram):
+    """Return the 2D board (list of lists) drawn by diagram."""
+    return [[_CELLS[ch] for ch in line.split()]
+            for line in diagram.strip().splitlines()]
+
+
+# (name, diagram, side to move, forced win expected)
+TACTICAL = [
+    ('vcf-four-to-open-four', """
+        . . . . . . . . .
+        . . . . . . . . .
+        . . O X X X . . .
+        . . . . . . . . .
+        . . . . . . X . .
+        . . . . . . X . .
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+    """, BLACK, 'vcf'),
+    ('vcf-open-four', """
+        . . . . . . . . .
+        . . . . . . . . .
+        . . O X . . . . .
+        . . . X . . . . .
+        . . . X . . . . .
+        . . . . . . . . .
+        . . O . X X . . .
+        . . . . . . . . .
+        . . . . . . . . .
+    """, BLACK, 'vcf'),
+    ('vct-double-three', """
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . X X . . .
+        . . . X . . . . .
+        . . . X . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+    """, BLACK, 'vct'),
+    ('vct-diagonal-and-row', """
+        . . . . . . . . .
+        . O . . . . . . .
+        . . X . . . . . .
+        . . . X . . O . .
+        . . . . X . . . .
+        . O X X . . . . .
+        . . . . . . . . .
+        . . . X . . . . .
+        . . . . . . . . .
+    """, BLACK, 'vct'),
+    ('vct-four-then-threes', """
+        . . . . . . . . .
+        . . . . . . . . .
+        . . O X X X . . .
+        . . . . . . . . .
+        . . . . . X . . .
+        . . . . . X . . .
+        . . . . . O . . .
+        . . . . . . . . .
+        . . . . . . . . .
+    """, BLACK, 'vct'),
+    ('none-blocked-two', """
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . O . . .
+        . . . X X O . . .
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+    """, BLACK, None),
+]
+
+
+# (name, category, diagram, side to move, correct moves as (row, col)):
+# positions with a known set of correct moves for benchmarks/tactics.py.
+# The sets were checked move by move with the threat-space solver: for vcf
+# and vct every four (and three) that keeps the forced win, for the block
+# and defend positions every move after which the opponent has no VCT.
+# In defend-double-three the solver cannot settle (5, 5), which takes the
+# gap of the column three; it is accepted with the intersection (4, 5).
+SUITE = [
+    ('five-row', 'win-in-one', """
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . O . . . .
+        . . . . O . . . .
+        . O X X X X . . .
+        . . . . O . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+    """, BLACK, [(4, 6)]),
+    ('five-diagonal-not-block', 'win-in-one', """
+        X . . . . . . . .
+        . X . . . . . . .
+        . . X . . . . . .
+        . . . X . . . . .
+        . . . . . . . . .
+        . . . . . O O O O
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+    """, BLACK, [(4, 4)]),
+    ('five-gap', 'win-in-one', """
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+        . . O O . O . . .
+        . . X X . X X . .
+        . . . . O . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+    """, BLACK, [(4, 4)]),
+    ('block-four', 'block-four', """
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . O O O O X .
+        . . . . X . . . .
+        . . . . . X . . .
+        . . . . . . . . .
+        . . . . . . . . .
+        X . . . . . . . .
+    """, BLACK, [(3, 2)]),
+    ('block-four-not-three', 'block-four', """
+        . . . . . . . . .
+        . . . . . . O . .
+        . . . . . O . . .
+        . . . . O . . . .
+        . . . O . . . . .
+        . . X X X . . . .
+        . . . . . . . . .
+        . X . . . . . . .
+        . . . . . . . . .
+    """, BLACK, [(0, 7)]),
+    ('make-open-four', 'open-four', """
+        . . . . . . . . O
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . X X X . . .
+        . . . O . . . . .
+        . . . . O . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+    """, BLACK, [(4, 2), (4, 6)]),
+    ('block-open-three', 'block-three', """
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . O O O . . .
+        . . . . . . . . .
+        . . . . X . . . .
+        . . . . . . . . .
+        X . . . . . . . X
+    """, BLACK, [(4, 2), (4, 6)]),
+    ('vcf-four-to-open-four', 'vcf', """
+        . . . . . . . . O
+        . . . . . . . . .
+        . . O X X X . . .
+        . . . . . . . . .
+        . . . . . . X . .
+        . . . . . . X . .
+        . . . . . . . . .
+        . . . . . . . . .
+        O . . O . . O . .
+    """, BLACK, [(2, 6)]),
+    ('vcf-open-four', 'vcf', """
+        . . . . . . . . O
+        . . . . . . . . .
+        . . O X . . . . .
+        . . . X . . . . .
+        . . . X . . . . .
+        . . . . . . . . .
+        . . O . X X . . .
+        . . . . . . . . .
+        . O . . . . . . O
+    """, BLACK, [(1, 3), (5, 3)]),
+    ('vct-double-three', 'vct', """
+        O . . . . . . . O
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . . . . . .
+        . . . . X X . . .
+        . . . X . . . . .
+        . . . X . . . . .
+        . . . . . . . . .
+        O . . . . . . . O
+    """, BLACK, [(2, 6), (3, 3), (3, 5), (3, 6), (4, 2), (4, 3), (4, 6), (4, 7), (5, 4), (6, 2), (7, 2), (7, 3)]),
+    ('defend-double-three', 'defend-three', """
+        . . . . . . . . .
+        . . . . . . . . .
+        . X . . . . . . .
+        . . . . . . . . .
+        . . . O O . . X .
+        . . . . . . . . .
+        . . . . X O . . .
+        . . . . . O . . .
+        . . X . . . . . .
+    """, BLACK, [(4, 5), (5, 5)]),
+]
+
+
+def random_positions(count=10, stones=8, seed=2018, size=9):
+    """Return count positions as (board, turn) from a seeded random
+    opening: stones alternate black and white near the centre and the side
+    to move never has a five to complete or to block."""
+    import random
+    from threat_detector import ThreatDetector
+    rng = random.Random(seed)
+    detector = ThreatDetector()
+    positions = []
+    low, high = size // 2 - 2, size // 2 + 2
+    while len(positions) < count:
+        board = [[EMPTY] * size for _ in range(size)]
+        turn = BLACK
+        for _ in range(stones):
+            while True:
+                row, col = rng.randint(low, high), rng.randint(low, high)
+                if board[row][col] == EMPTY:
+                    break
+            board[row][col] = turn
+            turn = WHITE if turn == BLACK else BLACK
+        kind, _ = detector.forced_moves(board, turn)
+        if kind in ('win', 'block'):
+            continue
+        positions.append((board, turn))
+    return positions
@@ -0,0 +1,318 @@
+"""
+suite.py
+Micro and macro benchmarks of the hot paths, with JSON results and a
+regression check against a stored baseline.
+
+    python -m benchmarks.suite run [--out FILE] [--quick] [--only NAME ...]
+    python -m benchmarks.suite compare BASELINE RESULTS [--threshold 0.10]
+
+Every benchmark runs on a fixed, seeded corpus of positions, so results of
+two runs on the same machine are comparable. benchmarks/baseline.json is
+the baseline of the last accepted change; refresh it with
+`run --out benchmarks/baseline.json` when a slowdown is intended.
+"""
+
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import sys
+import time
+import warnings
+import numpy as np
+from board_evaluator import BoardEvaluator
+from board_searcher import BoardSearcher
+from board_util import GoBoardUtil
+from feature_encoder import FeatureEncoder
+from game_board import Board
+from mcts import MCTS, TreeNode
+from pattern_policy import PatternPolicy
+from benchmarks.positions import random_positions
+
+warnings.filterwarnings("ignore")
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# name -> (function, unit, higher is better), filled by @benchmark
+BENCHMARKS = {}
+
+
+def benchmark(name, unit='us/op', higher_is_better=False):
+    def register(fn):
+        BENCHMARKS[name] = (fn, unit, higher_is_better)
+        return fn
+    return register
+
+
+def corpus(count=16, seed=2018):
+    """Return the benchmark positions as game_board.Board objects, with 4
+    to 19 stones."""
+    boards = []
+    for i in range(count):
+        grid, turn = random_positions(1, stones=4 + i, seed=seed + i)[0]
+        board = Board()
+        board.set_position(grid, turn)
+        boards.append(board)
+    return boards
+
+
+def per_op(fn, items, repeat, setup=None, min_time=0.05):
+    """Return the best time per item in microseconds of fn over items.
+
+    Each of the repeat rounds passes over items until min_time seconds
+    have been timed; setup(), if given, makes fresh items before every
+    pass and is not timed.
+    """
+    best = None
+    for _ in range(repeat):
+        elapsed = 0.0
+        ops = 0
+        while ops == 0 or elapsed < min_time:
+            if setup is not None:
+                items = setup()
+            start = time.perf_counter()
+            for item in items:
+                fn(item)
+            elapsed += time.perf_counter() - start
+            ops += len(items)
+        if best is None or elapsed / ops < best:
+            best = elapsed / ops
+    return best * 1e6
+
+
+@benchmark('calibration')
+def bench_calibration(boards, repeat):
+    """A fixed pure Python loop, to tell machine speed changes from code
+    changes (see compare --normalize)."""
+    def loop(n):
+        total = 0
+        for i in range(n):
+            total += i * i % 7
+        return total
+    return per_op(loop, [1000] * 20, repeat)
+
+
+@benchmark('board.do_move')
+def bench_do_move(boards, repeat):
+    rng = random.Random(1)
+    games = [rng.sample(range(81), 40) for _ in range(20)]
+
+    def setup():
+        fresh = []
+        for moves in games:
+            board = Board()
+            board.init_board()
+            fresh.extend((board, move) for move in moves)
+        return fresh
+    return per_op(lambda item: item[0].do_move(item[1]), None, repeat, setup)
+
+
+@benchmark('board.has_a_winner')
+def bench_has_a_winner(boards, repeat):
+    return per_op(lambda board: board.has_a_winner(), boards * 10, repeat)
+
+
+@benchmark('board.current_state')
+def bench_current_state(boards, repeat):
+    return per_op(lambda board: board.current_state(), boards * 10, repeat)
+
+
+@benchmark('encoder.encode_batch')
+def bench_encode_batch(boards, repeat):
+    encoder = FeatureEncoder()
+    out = encoder.new_buffer(len(boards))
+    # per position, to compare with board.current_state
+    return per_op(lambda batch: encoder.encode_batch(batch, out), [boards] * 10,
+                  repeat) / len(boards)
+
+
+@benchmark('encoder.push_pop')
+def bench_push_pop(boards, repeat):
+    encoder = FeatureEncoder()
+    out = encoder.reset(encoder.new_buffer())
+    encoder.push(out, 40)
+
+    def push_pop(move):
+        encoder.push(out, move)
+        encoder.pop(out, move, 40)
+    return per_op(push_pop, [30, 31, 49, 50] * 10, repeat)
+
+
+@benchmark('board.deepcopy')
+def bench_deepcopy(boards, repeat):
+    return per_op(copy.deepcopy, boards * 5, repeat)
+
+
+@benchmark('evaluator.evaluate')
+def bench_evaluate(boards, repeat):
+    evaluator = BoardEvaluator()
+    items = [(board.get_2d_board(), board.get_current_player()) for board in boards] * 5
+    return per_op(lambda item: evaluator.evaluate(*item), items, repeat)
+
+
+@benchmark('evaluator.analysis_line')
+def bench_analysis_line(boards, repeat):
+    evaluator = BoardEvaluator()
+    lines = [(list(row), col) for board in boards
+             for row in board.get_2d_board() if any(row) for col in (0, 4, 8)]
+    result = []
+    return per_op(lambda item: evaluator.analysis_line(list(item[0]), result, 9, item[1]),
+                  lines, repeat)
+
+
+@benchmark('util.minimax_policy_value')
+def bench_policy_value(boards, repeat):
+    evaluator = BoardEvaluator()
+    return per_op(lambda board: GoBoardUtil.minimax_policy_value(board, evaluator),
+                  boards[:6], repeat)
+
+
+@benchmark('pattern_policy.policy_value')
+def bench_pattern_policy(boards, repeat):
+    policy = PatternPolicy.load()
+    return per_op(policy, boards, repeat)
+
+
+@benchmark('treenode.select')
+def bench_select(boards, repeat):
+    rng = random.Random(2)
+    nodes = []
+    for _ in range(20):
+        root = TreeNode(None, 1.0)
+        root.expand([(move, rng.random() / 81) for move in range(81)])
+        for child in root._children.values():
+            for _ in range(rng.randint(0, 5)):
+                child.update(rng.uniform(-1, 1))
+        root._n_visits = 200
+        nodes.append(root)
+    return per_op(lambda node: node.select(5), nodes * 20, repeat)
+
+
+@benchmark('mcts.playouts', 'playouts/s', True)
+def bench_playouts(boards, repeat):
+    best = 0.0
+    n = 40
+    for _ in range(repeat):
+        elapsed = 0.0
+        for board in boards[4:8]:
+            mcts = MCTS(GoBoardUtil.minimax_policy_value, n_playout=n, run_time=None)
+            start = time.perf_counter()
+            mcts.get_move(board)
+            elapsed += time.perf_counter() - start
+        best = max(best, 4 * n / elapsed)
+    return best
+
+
+def bench_search(depth, count):
+    def run(boards, repeat):
+        def search(board):
+            searcher = BoardSearcher()
+            searcher.board = [list(row) for row in board.get_2d_board()]
+            searcher.search(board.get_current_player(), depth)
+        return per_op(search, boards[:count], repeat, min_time=0) / 1000
+    return run
+
+
+for _depth, _count in ((1, 16), (2, 8), (3, 2)):
+    benchmark('searcher.depth%d' % _depth, 'ms/search')(bench_search(_depth, _count))
+
+
+def run(names=None, quick=False):
+    """Run the benchmarks, return the results document."""
+    boards = corpus()
+    repeat = 3 if quick else 7
+    results = {}
+    for name, (fn, unit, higher) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        value = fn(boards, repeat)
+        results[name] = {'value': round(value, 3), 'unit': unit, 'higher_is_better': higher}
+        print('%-28s %12.3f %s' % (name, value, unit))
+        sys.stdout.flush()
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold, normalize=False):
+    """Print the change of every benchmark, return the names of those that
+    regressed by more than threshold (a fraction).
+
+    With normalize, times are first scaled by the calibration benchmark of
+    each run, which removes most of the drift of a shared machine.
+    """
+    regressions = []
+    scale = 1.0
+    if normalize:
+        scale = (baseline['results']['calibration']['value']
+                 / current['results']['calibration']['value'])
+    print('%-28s %12s %12s %8s' % ('benchmark', 'baseline', 'current', 'change'))
+    for name, entry in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None or not base['value']:
+            print('%-28s %12s %12.3f' % (name, '-', entry['value']))
+            continue
+        if name == 'calibration':
+            continue
+        # positive change is always an improvement
+        if entry['higher_is_better']:
+            change = entry['value'] / scale / base['value'] - 1
+        else:
+            change = 1 - entry['value'] * scale / base['value']
+        flag = ''
+        if change < -threshold:
+            flag = 'REGRESSION'
+            regressions.append(name)
+        print('%-28s %12.3f %12.3f %+7.1f%% %s' % (
+            name, base['value'], entry['value'], change * 100, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    commands = parser.add_subparsers(dest='command')
+    run_parser = commands.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('--out', help='write the results to this JSON file')
+    run_parser.add_argument('--quick', action='store_true', help='fewer repeats')
+    run_parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS))
+    compare_parser = commands.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('baseline', nargs='?', default=BASELINE)
+    compare_parser.add_argument('results')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='allowed slowdown as a fraction (default 0.10)')
+    compare_parser.add_argument('--normalize', action='store_true',
+                                help='scale by the calibration benchmark of each run')
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.results) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.threshold, args.normalize)
+        if regressions:
+            print('%d regression(s) beyond %.0f%%' % (len(regressions), args.threshold * 100))
+            return 1
+        return 0
+
+    # no command runs every benchmark
+    results = run(getattr(args, 'only', None), getattr(args, 'quick', False))
+    out = getattr(args, 'out', None)
+    if out:
+        with open(out, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
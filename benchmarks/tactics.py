@@ -0,0 +1,237 @@
+"""
+tactics.py
+Tactical test suite: for every position of benchmarks.positions.SUITE,
+which has a known set of correct moves, and every engine configuration,
+record whether the engine plays a correct move and the time and nodes it
+needed to settle on one (from then on its best move stayed correct), and
+whether it searched at all: a move answered by the forced-move check or
+by the threat-space solver is marked F or S.
+
+    python -m benchmarks.tactics [ENGINE ...] [--time S] [--out FILE]
+    python -m benchmarks.tactics --compare OLD.json NEW.json
+
+Engines are given as in arena.py, e.g. searcher:depth=4 or
+mcts:n_playout=1000,run_time=None; the default is a ladder of searcher
+depths and MCTS playouts with both shortcuts off (use_threats=False,
+solver_mode=None), so that every position is solved by the search itself.
+Nodes are searcher nodes or MCTS playouts; the threat-space solver's
+nodes are counted apart from them. The searcher reports after every iteration of
+iterative deepening and MCTS every --interval seconds, so the time to
+settle is measured at that resolution. Save a run with --out and compare
+two runs with --compare to see the speed and accuracy changes.
+"""
+
+import argparse
+import json
+import platform
+import time
+import warnings
+from anytime import CancelToken
+from arena import make_player, parse_engine
+from game_board import Board
+from benchmarks.positions import SUITE, parse_diagram
+
+warnings.filterwarnings("ignore")
+
+# without the forced-move check and the threat-space solver
+NO_SHORTCUTS = 'use_threats=False,solver_mode=None'
+
+DEFAULT_ENGINES = [
+    'searcher:depth=2,' + NO_SHORTCUTS,
+    'searcher:depth=4,' + NO_SHORTCUTS,
+    'mcts:n_playout=400,run_time=None,' + NO_SHORTCUTS,
+    'mcts:n_playout=2000,run_time=None,' + NO_SHORTCUTS,
+]
+
+
+def coord(move):
+    row, col = move
+    return '%s%d' % (chr(ord('A') + row), col + 1)
+
+
+def searcher_trace(player, grid, turn, time_limit):
+    """Return (trace, shortcut, solver nodes): trace is [(move, nodes,
+    seconds)] after each depth of the search, and shortcut is 'forced' or
+    'solver' if the move was played without searching, else None."""
+    searcher = player.searcher
+    searcher.board = [list(line) for line in grid]
+    searcher.solver.nodes = 0
+    token = CancelToken(time_limit) if time_limit else None
+    start = time.perf_counter()
+    trace = []
+    snapshots = []
+    for snapshot in searcher.iter_search(turn, player.depth, token):
+        snapshots.append(snapshot)
+        if snapshot.best_move is not None:
+            trace.append((tuple(snapshot.best_move), snapshot.nodes,
+                          time.perf_counter() - start))
+    solver_nodes = searcher.solver.nodes
+    shortcut = None
+    # a search yields every depth and then the final snapshot, a shortcut
+    # only the final one
+    if len(snapshots) == 1 and snapshots[0].depth > 0:
+        shortcut = 'solver' if solver_nodes else 'forced'
+    return trace, shortcut, solver_nodes
+
+
+def mcts_trace(player, grid, turn, time_limit, interval):
+    """Return (trace, shortcut, solver nodes) of an MCTSPlayer as for
+    searcher_trace: its forced move or solver move if it has one, else the
+    MCTS playouts every interval seconds."""
+    board = Board()
+    board.set_position(grid, turn)
+    start = time.perf_counter()
+    solver_nodes = 0
+    shortcut = None
+    move = player.forced_move(board)
+    if move is not None:
+        shortcut = 'forced'
+    elif player.solver_mode:
+        move = player.solve(board)
+        solver_nodes = player.solver.nodes
+        if move is not None:
+            shortcut = 'solver'
+    if move is not None:
+        return ([(tuple(board.move_to_location(move)), 0, time.perf_counter() - start)],
+                shortcut, solver_nodes)
+    mcts = player.mcts
+    mcts.update_with_move(-1)
+    token = CancelToken(time_limit) if time_limit else None
+    trace = []
+    for snapshot in mcts.iter_search(board, interval, token):
+        if snapshot.best_move is not None:
+            trace.append((tuple(board.move_to_location(snapshot.best_move)), snapshot.nodes,
+                          time.perf_counter() - start))
+    mcts.update_with_move(-1)
+    return trace, None, solver_nodes
+
+
+def settled(trace, answers):
+    """Return (found, nodes, seconds): whether the final move is correct,
+    and the nodes and time at which the best move became and stayed
+    correct (those of the whole search if it never did)."""
+    first = None
+    for i, (move, _, _) in enumerate(trace):
+        if move in answers:
+            if first is None:
+                first = i
+        else:
+            first = None
+    if first is None:
+        _, nodes, seconds = trace[-1] if trace else (None, 0, 0.0)
+        return False, nodes, seconds
+    _, nodes, seconds = trace[first]
+    return True, nodes, seconds
+
+
+def run(engines, time_limit=None, interval=0.05):
+    results = {}
+    for spec in engines:
+        name, _ = parse_engine(spec)
+        player = make_player(spec)
+        rows = {}
+        for position, category, diagram, turn, answers in SUITE:
+            grid = parse_diagram(diagram)
+            answers = set(answers)
+            if name == 'searcher':
+                trace, shortcut, solver_nodes = searcher_trace(player, grid, turn, time_limit)
+            else:
+                trace, shortcut, solver_nodes = mcts_trace(player, grid, turn, time_limit,
+                                                           interval)
+            found, nodes, seconds = settled(trace, answers)
+            rows[position] = {
+                'category': category,
+                'found': found,
+                'move': coord(trace[-1][0]) if trace else None,
+                'nodes': nodes,
+                'solver_nodes': solver_nodes,
+                'shortcut': shortcut,
+                'seconds': seconds,
+                'total_seconds': trace[-1][2] if trace else 0.0,
+            }
+        solved = [row for row in rows.values() if row['found']]
+        results[spec] = {
+            'solved': len(solved),
+            'searched': sum(1 for row in solved if row['shortcut'] is None),
+            'positions': rows,
+            'seconds_to_solve': sum(row['seconds'] for row in solved),
+            'total_seconds': sum(row['total_seconds'] for row in rows.values()),
+        }
+    return results
+
+
+def print_table(results):
+    engines = list(results)
+    print('%-26s %-20s' % ('position', 'category')
+          + ''.join(' %-28s' % ('[%d] ok ms nodes solver' % (i + 1))
+                    for i in range(len(engines))))
+    for position, category, _, _, answers in SUITE:
+        line = '%-26s %-20s' % (position, category)
+        for spec in engines:
+            row = results[spec]['positions'][position]
+            if row['found']:
+                mark = {'forced': 'F', 'solver': 'S'}.get(row['shortcut'], '')
+                line += ' %-28s' % ('yes %7.0f %8d %6d %s' % (
+                    row['seconds'] * 1000, row['nodes'], row['solver_nodes'], mark))
+            else:
+                line += ' %-28s' % ('no  %-4s (%s)' % (row['move'], ' '.join(map(coord, answers))))
+        print(line)
+    print('nodes are searcher nodes or MCTS playouts; F: forced move, S: solver '
+          'line, played without searching')
+    print()
+    width = max(len(spec) for spec in engines)
+    for i, spec in enumerate(engines):
+        result = results[spec]
+        print('[%d] %-*s solved %2d/%d (%2d by search)  %7.2f s to solve, %7.2f s in total' % (
+            i + 1, width, spec, result['solved'], len(SUITE), result['searched'],
+            result['seconds_to_solve'], result['total_seconds']))
+
+
+def compare(old, new):
+    """Print the accuracy and speed change of every engine in both runs."""
+    print('%-36s %8s %8s %10s %10s' % ('engine', 'solved', 'was', 'to solve', 'was'))
+    for spec, result in new['results'].items():
+        before = old['results'].get(spec)
+        if before is None:
+            continue
+        print('%-36s %8d %8d %9.2fs %9.2fs' % (
+            spec, result['solved'], before['solved'], result['seconds_to_solve'],
+            before['seconds_to_solve']))
+        for position, row in result['positions'].items():
+            was = before['positions'].get(position)
+            if was is not None and was['found'] != row['found']:
+                print('    %s: %s' % (position, 'now solved' if row['found'] else 'LOST'))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[1],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='\n'.join(__doc__.strip().splitlines()[2:]))
+    parser.add_argument('engines', nargs='*', default=DEFAULT_ENGINES)
+    parser.add_argument('--time', type=float, help='seconds per position and engine')
+    parser.add_argument('--interval', type=float, default=0.05,
+                        help='seconds between MCTS reports')
+    parser.add_argument('--out', help='write the results to this JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            old = json.load(f)
+        with open(args.compare[1]) as f:
+            new = json.load(f)
+        compare(old, new)
+        return
+    for spec in args.engines:
+        parse_engine(spec)
+    results = run(args.engines, args.time, args.interval)
+    print_table(results)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'python': platform.python_version(), 'time_limit': args.time,
+                       'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
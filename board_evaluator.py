@@ -4,20 +4,135 @@
 		possible scenarios that could occur. This portion of code looks ugly but it is
 		quite necessary for the evaluation process.
 '''
+from collections import OrderedDict
+from itertools import chain
+from time import perf_counter
+
+# line tables for each board size, see line_tables()
+_LINES = {}
+
+
+def line_tables(rows, cols):
+	"""Return (lines, where) for a rows x cols board, cached per size.
+
+	lines[d] holds the lines of direction d (0 horizontal, 1 vertical,
+	2 left-hand diagonal, 3 right-hand diagonal) as tuples of (row, col),
+	including the short diagonals in the corners. where[d][row][col] is
+	the (line, position) of a point in lines[d].
+	"""
+	tables = _LINES.get((rows, cols))
+	if tables is None:
+		starts = (
+			[ (i, 0, 0, 1) for i in range(rows) ],
+			[ (0, j, 1, 0) for j in range(cols) ],
+			# down to the right, from the top row and the left column
+			[ (0, j, 1, 1) for j in range(cols - 1, 0, -1) ] + [ (i, 0, 1, 1) for i in range(rows) ],
+			# up to the right, from the left column and the bottom row
+			[ (i, 0, -1, 1) for i in range(rows) ] + [ (rows - 1, j, -1, 1) for j in range(1, cols) ],
+		)
+		lines = []
+		where = []
+		for d in range(4):
+			dlines = []
+			dwhere = [ [ None ] * cols for i in range(rows) ]
+			for i, j, di, dj in starts[d]:
+				cells = []
+				while 0 <= i < rows and 0 <= j < cols:
+					dwhere[i][j] = (len(dlines), len(cells))
+					cells.append((i, j))
+					i += di
+					j += dj
+				dlines.append(tuple(cells))
+			lines.append(dlines)
+			where.append(dwhere)
+		tables = _LINES[(rows, cols)] = (lines, where)
+	return tables
+
+
+class EvalCache(object):
+	"""Size-bounded cache of evaluation scores with LRU eviction.
+
+	Keys are (position, turn) pairs, where position is the board flattened
+	into bytes. One instance can be shared by several evaluators so that
+	scores survive across searches and moves.
+	"""
+
+	def __init__ (self, maxsize=100000):
+		self.maxsize = maxsize
+		self.table = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+
+	@staticmethod
+	def key(board, turn):
+		"""Return the cache key of a board (2D list) and the side to move."""
+		return (bytes(chain.from_iterable(board)), turn)
+
+
+	def get(self, key):
+		"""Return the cached score for key, or None on a miss."""
+		table = self.table
+		score = table.get(key)
+		if score is None:
+			self.misses += 1
+			return None
+		table.move_to_end(key)
+		self.hits += 1
+		return score
+
+
+	def put(self, key, score):
+		"""Store a score, evicting the least recently used entry when full."""
+		table = self.table
+		table[key] = score
+		table.move_to_end(key)
+		if len(table) > self.maxsize:
+			table.popitem(last=False)
+			self.evictions += 1
+
+
+	def hit_rate(self):
+		lookups = self.hits + self.misses
+		if lookups == 0:
+			return 0.0
+		return self.hits / lookups
+
+
+	def clear(self):
+		"""Drop all entries and reset the counters."""
+		self.table.clear()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+
+	def stats(self):
+		return {
+			'size': len(self.table),
+			'maxsize': self.maxsize,
+			'hits': self.hits,
+			'misses': self.misses,
+			'evictions': self.evictions,
+			'hit_rate': self.hit_rate(),
+		}
+
+
+	def __len__ (self):
+		return len(self.table)
+
+
 class BoardEvaluator(object):
 
-	def __init__ (self):
-		# self.POS is for adding weight to each intersetion
-		# add weight of 4 to the center, 3 to the outer square, then
-		# 2, 1, at last 0 to the outermost square.
-		self.POS = []
-		for i in range(9):
-			row = []
-			for j in range(9):
-				row.append( 4 - max(abs(i - 4), abs(j - 4)) )
-			# row = [ (4 - max(abs(i - 4), abs(j - 4))) for j in range(9) ]
-			self.POS.append(tuple(row))
-			
+	def __init__ (self, cache=None, rows=9, cols=9):
+		# optional EvalCache shared between searches; None disables caching
+		self.cache = cache
+		# counters for search statistics, see counters()
+		self.calls = 0			# evaluate() calls
+		self.scored = 0			# evaluate() calls that analysed the board
+		self.eval_time = 0.0	# seconds spent in evaluate()
+		self.line_calls = 0		# analysis_line() calls
 
 		# different types of situations below
 		self.cTwo = 1		# chong'er	2 stones in a row, 1 move to make a chongsan
@@ -29,19 +144,43 @@ class BoardEvaluator(object):
 		self.five = 7		# huowu		5 stones in a row
 		self.analyzed = 8		# has benn analyzed
 		self.unanalyzed = 0			# has not been analyzed
-		self.result = [ 0 for i in range(18) ]		# save current reslut of analyzation in a line
-		self.line = [ 0 for i in range(18) ]		# current data in a line
+		self.count = []				# count of each situation: count[black/white][situation]
+		for i in range(3):
+			data = [ 0 for i in range(10) ]
+			self.count.append(data)
+		# the board size; evaluate() resizes to the board it is given
+		self.resize(rows, cols)
+
+
+	# set up the tables for a rows x cols board
+	def resize(self, rows, cols):
+		self.rows = rows
+		self.cols = cols
+		# self.POS is for adding weight to each intersetion
+		# add weight of 4 to the center of a 9x9 board (7 on 15x15, 9 on 19x19),
+		# one less on each outer square, at last 0 to the outermost square.
+		ci, cj = (rows - 1) // 2, (cols - 1) // 2
+		self.POS = []
+		for i in range(rows):
+			row = []
+			for j in range(cols):
+				row.append( max(min(ci, cj) - max(abs(i - ci), abs(j - cj)), 0) )
+			self.POS.append(tuple(row))
+		# lines through each point in the 4 directions
+		self.lines, self.where = line_tables(rows, cols)
+		self.span = 2 * max(rows, cols)
+		self.result = [ 0 for i in range(self.span) ]		# save current reslut of analyzation in a line
+		self.line = [ 0 for i in range(self.span) ]		# current data in a line
 		self.record = []			# result of analysis of whole board 
 									# format of each item in list is record[row][col][dir]
-		for i in range(9):
+		for i in range(rows):
 			self.record.append([])
 			self.record[i] = []
-			for j in range(9):
+			for j in range(cols):
 				self.record[i].append([ 0, 0, 0, 0])
-		self.count = []				# count of each situation: count[black/white][situation]
-		for i in range(3):
-			data = [ 0 for i in range(10) ]
-			self.count.append(data)
+		# record entries of the points of each line, in line order
+		self.line_records = [ [ [ self.record[row][col] for row, col in cells ]
+			for cells in dlines ] for dlines in self.lines ]
 		self.reset()
 
 	
@@ -49,9 +188,8 @@ class BoardEvaluator(object):
 	def reset(self):
 		unanalyzed = self.unanalyzed
 		count = self.count
-		for i in range(9):
-			line = self.record[i]
-			for j in range(9):
+		for line in self.record:
+			for j in range(self.cols):
 				line[j][0] = unanalyzed
 				line[j][1] = unanalyzed
 				line[j][2] = unanalyzed
@@ -65,7 +203,45 @@ class BoardEvaluator(object):
 	
 	# analyze & evaluate board 
 	# return score based on analysis result
+	# note: on a cache hit self.record and self.count are not refreshed
 	def evaluate (self, board, turn):
+		start = perf_counter()
+		self.calls += 1
+		cache = self.cache
+		if cache is not None:
+			key = cache.key(board, turn)
+			score = cache.get(key)
+			if score is None:
+				self.scored += 1
+				score = self.__score(board, turn)
+				cache.put(key, score)
+		else:
+			self.scored += 1
+			score = self.__score(board, turn)
+		self.eval_time += perf_counter() - start
+		return score
+
+
+	# return the counters as a dict
+	def counters(self):
+		return {
+			'calls': self.calls,
+			'scored': self.scored,
+			'seconds': self.eval_time,
+			'line_calls': self.line_calls,
+		}
+
+
+	# set the counters to 0
+	def reset_counters(self):
+		self.calls = 0
+		self.scored = 0
+		self.eval_time = 0.0
+		self.line_calls = 0
+
+
+	# score the board from the analysis result, breaking ties between wins
+	def __score (self, board, turn):
 		score = self.__evaluate(board, turn)
 		count = self.count
 		if score < -9000:
@@ -97,25 +273,28 @@ class BoardEvaluator(object):
 		count = self.count
 		unanalyzed = self.unanalyzed
 		analyzed = self.analyzed
+		rows = len(board)
+		cols = len(board[0])
+		if rows != self.rows or cols != self.cols:
+			self.resize(rows, cols)
+			record = self.record
 		self.reset()
-		# analysis in 4 directions
-		for i in range(9):
+		# analysis in 4 directions: horizontal, vertical,
+		# left-hand diagonal and right-hand diagonal
+		for i in range(rows):
 			boardrow = board[i]
 			recordrow = record[i]
-			for j in range(9):
+			for j in range(cols):
 				if boardrow[j] != 0:
-					# has not analyzed horizontally
-					if recordrow[j][0] == unanalyzed:
-						self.__analysis_horizon(board, i, j)
-					# has not analyzed vertically
-					if recordrow[j][1] == unanalyzed:
-						self.__analysis_vertical(board, i, j)
-					# has not analyzed left-hand diagonally 
-					if recordrow[j][2] == unanalyzed:
-						self.__analysis_left(board, i, j)
-					# has not analyzed right-hand diagonally
-					if recordrow[j][3] == unanalyzed:
-						self.__analysis_right(board, i, j)
+					cell = recordrow[j]
+					if cell[0] == unanalyzed:
+						self.__analysis(board, i, j, 0)
+					if cell[1] == unanalyzed:
+						self.__analysis(board, i, j, 1)
+					if cell[2] == unanalyzed:
+						self.__analysis(board, i, j, 2)
+					if cell[3] == unanalyzed:
+						self.__analysis(board, i, j, 3)
 
 		five = self.five
 		four = self.four
@@ -132,8 +311,8 @@ class BoardEvaluator(object):
 		for c in (five, four, cFour, three, cThree, two, cTwo):
 			check[c] = 1
 		# for each stone on the board
-		for i in range(9):
-			for j in range(9):
+		for i in range(rows):
+			for j in range(cols):
 				stone = board[i][j]
 				if stone != 0:
 					# for 4 directions
@@ -249,14 +428,12 @@ class BoardEvaluator(object):
 				wvalue += count[white][cTwo]
 		
 		
-		# include weight for each intersection
-		# add weight of 4 to the center, 3 to the outer square, then
-		# 2, 1, at last 0 to the outermost square.
+		# include weight for each intersection, see resize()
 		wc = 0
 		bc = 0
 		# for each intersection with a stone, add weight
-		for i in range(9):
-			for j in range(9):
+		for i in range(rows):
+			for j in range(cols):
 				stone = board[i][j]
 				if stone != 0:
 					if stone == white:
@@ -274,85 +451,33 @@ class BoardEvaluator(object):
 		return bvalue - wvalue
 	
 	
-	# anaylze horizontally
-	def __analysis_horizon (self, board, i, j):
-		line = self.line
-		result = self.result
-		record = self.record
-		unanalyzed = self.unanalyzed
-		# add each intersection in a row to line
-		for x in range(9):
-			line[x] = board[i][x]
-		self.analysis_line(line, result, 9, j)
-		for x in range(9):
-			if result[x] != unanalyzed:
-				record[i][x][0] = result[x]
-		return record[i][j][0]
-	
-	
-	# analyze vertically
-	def __analysis_vertical (self, board, i, j):
-		line = self.line
-		result = self.result
-		record = self.record
-		unanalyzed = self.unanalyzed
-		for x in range(9):
-			line[x] = board[x][j]
-		self.analysis_line(line, result, 9, i)
-		for x in range(9):
-			if result[x] != unanalyzed:
-				record[x][j][1] = result[x]
-		return record[i][j][1]
-	
-	
-	# analyze left-hand diagonally
-	def __analysis_left (self, board, i, j):
+	# analyze the line of direction d through (i, j), looked up in the
+	# precomputed line tables
+	def __analysis (self, board, i, j, d):
 		line = self.line
 		result = self.result
-		record = self.record
 		unanalyzed = self.unanalyzed
-		if i < j:
-			x, y = j - i, 0
+		n, pos = self.where[d][i][j]
+		cells = self.lines[d][n]
+		k = len(cells)
+		if d == 0:		# a row is a line of the board already
+			line[:k] = board[i]
 		else:
-			x, y = 0, i - j
-		k = 0
-		while k < 9:
-			if x + k > 8 or y + k > 8:
-				break
-			line[k] = board[y + k][x + k]
-			k += 1
-		self.analysis_line(line, result, k, j - x)
-		for s in range(k):
-			if result[s] != unanalyzed:
-				record[y + s][x + s][2] = result[s]
-		return record[i][j][2]
-
-	
-	# analyzed right-hand diagonally
-	def __analysis_right (self, board, i, j):
-		line = self.line
-		result = self.result
-		record = self.record
-		unanalyzed = self.unanalyzed
-		if 8 - i < j:
-			x, y, realnum = j - 8 + i, 8, 8 - i
-		else:
-			x, y, realnum = 0, i + j, j
-		k = 0
-		while k < 9:
-			if x + k > 8 or y - k < 0:
-				break
-			line[k] = board[y - k][x + k]
-			k += 1
-		self.analysis_line(line, result, k, j - x)
+			s = 0
+			for row, col in cells:
+				line[s] = board[row][col]
+				s += 1
+		self.analysis_line(line, result, k, pos)
+		records = self.line_records[d][n]
 		for s in range(k):
 			if result[s] != unanalyzed:
-				record[y - s][x + s][3] = result[s]
-		return record[i][j][3]
+				records[s][d] = result[s]
+		return records[pos][d]
 	
 	
 	# analyze a line, find out different situations (i.e., five, four, three, etc)
 	def analysis_line (self, line, record, num, pos):
+		self.line_calls += 1
 		unanalyzed = self.unanalyzed
 		analyzed = self.analyzed
 		three = self.three
@@ -360,12 +485,13 @@ class BoardEvaluator(object):
 		four = self.four
 		cFour = self.cFour
 		
-		while len(line) < 18:
+		span = self.span
+		while len(line) < span:
 			line.append(9)
-		while len(record) < 18:
+		while len(record) < span:
 			record.append(unanalyzed)
 		
-		for i in range(num, 18):
+		for i in range(num, span):
 			line[i] = 9
 		for i in range(num):
 			record[i] = unanalyzed
@@ -1,7 +1,10 @@
 import tkinter as tk
 import math
 import pickle
+import queue
+import threading
 from game_board import Board
+from game_record import GameWriter
 from mcts import MCTSPlayer
 from player import HumanPlayer
 from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, \
@@ -11,9 +14,11 @@ from board_util import GoBoardUtil, BLACK, WHITE, EMPTY, BORDER, \
 class BoardCanvas(tk.Canvas):
 	"""Apply the tkinter Canvas Widget to plot the game board and stones."""
 	
-	def __init__(self, master=None, height=0, width=0):
+	def __init__(self, master=None, height=0, width=0, size=9):
 		
 		tk.Canvas.__init__(self, master, height=height, width=width)
+		self.size = size
+		self.canvas_width = width
 		self.draw_gameBoard()
 		self.turn = BLACK
 		self.undo = False
@@ -21,13 +26,21 @@ class BoardCanvas(tk.Canvas):
 		self.prev_exist = False
 		self.prev_row = 0
 		self.prev_col = 0
+		# the program thinks in a worker thread; its move comes back through
+		# this queue and is picked up by polling with after()
+		self.moves = queue.Queue()
+		self.thinking = False
+		self.progress_text = self.create_text(width // 2, width + 45, text='')
+		# finished games are appended to this game record file (one file
+		# per board size; boards over 16x16 are not recorded)
+		self.record_path = 'games.gmr' if size == 9 else 'games%d.gmr' % size
 
 		self.initPlayers()
 		
 
 	def initPlayers(self):
-		self.width = 9
-		self.height = 9
+		self.width = self.size
+		self.height = self.size
 		self.board = Board(width=self.width, height=self.height, n_in_row=5)
 		self.mcts_player = MCTSPlayer(c_puct=5, n_playout=1000)
 		self.human_player = HumanPlayer()
@@ -45,28 +58,32 @@ class BoardCanvas(tk.Canvas):
 	def draw_gameBoard(self):
 		"""Plot the game board."""
 
-		# 9 horizontal lines
-		for i in range(9):
+		last = self.size - 1
+
+		# size horizontal lines
+		for i in range(self.size):
 			start_pixel_x = (i + 1) * 30
 			start_pixel_y = (0 + 1) * 30
 			end_pixel_x = (i + 1) * 30
-			end_pixel_y = (8 + 1) * 30
+			end_pixel_y = (last + 1) * 30
 			self.create_line(start_pixel_x, start_pixel_y, end_pixel_x, end_pixel_y)
 
-		# 9 vertical lines
-		for j in range(9):
+		# size vertical lines
+		for j in range(self.size):
 			start_pixel_x = (0 + 1) * 30
 			start_pixel_y = (j + 1) * 30
-			end_pixel_x = (8 + 1) * 30
+			end_pixel_x = (last + 1) * 30
 			end_pixel_y = (j + 1) * 30
 			self.create_line(start_pixel_x, start_pixel_y, end_pixel_x, end_pixel_y)
 
-		# place a "star" to particular intersections 
-		self.draw_star(2, 2)
-		self.draw_star(6, 2)
-		self.draw_star(4, 4)
-		self.draw_star(2, 6)
-		self.draw_star(6, 6)
+		# place a "star" to particular intersections: the centre and
+		# 2 points (3 on 15x15 and 19x19) in from each corner
+		edge = 2 if self.size < 13 else 3
+		self.draw_star(edge, edge)
+		self.draw_star(last - edge, edge)
+		self.draw_star(last // 2, last // 2)
+		self.draw_star(edge, last - edge)
+		self.draw_star(last - edge, last - edge)
 
 
 	def draw_star(self, row, col):
@@ -162,14 +179,24 @@ class BoardCanvas(tk.Canvas):
 			if winner != -1:
 				message = GoBoardUtil.color_string(self.turn).upper() + " WINS"
 				print("{} WINS".format(self.players[winner]))
-				self.create_text(150, 320, text=message)
+				self.create_text(self.canvas_width // 2, self.canvas_width + 20, text=message)
 			else:
 				print("DRAW")
-				self.create_text(150, 320, text='DRAW')
+				self.create_text(self.canvas_width // 2, self.canvas_width + 20, text='DRAW')
 			self.unbind(LEFTBUTTON)
+			self.save_game()
 		return end, winner
 
 
+	def save_game(self):
+		"""Append the finished game to the record file."""
+		try:
+			with GameWriter(self.record_path, self.width, self.height) as writer:
+				writer.write_board(self.board)
+		except (IOError, ValueError) as error:
+			print('Could not save the game: {}'.format(error))
+
+
 	def gameLoop_human(self, event, turn=False):
 		"""The main loop of the game. 
 		Note: The game is played on a tkinter window. However, there is some quite useful information 
@@ -233,11 +260,56 @@ class BoardCanvas(tk.Canvas):
 		else:
 			self.turn = WHITE	
 		print('Program is thinking now...')	
-		move = self.mcts_player.get_action(self.board,start)
+		# search in a worker thread so that the window stays responsive
+		self.thinking = True
+		worker = threading.Thread(target=self.think, args=(start,))
+		worker.daemon = True
+		worker.start()
+		self.after(100, self.poll_robot, turn)
+
+
+	def think(self, start):
+		"""Worker thread: ask the program for its move."""
+		try:
+			self.moves.put(self.mcts_player.get_action(self.board, start))
+		except Exception as error:
+			self.moves.put(error)
+
+
+	def move_now(self):
+		"""Stop the search and play the best move found so far."""
+		if self.thinking:
+			self.mcts_player.stop()
+
+
+	def coord(self, move):
+		row, col = self.board.move_to_location(move)
+		return '%s%s'%(chr(ord('A') + row), col + 1)
+
+
+	def poll_robot(self, turn):
+		"""Show the progress of the search, or play its move once done."""
+		try:
+			move = self.moves.get_nowait()
+		except queue.Empty:
+			playouts, best, share = self.mcts_player.progress()
+			text = 'Thinking: %d playouts' % playouts
+			if best is not None:
+				text += ', best %s (%d%%)' % (self.coord(best), share * 100)
+			self.itemconfig(self.progress_text, text=text)
+			self.after(100, self.poll_robot, turn)
+			return
+		self.thinking = False
+		self.itemconfig(self.progress_text, text='')
+		if isinstance(move, Exception):
+			raise move
+		self.play_robot(move, turn)
+
+
+	def play_robot(self, move, turn):
 		self.board.do_move(move)
 		row, col = self.board.move_to_location(move)
-		coord = '%s%s'%(chr(ord('A') + row), col + 1)
-		print('Program has moved to {}\n'.format(coord))
+		print('Program has moved to {}\n'.format(self.coord(move)))
 		self.draw_plain_stone(row,col)
 		#if self.prev_exist == False:
 		#	self.prev_exist = True
@@ -259,7 +331,8 @@ class BoardFrame(tk.Frame):
 	provide padding between other widgets.
 	"""
 	
-	def __init__(self, master=None):
+	def __init__(self, master=None, size=9):
+		self.size = size
 		choice = input("Choose player by entering 1 for Black or 2 for White (default player is Black): ")
 		turn = BLACK
 		try:
@@ -275,9 +348,13 @@ class BoardFrame(tk.Frame):
 		self.master.title("GOMOKU")	
 	
 	def create_widgets(self, turn):
-		self.boardCanvas = BoardCanvas(height=370, width=300)
+		# 30 pixels per line, with room for the messages below the board
+		width = (self.size + 1) * 30
+		self.boardCanvas = BoardCanvas(height=width + 70, width=width, size=self.size)
 		if turn == BLACK:
 			self.boardCanvas.bind(LEFTBUTTON, self.boardCanvas.gameLoop_human)
 		else:
 			self.boardCanvas.gameLoop_robot(True, True)
 		self.boardCanvas.pack()
+		self.moveNow = tk.Button(self, text='Move now', command=self.boardCanvas.move_now)
+		self.moveNow.pack()
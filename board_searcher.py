@@ -1,17 +1,85 @@
+import random
+import time
 from board_evaluator import BoardEvaluator
+from threat_detector import ThreatDetector
+from threat_solver import ThreatSpaceSolver
+from transposition import EXACT, LOWER, UPPER, NO_MOVE
+from zobrist import ZobristHash
+from search_stats import SearchStats
+from anytime import Snapshot
+
+
+class SearchAborted(Exception):
+	"""Raised inside the search when the abort callback returns True."""
+	pass
 
 
 class BoardSearcher(object):
 	"""Board searcher for best next move."""
 
-	def __init__ (self):
-		self.evaluator = BoardEvaluator()
-		self.board = [ [ 0 for n in range(9) ] for i in range(9) ]
+	def __init__ (self, evaluator=None, rows=9, cols=9):
+		# pass a shared BoardEvaluator (e.g. one holding an EvalCache) to
+		# reuse evaluations across searches
+		if evaluator is None:
+			evaluator = BoardEvaluator(rows=rows, cols=cols)
+		self.evaluator = evaluator
+		# answer forced moves directly and only search the defensive set
+		# when the opponent threatens a five or an open four
+		self.detector = ThreatDetector(evaluator)
+		self.use_threats = True
+		# look for a forced win before the full-width search:
+		# None - off, 'vcf' - continuous fours, 'vct' - fours and open threes
+		self.solver = ThreatSpaceSolver(self.detector, max_depth=8, max_nodes=300)
+		self.solver_mode = 'vcf'
+		# the board to search, any size: the tables below are fitted to it
+		# at the start of every search
+		self.board = [ [ 0 for n in range(cols) ] for i in range(rows) ]
 		self.gameover = 0
 		self.overvalue = 0
 		self.maxdepth = 3	# set the max depth to 3 so that the running time
 							# for each move is not too long
 							# depth: 1 - <1 sec, 2 - a few sec, 3 - up to 4 min
+		# principal variation search with iterative deepening, aspiration
+		# windows and killer/history move ordering; False runs the plain
+		# full-window alpha-beta search. Searches shallower than pvs_depth
+		# always run the plain search: at depth 2 PVS visits more nodes than
+		# it saves
+		self.use_pvs = True
+		self.pvs_depth = 3
+		self.__pvs = False	# PVS in the current search
+		self.window = 50	# half width of the aspiration window
+		self.nodes = 0		# nodes visited by the last search
+		self.killers = []	# killers[ply] = [move, move] that caused cutoffs
+		self.history = [ [ 0 for n in range(cols) ] for i in range(rows) ]
+		# at depth 0, keep searching fours, open threes and their defences
+		# until the position is quiet. Off by default: it visits several
+		# times more nodes (10304 against 2705 at depth 2) and has not been
+		# shown to play better; e.g. searcher:use_quiescence=True in arena.py
+		self.use_quiescence = False
+		self.qdepth = 8		# max plies of forcing moves below depth 0
+		self.qlimit = 5000	# max quiescence nodes per search
+		self.qnodes = 0
+		# optional transposition table with probe()/store() (see
+		# transposition.py), keyed by the Zobrist hash of board and turn
+		self.tt = None
+		self.zobrist = ZobristHash(cols, rows)
+		self.hash = 0
+		# optional callable polled during the search; when it returns True
+		# the search raises SearchAborted
+		self.abort = None
+		# if set, the root moves are shuffled with this seed instead of
+		# keeping the static order (used by parallel helper searches)
+		self.root_seed = None
+		# SearchStats of the last search, and of all searches since
+		# reset_game_stats()
+		self.stats = None
+		self.game_stats = SearchStats()
+		self.ply_nodes = []
+		self.cutoffs = {}
+		# pv_table[ply] is the best line found below the node at ply; after
+		# a search, self.pv is the principal variation from the root
+		self.pv_table = []
+		self.pv = []
 
 
 	def genMoves(self, turn):
@@ -22,14 +90,26 @@ class BoardSearcher(object):
 		moves = []
 		board = self.board
 		POSES = self.evaluator.POS
-		for i in range(9):
-			for j in range(9):
-				if board[i][j] == 0:
+		for i in range(len(board)):
+			boardrow = board[i]
+			for j in range(len(boardrow)):
+				if boardrow[j] == 0:
 					score = POSES[i][j]
 					moves.append((score, i, j))
 	
 		moves.sort(reverse=True)	# sort moves in reverse order, i.e., with decreasing scores
 		return moves
+
+
+	def orderMoves(self, moves, ply):
+		"""Order moves for PVS: killer moves of this ply first, then by
+		history score, then by the POS weight of genMoves."""
+		killers = self.killers[ply]
+		history = self.history
+		def key(move):
+			score, i, j = move
+			return ((i, j) in killers, history[i][j], score)
+		return sorted(moves, key=key, reverse=True)
 	
 
 	def __search(self, turn, depth, alpha = -0x7fffffff, beta = 0x7fffffff):
@@ -38,10 +118,17 @@ class BoardSearcher(object):
 		Minimax algorithm with alpha-beta pruning.
 		0x7fffffff == (2^31)-1, indicating a large value
 		"""
+		self.nodes += 1
+		if self.abort is not None and self.nodes & 255 == 0 and self.abort():
+			raise SearchAborted()
+		self.ply_nodes[self.maxdepth - depth] += 1
+		self.pv_table[self.maxdepth - depth] = []
 
 		# base case: depth is 0
 		# evaluate the board and return
 		if depth <= 0:
+			if self.use_quiescence:
+				return self.__quiesce(turn, alpha, beta, 0)
 			score = self.evaluator.evaluate(self.board, turn)
 			return score
 
@@ -50,18 +137,57 @@ class BoardSearcher(object):
 		if abs(score) >= 9999 and depth < self.maxdepth: 
 			return score
 
+		ply = self.maxdepth - depth
+		tt = self.tt
+		ttmove = None
+		if tt is not None:
+			entry = tt.probe(self.hash)
+			if entry is not None:
+				edepth, escore, eflag, emove = entry
+				if edepth >= depth and ply > 0:
+					if eflag == EXACT:
+						return escore
+					if eflag == LOWER and escore >= beta:
+						return escore
+					if eflag == UPPER and escore <= alpha:
+						return escore
+				if emove != NO_MOVE:
+					ttmove = divmod(emove, self.zobrist.width)
+		alpha_orig = alpha
+
 		# generate new moves
 		moves = self.genMoves(turn)
+		# threat detection costs about as much as a few evaluations, so it is
+		# only used where it prunes whole subtrees
+		if self.use_threats and depth >= 2:
+			kind, forced = self.detector.forced_moves(self.board, turn)
+			if forced:
+				forced = set(forced)
+				moves = [move for move in moves if (move[1], move[2]) in forced]
+		# the root keeps the static order, so that among equal scores the
+		# same move is chosen as by the plain search
+		pvs = self.__pvs
+		if pvs and ply > 0:
+			moves = self.orderMoves(moves, ply)
+		if ply > 0 and ttmove is not None:
+			moves.sort(key=lambda move: (move[1], move[2]) != ttmove)
+		elif ply == 0 and self.root_seed is not None:
+			random.Random(self.root_seed + depth).shuffle(moves)
+		zkeys = self.zobrist.keys
+		zturn = self.zobrist.turn_key
+		width = self.zobrist.width
 		bestmove = None
+		first = True
 
 		# for all current moves
 		# len(moves) == num of empty intersections on current board
 		# worst case O(m^n) or O( m!/(m-n)! ), m = num of empty spots, 
 		# 			n = depth(num of further steps this program predicts)
-		for score, row, col in moves:
+		for index, (score, row, col) in enumerate(moves):
 
 			# label current move to board
 			self.board[row][col] = turn
+			self.hash ^= zkeys[row * width + col][turn] ^ zturn
 			
 			# calculate next turn
 			if turn == 1:
@@ -70,10 +196,18 @@ class BoardSearcher(object):
 				nturn = 1
 			
 			# DFS, return score and position of move
-			score = - self.__search(nturn, depth - 1, -beta, -alpha)
+			if not pvs or first:
+				score = - self.__search(nturn, depth - 1, -beta, -alpha)
+			else:
+				# null-window scout, re-searched only if it beats alpha
+				score = - self.__search(nturn, depth - 1, -alpha - 1, -alpha)
+				if alpha < score < beta:
+					score = - self.__search(nturn, depth - 1, -beta, -alpha)
+			first = False
 
 			# clear current move on board
 			self.board[row][col] = 0
+			self.hash ^= zkeys[row * width + col][turn] ^ zturn
 
 			# calculate the move with best score
 			# alpha beta pruning: removes nodes that are evaluated by the minimax algorithm
@@ -82,9 +216,25 @@ class BoardSearcher(object):
 			if score > alpha:
 				alpha = score
 				bestmove = (row, col)
+				self.pv_table[ply] = [ (row, col) ] + self.pv_table[ply + 1]
 				if alpha >= beta:
+					self.cutoffs[index] = self.cutoffs.get(index, 0) + 1
+					if pvs:
+						self.__record_cutoff(ply, row, col, depth)
 					break
 		
+		if tt is not None:
+			if alpha <= alpha_orig:
+				flag = UPPER
+			elif alpha >= beta:
+				flag = LOWER
+			else:
+				flag = EXACT
+			if bestmove:
+				tt.store(self.hash, depth, alpha, flag, bestmove[0] * self.zobrist.width + bestmove[1])
+			else:
+				tt.store(self.hash, depth, alpha, flag)
+
 		# if depth is max depth, record the best move
 		if depth == self.maxdepth and bestmove:
 			self.bestmove = bestmove
@@ -94,12 +244,275 @@ class BoardSearcher(object):
 
 	# specific search
 	# args: turn: 1(black)/2(white), depth
-	def search(self, turn, depth=3):
+	# with stats=True, return (score, row, col, SearchStats) instead of
+	# (score, row, col); self.stats holds the SearchStats either way
+	def search(self, turn, depth=3, stats=False):
+		self.__fit()
+		evaluator = self.evaluator
+		before = evaluator.counters()
+		start = time.perf_counter()
+		self.nodes = 0
+		self.qnodes = 0
+		self.ply_nodes = [ 0 for i in range(depth + 1) ]
+		self.cutoffs = {}
+		self.pv_table = [ [] for i in range(depth + 2) ]
+		try:
+			score, row, col = self.__search_root(turn, depth)
+			self.pv = self.pv_table[0] or [ (row, col) ]
+		finally:
+			after = evaluator.counters()
+			result = SearchStats()
+			result.searches = 1
+			result.nodes = self.ply_nodes
+			result.qnodes = self.qnodes
+			result.cutoffs = self.cutoffs
+			result.eval_calls = after['calls'] - before['calls']
+			result.eval_scored = after['scored'] - before['scored']
+			result.eval_seconds = after['seconds'] - before['seconds']
+			result.line_calls = after['line_calls'] - before['line_calls']
+			result.elapsed = time.perf_counter() - start
+			self.stats = result
+			self.game_stats.merge(result)
+		if stats:
+			return score, row, col, result
+		return score, row, col
+
+
+	def __fit(self):
+		"""Size the evaluator and the Zobrist keys to self.board."""
+		rows, cols = len(self.board), len(self.board[0])
+		evaluator = self.evaluator
+		if evaluator.rows != rows or evaluator.cols != cols:
+			evaluator.resize(rows, cols)
+		zobrist = self.zobrist
+		if zobrist.width != cols or zobrist.height != rows:
+			self.zobrist = ZobristHash(cols, rows)
+
+
+	def reset_game_stats(self):
+		"""Start collecting game_stats anew, e.g. before a new game."""
+		self.game_stats = SearchStats()
+
+
+	def __search_root(self, turn, depth):
 		self.maxdepth = depth
 		self.bestmove = None
-		score = self.__search(turn, depth)
-		if abs(score) > 8000:
+		shortcut = self.__shortcut(turn)
+		if shortcut:
+			return shortcut
+		self.hash = self.zobrist.hash_grid(self.board, turn)
+		saved = [ list(row) for row in self.board ]
+		self.__pvs = self.use_pvs and depth >= self.pvs_depth
+		try:
+			if self.__pvs:
+				score = self.__iterate(turn, depth)
+			else:
+				self.maxdepth = depth
+				score = self.__search(turn, depth)
+		except SearchAborted:
+			# take back the moves of the interrupted variation
+			for i, row in enumerate(saved):
+				self.board[i][:] = row
+			raise
+		# without quiescence the leaf scores of threats are unreliable,
+		# so won or lost positions are checked again at depth 1
+		if abs(score) > 8000 and not self.use_quiescence:
 			self.maxdepth = depth
 			score = self.__search(turn, 1)
 		row, col = self.bestmove
-		return score, row, col
\ No newline at end of file
+		return score, row, col
+
+
+	def __shortcut(self, turn):
+		"""Return (score, row, col) of a forced move or of the first move of
+		a forced win found by the solver, or None."""
+		if self.use_threats:
+			forced = self.__forced_move(turn)
+			if forced:
+				return forced
+		if self.solver_mode:
+			line = self.solve(turn, self.solver_mode)
+			if line:
+				row, col = line[0]
+				self.bestmove = (row, col)
+				self.pv_table[0] = list(line)
+				return 9999, row, col
+		return None
+
+
+	def iter_search(self, turn, depth=3, token=None):
+		"""Anytime version of search: a generator of anytime.Snapshot.
+
+		Yields a snapshot after each completed depth of iterative deepening,
+		then a final one. When token (a callable such as
+		anytime.CancelToken) returns True the search stops, and the final
+		snapshot holds the result of the deepest completed depth.
+		"""
+		self.__fit()
+		start = time.perf_counter()
+		abort = self.abort
+		if token is not None:
+			self.abort = token
+		self.nodes = 0
+		self.qnodes = 0
+		self.ply_nodes = [ 0 for i in range(depth + 1) ]
+		self.cutoffs = {}
+		self.pv_table = [ [] for i in range(depth + 2) ]
+		self.maxdepth = depth
+		self.bestmove = None
+		self.__pvs = self.use_pvs and depth >= self.pvs_depth
+		last = None
+		try:
+			shortcut = self.__shortcut(turn)
+			if shortcut:
+				score, row, col = shortcut
+				self.pv = self.pv_table[0] or [ (row, col) ]
+				yield Snapshot((row, col), score, [ ((row, col), score) ], self.pv,
+					self.nodes, depth, time.perf_counter() - start, final=True)
+				return
+			self.hash = self.zobrist.hash_grid(self.board, turn)
+			saved = [ list(row) for row in self.board ]
+			try:
+				for d, score in self.__deepen(turn, depth):
+					self.pv = self.pv_table[0] or [ self.bestmove ]
+					last = Snapshot(self.bestmove, score, [ (self.bestmove, score) ], self.pv,
+						self.nodes + self.qnodes, d, time.perf_counter() - start)
+					yield last
+			except SearchAborted:
+				for i, row in enumerate(saved):
+					self.board[i][:] = row
+		finally:
+			self.abort = abort
+		if last is None:
+			# stopped before depth 1 finished: fall back to the static order
+			score, row, col = self.genMoves(turn)[0]
+			last = Snapshot((row, col), None, [], [ (row, col) ], self.nodes + self.qnodes, 0)
+			self.bestmove = (row, col)
+		last.final = True
+		last.nodes = self.nodes + self.qnodes
+		last.elapsed = time.perf_counter() - start
+		yield last
+
+
+	def __iterate(self, turn, depth):
+		"""Iterative deepening to depth, return the best score."""
+		score = None
+		for d, score in self.__deepen(turn, depth):
+			pass
+		return score
+
+
+	def __deepen(self, turn, depth):
+		"""Iterative deepening to depth with aspiration windows, yield
+		(depth, score) after each completed depth.
+
+		The evaluation swings between odd and even depths, so the window is
+		centred on the score of the iteration two plies shallower.
+		"""
+		self.killers = [ [ None, None ] for i in range(depth + 1) ]
+		self.history = [ [ 0 for n in range(len(self.board[0])) ] for i in range(len(self.board)) ]
+		scores = {}
+		score = None
+		for d in range(1, depth + 1):
+			self.maxdepth = d
+			previous = scores.get(d - 2)
+			# no window around won or lost positions
+			if previous is None or abs(previous) >= 9000:
+				score = self.__search(turn, d)
+			else:
+				alpha = previous - self.window
+				beta = previous + self.window
+				score = self.__search(turn, d, alpha, beta)
+				if score <= alpha or score >= beta:
+					score = self.__search(turn, d)
+			scores[d] = score
+			yield d, score
+
+
+	def __quiesce(self, turn, alpha, beta, qply):
+		"""Quiescence search below depth 0, return the score.
+
+		A position is quiet when neither side has a four or an open three.
+		Otherwise only the forcing moves are searched: the blocks and
+		defences when the opponent threatens, else the own open fours, with
+		the static evaluation as a stand-pat score.
+		"""
+		self.qnodes += 1
+		if self.abort is not None and self.qnodes & 63 == 0 and self.abort():
+			raise SearchAborted()
+		board = self.board
+		detector = self.detector
+		score = self.evaluator.evaluate(board, turn)
+		if abs(score) >= 9999 or qply >= self.qdepth or self.qnodes >= self.qlimit:
+			return score
+		fives, fours = detector.scan(board)
+		# a four to complete is scored as a win by the evaluator
+		if fives[turn]:
+			return score
+
+		if turn == 1:
+			nturn = 2
+		else:
+			nturn = 1
+		moves = fives[nturn]
+		if not moves:
+			threats = detector.open_fours_among(board, nturn, fours[nturn])
+			if threats:
+				moves = detector.defend_points(board, turn, threats)
+			else:
+				moves = detector.open_fours_among(board, turn, fours[turn])
+				if not moves:
+					return score
+				if score >= beta:
+					return score
+				if score > alpha:
+					alpha = score
+		if not moves:
+			return score
+
+		for row, col in moves:
+			board[row][col] = turn
+			score = - self.__quiesce(nturn, -beta, -alpha, qply + 1)
+			board[row][col] = 0
+			if score > alpha:
+				alpha = score
+				if alpha >= beta:
+					break
+		return alpha
+
+
+	def __record_cutoff(self, ply, row, col, depth):
+		"""Remember a move that caused a beta cutoff."""
+		killers = self.killers[ply]
+		if killers[0] != (row, col):
+			killers[1] = killers[0]
+			killers[0] = (row, col)
+		self.history[row][col] += depth * depth
+
+
+	def solve(self, turn, mode='vcf'):
+		"""Run the threat-space solver on the current board.
+
+		Return the winning line as a list of (row, col), or None.
+		"""
+		if mode == 'vct':
+			return self.solver.solve(self.board, turn)
+		return self.solver.vcf(self.board, turn)
+
+
+	def __forced_move(self, turn):
+		"""Return (score, row, col) if turn has a five to complete or a single
+		point to block, otherwise None."""
+		kind, moves = self.detector.forced_moves(self.board, turn)
+		if kind == 'win' or (kind is not None and len(moves) == 1):
+			row, col = moves[0]
+			if turn == 1:
+				nturn = 2
+			else:
+				nturn = 1
+			self.board[row][col] = turn
+			score = - self.evaluator.evaluate(self.board, nturn)
+			self.board[row][col] = 0
+			self.bestmove = (row, col)
+			return score, row, col
+		return None
@@ -0,0 +1,507 @@
+"""
+engine_server.py
+Asyncio TCP server that hosts many games at once and runs their searches
+on one shared pool of worker processes.
+
+    python engine_server.py serve [--port 7600] [--workers 4] [--max-queue 64]
+        [--warm-tree FILE.gmt]
+    python engine_server.py loopback [--games 8] [--moves 20] [--deadline 0.5] [--size 9]
+
+The protocol is one JSON object per line in each direction. Every request
+has an "op" and may carry an "id", which is copied to its response:
+
+    {"op": "new", "engine": "mcts", "depth": 4}     -> {"session": 1, ...}
+    {"op": "new", "size": 15}                       -> {"session": 2, ...}
+    {"op": "play", "session": 1, "move": 40}        -> {"end": false, ...}
+    {"op": "think", "session": 1, "deadline": 1.0}  -> {"move": 41, ...}
+    {"op": "state", "session": 1}                   -> {"grid": [...], ...}
+    {"op": "close", "session": 1}
+    {"op": "metrics"}
+
+"think" asks the session's engine for a move, plays it and answers within
+"deadline" seconds from the request's arrival, queueing included. Failed
+requests are answered with {"error": ...}: "busy" means the queue is full,
+or for "play" that a "think" of the session is pending, and "expired"
+that the deadline passed before a worker was free; neither changes the
+game, and the request can be retried later. "new" plays on a 9x9 board
+unless it asks for another "size" from 5 to 25; moves are row * size + col. Closing a session fails its
+waiting "think" requests with "closed", and "play" and "think" fail with
+"game over" once the game has ended.
+
+Scheduling is round-robin over the sessions with waiting requests, one
+search per session at a time, so a busy game cannot starve the others.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from game_board import Board
+
+ENGINES = ('mcts', 'searcher')
+# share of a request's remaining time given to the search; the rest covers
+# the transport and the reply
+SAFETY = 0.15
+MIN_TIME = 0.02
+MIN_SIZE = 5
+MAX_SIZE = 25
+
+_players = {}
+# tree checkpoint the MCTS players of this worker start from, see
+# tree_checkpoint.py
+_warm_tree = None
+
+
+def _init_worker(warm_tree=None):
+    # import the engines up front, so that the first search of every
+    # worker does not pay for it
+    global _warm_tree
+    warnings.filterwarnings("ignore")
+    import mcts
+    import player
+    _warm_tree = warm_tree
+
+
+def _think(engine, depth, grid, side, last_move, time_limit):
+    """Worker process: return (move, nodes) for the position. Players are
+    cached per engine, so every worker can serve any session."""
+    key = (engine, depth)
+    player = _players.get(key)
+    if player is None:
+        if engine == 'searcher':
+            from player import SearcherPlayer
+            player = SearcherPlayer(depth)
+        else:
+            from mcts import MCTSPlayer
+            player = MCTSPlayer(warm_tree=_warm_tree)
+        _players[key] = player
+    board = Board(width=len(grid[0]), height=len(grid))
+    board.set_position(grid, side, last_move)
+    move = player.get_action(board, time_limit=time_limit)
+    return move, player.nodes
+
+
+def _percentiles(values, points=(50, 90, 99)):
+    values = sorted(values)
+    if not values:
+        return dict(('p%d' % p, None) for p in points)
+    return dict(('p%d' % p, values[min(len(values) - 1, len(values) * p // 100)])
+                for p in points)
+
+
+class ServerError(Exception):
+    pass
+
+
+class Session(object):
+    """One game: a Board, the engine that plays in it, and its requests
+    waiting for a worker."""
+
+    def __init__(self, session_id, engine='mcts', depth=4, size=9):
+        if engine not in ENGINES:
+            raise ServerError('unknown engine %s' % engine)
+        if not MIN_SIZE <= size <= MAX_SIZE:
+            raise ServerError('size %d is not from %d to %d' % (size, MIN_SIZE, MAX_SIZE))
+        self.id = session_id
+        self.engine = engine
+        self.depth = depth
+        self.board = Board(width=size, height=size, n_in_row=5)
+        self.board.init_board(0)
+        self.jobs = deque()
+        self.busy = False
+        self.closed = False
+
+    def check_playing(self):
+        if self.board.game_end()[0]:
+            raise ServerError('game over')
+
+    def play(self, move):
+        board = self.board
+        self.check_playing()
+        if move not in board.availables:
+            raise ServerError('illegal move %s' % move)
+        board.do_move(move)
+        return self.result()
+
+    def result(self):
+        end, winner = self.board.game_end()
+        return {'end': end, 'winner': winner, 'to_move': self.board.get_current_player(),
+                'moves': len(self.board.states)}
+
+
+class Job(object):
+    def __init__(self, session, deadline, future):
+        self.session = session
+        self.arrived = time.time()
+        self.deadline = self.arrived + deadline
+        self.future = future
+
+
+class Scheduler(object):
+    """Hands the search requests of all sessions to a process pool: at most
+    one request per worker in flight, round-robin across sessions, and at
+    most max_queue requests waiting."""
+
+    def __init__(self, workers=4, max_queue=64, warm_tree=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                        initargs=(warm_tree,))
+        self.ready = deque()
+        self.queued = 0
+        self.in_flight = 0
+        self.wakeup = asyncio.Event()
+        self.started = time.time()
+        # metrics
+        self.completed = 0
+        self.rejected = 0
+        self.expired = 0
+        self.late = 0
+        self.latencies = deque(maxlen=2000)
+        self.waits = deque(maxlen=2000)
+        self.nodes = 0
+
+    def submit(self, session, deadline):
+        """Queue a search for session and return a future of its reply."""
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise ServerError('busy')
+        future = asyncio.get_event_loop().create_future()
+        session.jobs.append(Job(session, deadline, future))
+        self.queued += 1
+        if not session.busy and len(session.jobs) == 1:
+            self.ready.append(session)
+        self.wakeup.set()
+        return future
+
+    async def run(self):
+        """Dispatch loop: start the next session's job whenever a worker is
+        free."""
+        while True:
+            while not self.ready or self.in_flight >= self.workers:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            session = self.ready.popleft()
+            if not session.jobs:
+                # its jobs were cancelled since it was queued
+                continue
+            job = session.jobs.popleft()
+            self.queued -= 1
+            if session.closed:
+                if not job.future.done():
+                    job.future.set_exception(ServerError('closed'))
+                self._release(session)
+                continue
+            if job.future.done():
+                self._release(session)
+                continue
+            if session.board.game_end()[0]:
+                # a think queued behind the one that ended the game
+                job.future.set_exception(ServerError('game over'))
+                self._release(session)
+                continue
+            remaining = job.deadline - time.time()
+            if remaining <= MIN_TIME:
+                self.expired += 1
+                job.future.set_exception(ServerError('expired'))
+                self._release(session)
+                continue
+            session.busy = True
+            self.in_flight += 1
+            asyncio.ensure_future(self._search(job, remaining))
+
+    def cancel(self, session):
+        """Close session and fail its waiting requests; a search already
+        running is left to finish."""
+        session.closed = True
+        while session.jobs:
+            job = session.jobs.popleft()
+            self.queued -= 1
+            if not job.future.done():
+                job.future.set_exception(ServerError('closed'))
+
+    def _release(self, session):
+        """Make session schedulable again, behind the sessions waiting now."""
+        session.busy = False
+        if session.jobs and not session.closed:
+            self.ready.append(session)
+            self.wakeup.set()
+
+    async def _search(self, job, remaining):
+        session = job.session
+        board = session.board
+        started = time.time()
+        try:
+            loop = asyncio.get_event_loop()
+            move, nodes = await loop.run_in_executor(
+                self.pool, _think, session.engine, session.depth, board.get_2d_board(),
+                board.get_current_player(), board.last_move,
+                max(remaining * (1 - SAFETY) - 0.01, MIN_TIME))
+            reply = {'move': move, 'location': list(board.move_to_location(move)),
+                     'nodes': nodes}
+            reply.update(session.play(move))
+            done = time.time()
+            reply['elapsed'] = done - job.arrived
+            self.completed += 1
+            self.nodes += nodes
+            self.latencies.append(done - job.arrived)
+            self.waits.append(started - job.arrived)
+            if done > job.deadline:
+                self.late += 1
+            if not job.future.done():
+                job.future.set_result(reply)
+        except Exception as error:
+            if not job.future.done():
+                job.future.set_exception(error)
+        finally:
+            self.in_flight -= 1
+            self._release(session)
+            self.wakeup.set()
+
+    def metrics(self):
+        uptime = time.time() - self.started
+        return {
+            'uptime': uptime,
+            'workers': self.workers,
+            'queue_depth': self.queued,
+            'in_flight': self.in_flight,
+            'completed': self.completed,
+            'rejected': self.rejected,
+            'expired': self.expired,
+            'late': self.late,
+            'moves_per_second': self.completed / uptime if uptime else 0.0,
+            'nodes': self.nodes,
+            'latency': _percentiles(self.latencies),
+            'queue_wait': _percentiles(self.waits),
+        }
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+
+
+class EngineServer(object):
+    """The sessions and the TCP front-end of a Scheduler."""
+
+    def __init__(self, workers=4, max_queue=64, warm_tree=None):
+        self.scheduler = Scheduler(workers, max_queue, warm_tree)
+        self.sessions = {}
+        self.ids = itertools.count(1)
+        self.server = None
+        self.dispatcher = None
+
+    async def start(self, host='127.0.0.1', port=7600):
+        self.dispatcher = asyncio.ensure_future(self.scheduler.run())
+        self.server = await asyncio.start_server(self.handle_client, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.dispatcher.cancel()
+        self.scheduler.close()
+
+    async def handle_client(self, reader, writer):
+        """Serve one connection; its requests are handled concurrently and
+        answered as they complete."""
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.ensure_future(self.respond(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def respond(self, line, writer):
+        request_id = None
+        try:
+            request = json.loads(line.decode())
+            if not isinstance(request, dict):
+                raise ValueError('not a JSON object')
+            request_id = request.get('id')
+            reply = await self.dispatch(request)
+        except ServerError as error:
+            reply = {'error': str(error)}
+        except (ValueError, KeyError, TypeError) as error:
+            reply = {'error': 'bad request: %s' % error}
+        except Exception as error:
+            # e.g. a broken worker pool: the client still gets an answer
+            reply = {'error': 'internal error: %s: %s' % (type(error).__name__, error)}
+        if request_id is not None:
+            reply['id'] = request_id
+        writer.write((json.dumps(reply) + '\n').encode())
+        await writer.drain()
+
+    def session(self, request):
+        session = self.sessions.get(request['session'])
+        if session is None:
+            raise ServerError('no session %s' % request['session'])
+        return session
+
+    async def dispatch(self, request):
+        op = request['op']
+        if op == 'new':
+            session = Session(next(self.ids), request.get('engine', 'mcts'),
+                              int(request.get('depth', 4)), int(request.get('size', 9)))
+            self.sessions[session.id] = session
+            reply = {'session': session.id}
+            reply.update(session.result())
+            return reply
+        if op == 'play':
+            session = self.session(request)
+            if session.busy or session.jobs:
+                # a pending think would play its move on the changed board
+                raise ServerError('busy')
+            return session.play(int(request['move']))
+        if op == 'think':
+            session = self.session(request)
+            session.check_playing()
+            return await self.scheduler.submit(session, float(request.get('deadline', 5.0)))
+        if op == 'state':
+            session = self.session(request)
+            reply = {'grid': session.board.get_2d_board()}
+            reply.update(session.result())
+            return reply
+        if op == 'close':
+            session = self.sessions.pop(request['session'], None)
+            if session is not None:
+                self.scheduler.cancel(session)
+            return {'closed': session is not None}
+        if op == 'metrics':
+            reply = self.scheduler.metrics()
+            reply['sessions'] = len(self.sessions)
+            return reply
+        raise ServerError('unknown op %s' % op)
+
+
+class Client(object):
+    """Asyncio client that can have many requests outstanding on one
+    connection."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count(1)
+        self.waiting = {}
+        self.receiver = asyncio.ensure_future(self._receive())
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=7600):
+        reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+
+    async def _receive(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            reply = json.loads(line.decode())
+            future = self.waiting.pop(reply.pop('id', None), None)
+            if future is not None:
+                future.set_result(reply)
+
+    async def request(self, op, **fields):
+        fields['op'] = op
+        fields['id'] = next(self.ids)
+        future = asyncio.get_event_loop().create_future()
+        self.waiting[fields['id']] = future
+        self.writer.write((json.dumps(fields) + '\n').encode())
+        await self.writer.drain()
+        return await future
+
+    def close(self):
+        self.receiver.cancel()
+        self.writer.close()
+
+
+async def _play_game(client, engine, depth, moves, deadline, size):
+    """Let the engine play both sides of one game for up to moves moves."""
+    session = (await client.request('new', engine=engine, depth=depth,
+                                    size=size))['session']
+    played = busy = errors = 0
+    while played < moves:
+        reply = await client.request('think', session=session, deadline=deadline)
+        if reply.get('error') in ('busy', 'expired'):
+            busy += 1
+            await asyncio.sleep(0.05)
+            continue
+        if 'error' in reply:
+            errors += 1
+            break
+        played += 1
+        if reply['end']:
+            break
+    await client.request('close', session=session)
+    return played, busy, errors
+
+
+async def loopback(games=8, moves=20, deadline=0.5, engine='mcts', depth=4,
+                   workers=4, max_queue=64, port=0, size=9):
+    """Start a server on the loopback interface, play games concurrently
+    against it through one client connection and return its metrics."""
+    server = EngineServer(workers, max_queue)
+    port = await server.start('127.0.0.1', port)
+    client = await Client.connect('127.0.0.1', port)
+    try:
+        results = await asyncio.gather(*[
+            _play_game(client, engine, depth, moves, deadline, size) for _ in range(games)])
+        metrics = await client.request('metrics')
+    finally:
+        client.close()
+        await server.stop()
+    metrics['games'] = games
+    metrics['busy_retries'] = sum(busy for _, busy, _ in results)
+    metrics['errors'] = sum(errors for _, _, errors in results)
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gomoku engine server')
+    sub = parser.add_subparsers(dest='command')
+    serve = sub.add_parser('serve', help='run the server')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=7600)
+    serve.add_argument('--warm-tree', help='tree checkpoint for the MCTS players to start from')
+    bench = sub.add_parser('loopback', help='play games against an in-process server')
+    bench.add_argument('--games', type=int, default=8)
+    bench.add_argument('--moves', type=int, default=20, help='moves per game')
+    bench.add_argument('--deadline', type=float, default=0.5, help='seconds per move')
+    bench.add_argument('--engine', choices=ENGINES, default='mcts')
+    bench.add_argument('--depth', type=int, default=4)
+    bench.add_argument('--size', type=int, default=9, help='board width and height')
+    for command in (serve, bench):
+        command.add_argument('--workers', type=int, default=4)
+        command.add_argument('--max-queue', type=int, default=64)
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    if args.command == 'serve':
+        server = EngineServer(args.workers, args.max_queue, args.warm_tree)
+        port = loop.run_until_complete(server.start(args.host, args.port))
+        print('serving on %s:%d' % (args.host, port))
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            loop.run_until_complete(server.stop())
+    elif args.command == 'loopback':
+        metrics = loop.run_until_complete(loopback(
+            args.games, args.moves, args.deadline, args.engine, args.depth,
+            args.workers, args.max_queue, size=args.size))
+        print(json.dumps(metrics, indent=2))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+feature_encoder.py
+Feature planes of Board.current_state(), written into caller-supplied
+buffers instead of a new float64 array per call.
+
+The planes are those of current_state, in the same orientation (rows
+flipped, so that the first row of a plane is the last row of the board):
+
+    0: stones of the player to move
+    1: stones of the opponent
+    2: the last move
+    3: all ones when the first player is to move
+
+Buffers can be of any numeric dtype, typically float32 for a model or
+uint8 for storage, with shape (4, height, width) for one position or
+(N, 4, height, width) for a batch. encode() and encode_batch() fill them
+from boards; reset(), push() and pop() keep one position up to date as
+moves are played and taken back; augment() applies the 8 symmetries of
+the square board in place.
+"""
+
+import numpy as np
+
+
+class FeatureEncoder(object):
+    """Writes the feature planes of width x height boards."""
+
+    def __init__(self, width=9, height=9):
+        self.width = width
+        self.height = height
+        size = width * height
+        # move -> flat index of its point in a (flipped) plane
+        self.point = [(height - 1 - move // width) * width + move % width
+                      for move in range(size)]
+        self._transforms = None
+
+    def new_buffer(self, count=None, dtype=np.float32):
+        """Return a zeroed buffer for one position, or count positions."""
+        shape = (4, self.height, self.width)
+        return np.zeros(shape if count is None else (count,) + shape, dtype=dtype)
+
+    def encode(self, board, out):
+        """Write the planes of board into out, shape (4, height, width)."""
+        out.fill(0)
+        flat = out.reshape(4, -1)
+        point = self.point
+        current = board.current_player
+        for move, player in board.states.items():
+            flat[0 if player == current else 1, point[move]] = 1
+        if board.states and board.last_move >= 0:
+            flat[2, point[board.last_move]] = 1
+        if len(board.states) % 2 == 0:
+            out[3] = 1
+        return out
+
+    def encode_batch(self, boards, out=None, dtype=np.float32):
+        """Write the planes of boards into out[:len(boards)], allocating a
+        buffer of dtype if out is None; return out."""
+        if out is None:
+            out = self.new_buffer(len(boards), dtype)
+        for i, board in enumerate(boards):
+            self.encode(board, out[i])
+        return out
+
+    # incremental updates ---------------------------------------------
+
+    def reset(self, out):
+        """Set out to the planes of the empty board."""
+        out.fill(0)
+        out[3] = 1
+        return out
+
+    def push(self, out, move):
+        """Update out for move played by the player to move."""
+        flat = out.reshape(4, -1)
+        index = self.point[move]
+        flat[0, index] = 1
+        self._swap(out)
+        out[2].fill(0)
+        flat[2, index] = 1
+        out[3].fill(0 if flat[3, 0] else 1)
+        return out
+
+    def pop(self, out, move, last_move=-1):
+        """Undo push(out, move); last_move is the move before it, or -1."""
+        flat = out.reshape(4, -1)
+        out[3].fill(0 if flat[3, 0] else 1)
+        self._swap(out)
+        flat[0, self.point[move]] = 0
+        out[2].fill(0)
+        if last_move >= 0:
+            flat[2, self.point[last_move]] = 1
+        return out
+
+    @staticmethod
+    def _swap(out):
+        # exchange planes 0 and 1 without a temporary (they hold 0 and 1)
+        a, b = out[0], out[1]
+        np.add(a, b, out=a)
+        np.subtract(a, b, out=b)
+        np.subtract(a, b, out=a)
+
+    # symmetries ------------------------------------------------------
+
+    def transforms(self):
+        """Return the 8 symmetries as (plane, probs) gather indexes: index
+        k of a transformed plane (flattened) is index plane[k] of the
+        original, and likewise for move probabilities indexed by move."""
+        if self._transforms is None:
+            if self.width != self.height:
+                raise ValueError('symmetries need a square board')
+            grid = np.arange(self.width * self.height).reshape(self.height, self.width)
+            self._transforms = []
+            for k in range(8):
+                def apply(a):
+                    a = np.rot90(a, k % 4)
+                    return np.fliplr(a) if k >= 4 else a
+                # probs are indexed by move, i.e. in unflipped rows
+                self._transforms.append((apply(grid).ravel(),
+                                         np.flipud(apply(np.flipud(grid))).ravel()))
+        return self._transforms
+
+    def augment(self, planes, probs=None, symmetry=None, rng=np.random, scratch=None):
+        """Apply a symmetry to every position of a batch in place.
+
+        planes: (N, 4, height, width); probs: optional (N, width * height)
+            move probabilities, transformed alike.
+        symmetry: one index in 0-7 for the whole batch, a sequence of N
+            indexes, or None to draw them from rng.
+        scratch: optional (4, height * width) buffer of planes.dtype; one
+            is allocated per call otherwise.
+        Return the symmetry index of each position.
+        """
+        count = len(planes)
+        if symmetry is None:
+            symmetry = rng.randint(0, 8, size=count)
+        elif np.isscalar(symmetry):
+            symmetry = np.full(count, symmetry, dtype=int)
+        transforms = self.transforms()
+        size = self.width * self.height
+        flat = planes.reshape(count, 4, size)
+        if scratch is None:
+            scratch = np.empty((4, size), dtype=planes.dtype)
+        prob_scratch = np.empty(size, dtype=probs.dtype) if probs is not None else None
+        for i in range(count):
+            k = symmetry[i]
+            if k == 0:
+                continue
+            plane_index, prob_index = transforms[k]
+            np.take(flat[i], plane_index, axis=1, out=scratch)
+            flat[i] = scratch
+            if probs is not None:
+                np.take(probs[i], prob_index, out=prob_scratch)
+                probs[i] = prob_scratch
+        return symmetry
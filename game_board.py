@@ -23,12 +23,28 @@ class Board(object):
         self.availables = list(range(self.width * self.height))
         self.states = {}
         self.last_move = -1
-        # also keep a 2D board as a 9*9 array: each posision is initially set to be 0
-        self.__board = [[0 for _ in range(9)] for _ in range(9)]
+        # also keep a 2D board as a height*width array: each posision is initially set to be 0
+        self.__board = [[0 for _ in range(self.width)] for _ in range(self.height)]
 
     def get_2d_board(self):
         """Return the board array."""
         return self.__board
+
+    def set_position(self, grid, current_player, last_move=-1):
+        """Set up the position of a 2D grid (grid[row][col] is 0, 1 or 2)
+        with current_player to move, replacing the current state."""
+        width = self.width
+        self.current_player = current_player
+        self.last_move = last_move
+        self.__board = [list(line) for line in grid]
+        self.states = {}
+        self.availables = []
+        for row, line in enumerate(grid):
+            for col, stone in enumerate(line):
+                if stone:
+                    self.states[row * width + col] = stone
+                else:
+                    self.availables.append(row * width + col)
     
     def move_to_location(self, move):
         row = move // self.width
@@ -123,10 +139,12 @@ class Board(object):
         return self.current_player
 
     def show(self, player1, player2):
-        """Output current board on terminal."""
-        print('  A B C D E F G H I')
+        """Output current board on terminal: rows are lettered from A
+        across the top, columns numbered from 1 down the side."""
+        digits = len(str(self.width))
+        print(' ' * (digits + 1) + ' '.join(chr(ord('A') + row) for row in range(self.height)))
         for col in range(self.width):
-            print(col + 1, end=" ")
+            print('%*d' % (digits, col + 1), end=" ")
             for row in range(self.height):
                 loc = row * self.width + col
                 ch = self.states.get(loc, -1)
@@ -150,9 +168,11 @@ class Board(object):
 class GameBoard(object):
     """Game board."""
 
-    def __init__(self):
-        # board is a 9*9 array: each posision is initially set to be 0
-        self.__board = [[0 for _ in range(9)] for _ in range(9)]
+    def __init__(self, width=9, height=9):
+        self.width = width
+        self.height = height
+        # board is a height*width array: each posision is initially set to be 0
+        self.__board = [[0 for _ in range(width)] for _ in range(height)]
 
         # store positions of 5 stones in a line
         self.won = {}
@@ -160,13 +180,13 @@ class GameBoard(object):
 
     def reset(self):
         """Clear the board (set all position to 0)."""
-        self.__board = [[0 for _ in range(9)] for _ in range(9)]
+        self.__board = [[0 for _ in range(self.width)] for _ in range(self.height)]
 
 
     def get(self, row, col):
         """Get the value at a coord."""
         
-        if row < 0 or row >= 9 or col < 0 or col >= 9:
+        if row < 0 or row >= self.height or col < 0 or col >= self.width:
             return 0
         return self.__board[row][col]
 
@@ -182,8 +202,8 @@ class GameBoard(object):
         # a coordinate stands for a specific direction, imagine the direction of a coordinate
         # relative to the origin on xy-axis
         dirs = ((1, -1), (1, 0), (1, 1), (0, 1))
-        for i in range(9):
-            for j in range(9):
+        for i in range(self.height):
+            for j in range(self.width):
                 # if no stone is on the position, don't need to consider this position
                 if board[i][j] == 0:
                     continue
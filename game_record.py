@@ -0,0 +1,372 @@
+"""
+game_record.py
+Compact binary game records and an index of the positions they reach.
+
+A record file starts with an 8 byte header (magic "GMKR", version, board
+width and height, one spare byte) followed by the games, each one a
+4 byte header (uint16 plies, uint8 result, one spare byte) and one byte
+per move, row * width + col, so boards up to 16x16 fit. Results are
+BLACK_WIN, WHITE_WIN, DRAW or UNKNOWN. Files are only ever appended to.
+
+The index has one row per position reached in any game, sorted by the
+canonical hash of the position: the smallest Zobrist hash (see
+zobrist.py) of its 8 symmetric images. FILE.hash.npy holds the sorted
+hashes and FILE.idx.npy the game, the ply and the symmetry that gave the
+smallest hash of each row. Looking a position up is a binary search on
+the memory-mapped hashes. FILE.off.npy holds the byte offset of every
+game, so that the reader does not have to scan, and the file size that
+it and the index were built for: an index older than its file, after
+games were appended, is rebuilt when the file is opened.
+
+    python game_record.py index FILE
+    python game_record.py lookup FILE 40,41,31
+"""
+
+import argparse
+import os
+import struct
+import sys
+import mmap
+import numpy as np
+from zobrist import ZobristHash
+
+MAGIC = b'GMKR'
+VERSION = 1
+FILE_HEADER = struct.Struct('<4sBBBx')
+GAME_HEADER = struct.Struct('<HBx')
+
+DRAW, BLACK_WIN, WHITE_WIN, UNKNOWN = 0, 1, 2, 3
+
+INDEX_DTYPE = np.dtype([('game', '<u4'), ('ply', '<u2'), ('sym', 'u1')])
+
+
+def result_of(winner):
+    """Return the record result of a Board.game_end() winner (-1 for a
+    draw, None if the game is unfinished)."""
+    if winner is None:
+        return UNKNOWN
+    return DRAW if winner == -1 else winner
+
+
+def symmetries(width, height):
+    """Return the move permutations of the board symmetries, as an array
+    sym[s, move] = image of move under symmetry s (8 of them on a square
+    board, only the identity otherwise)."""
+    grid = np.arange(width * height).reshape(height, width)
+    if width != height:
+        return grid.reshape(1, -1)
+    images = []
+    for k in range(8):
+        image = np.rot90(grid, k % 4)
+        if k >= 4:
+            image = np.fliplr(image)
+        # image[r, c] is the point that lands on (r, c)
+        perm = np.empty(width * height, dtype=np.int64)
+        perm[image.ravel()] = np.arange(width * height)
+        images.append(perm)
+    return np.array(images)
+
+
+class GameWriter(object):
+    """Appends games to a record file, creating it if needed."""
+
+    def __init__(self, path, width=9, height=9):
+        if width * height > 256:
+            raise ValueError('boards up to 16x16 only')
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                magic, version, w, h = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError('%s is not a game record file' % path)
+            if (w, h) != (width, height):
+                raise ValueError('%s holds %dx%d games' % (path, w, h))
+            self.file = open(path, 'ab')
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(FILE_HEADER.pack(MAGIC, VERSION, width, height))
+        self.width = width
+        self.height = height
+
+    def write(self, moves, result=UNKNOWN):
+        """Append one game: its moves in order and its result."""
+        moves = bytes(bytearray(moves))
+        self.file.write(GAME_HEADER.pack(len(moves), result) + moves)
+
+    def write_board(self, board):
+        """Append the game played on a game_board.Board so far."""
+        end, winner = board.game_end()
+        self.write(list(board.states), result_of(winner if end else None))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GameReader(object):
+    """Random access to the games of a record file through mmap."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.width, self.height = FILE_HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a game record file' % path)
+        # the file as a uint8 array, for vectorized access
+        self.bytes = np.frombuffer(self.data, dtype=np.uint8)
+        self.offsets = self._offsets()
+
+    def _offsets(self):
+        """Return the offset of every game, from FILE.off.npy if it is up
+        to date, else by walking the game headers."""
+        cached = self.path + '.off.npy'
+        size = len(self.data)
+        if os.path.exists(cached):
+            offsets = np.load(cached, mmap_mode='r')
+            # the last entry is the file size the offsets were built for
+            if len(offsets) and offsets[-1] == size:
+                return offsets[:-1]
+        offsets = []
+        position = FILE_HEADER.size
+        unpack = GAME_HEADER.unpack_from
+        step = GAME_HEADER.size
+        data = self.data
+        while position < size:
+            offsets.append(position)
+            position += step + unpack(data, position)[0]
+        return np.array(offsets, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, game):
+        """Return (moves, result) of a game, with moves as a bytes object."""
+        offset = int(self.offsets[game])
+        plies, result = GAME_HEADER.unpack_from(self.data, offset)
+        start = offset + GAME_HEADER.size
+        return self.data[start:start + plies], result
+
+    def __iter__(self):
+        for game in range(len(self)):
+            yield self[game]
+
+    def plies(self, games):
+        """Return the number of moves of each of the games (an array)."""
+        offsets = self.offsets[games]
+        return self.bytes[offsets].astype(np.int64) | (self.bytes[offsets + 1].astype(np.int64) << 8)
+
+    def results(self, games):
+        """Return the result of each of the games (an array)."""
+        return self.bytes[self.offsets[games] + 2]
+
+    def moves_at(self, games, plies):
+        """Return the move played at ply (from 0) of each game; the plies
+        must exist."""
+        return self.bytes[self.offsets[games] + GAME_HEADER.size + plies]
+
+    def close(self):
+        self.offsets = None
+        self.bytes = None
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PositionIndex(object):
+    """Canonical position hash -> (game, ply) index of a record file."""
+
+    def __init__(self, width=9, height=9):
+        self.width = width
+        self.height = height
+        zobrist = ZobristHash(width, height)
+        self.keys = np.array([[0, k[1], k[2]] for k in zobrist.keys], dtype=np.uint64)
+        self.turn_key = np.uint64(zobrist.turn_key)
+        self.sym = symmetries(width, height)
+        # sorted canonical hashes and the (game, ply, sym) row of each
+        self.keys_sorted = None
+        self.entries = None
+
+    def hashes(self, games):
+        """Return the hashes of the positions after every ply of equally
+        long games, a (games, plies) int array of moves; the result has
+        shape (symmetries, games, plies)."""
+        plies = games.shape[1]
+        stone = np.where(np.arange(plies) % 2 == 0, 1, 2)
+        turn = np.where(np.arange(plies) % 2 == 0, self.turn_key, np.uint64(0))
+        out = []
+        for perm in self.sym:
+            keys = self.keys[perm[games], stone]
+            np.bitwise_xor.accumulate(keys, axis=1, out=keys)
+            out.append(keys ^ turn)
+        return np.array(out)
+
+    def canonical(self, moves):
+        """Return (hash, symmetry) of the position after moves."""
+        if not len(moves):
+            return 0, 0
+        h = self.hashes(np.array([list(moves)], dtype=np.int64))[:, 0, -1]
+        sym = int(np.argmin(h))
+        return int(h[sym]), sym
+
+    def build(self, reader, chunk=4096):
+        """Index every position of the games of reader."""
+        hashes = []
+        parts = []
+        for first in range(0, len(reader), chunk):
+            games = [reader[g] for g in range(first, min(first + chunk, len(reader)))]
+            # games of the same length are hashed together
+            by_length = {}
+            for i, (moves, _) in enumerate(games):
+                if moves:
+                    by_length.setdefault(len(moves), []).append(i)
+            for plies, members in by_length.items():
+                matrix = np.frombuffer(b''.join(games[i][0] for i in members),
+                                       dtype=np.uint8).reshape(len(members), plies)
+                h = self.hashes(matrix.astype(np.int64))
+                part = np.empty((len(members), plies), dtype=INDEX_DTYPE)
+                part['sym'] = np.argmin(h, axis=0)
+                part['game'] = (first + np.array(members))[:, None]
+                part['ply'] = np.arange(1, plies + 1)
+                hashes.append(np.min(h, axis=0).ravel())
+                parts.append(part.ravel())
+        if not parts:
+            self.keys_sorted = np.empty(0, dtype=np.uint64)
+            self.entries = np.empty(0, dtype=INDEX_DTYPE)
+            return
+        hashes = np.concatenate(hashes)
+        order = np.argsort(hashes, kind='stable')
+        self.keys_sorted = hashes[order]
+        self.entries = np.concatenate(parts)[order]
+
+    def save(self, path):
+        np.save(path + '.hash.npy', self.keys_sorted)
+        np.save(path + '.idx.npy', self.entries)
+
+    def load(self, path):
+        self.keys_sorted = np.load(path + '.hash.npy', mmap_mode='r')
+        self.entries = np.load(path + '.idx.npy', mmap_mode='r')
+        return self
+
+    def lookup(self, moves):
+        """Return the (game, ply, sym) entries of every game that reached
+        the position after moves, in any orientation, and the symmetry of
+        that position."""
+        h, sym = self.canonical(moves)
+        key = np.uint64(h)
+        low = np.searchsorted(self.keys_sorted, key, side='left')
+        high = np.searchsorted(self.keys_sorted, key, side='right')
+        return self.entries[low:high], sym
+
+
+class GameDatabase(object):
+    """A record file with its position index."""
+
+    def __init__(self, path):
+        self.path = path
+        self.reader = GameReader(path)
+        self.index = PositionIndex(self.reader.width, self.reader.height)
+        if os.path.exists(path + '.idx.npy'):
+            if self._indexed_size() == len(self.reader.data):
+                self.index.load(path)
+            else:
+                # games were appended since the index was built
+                self.build_index()
+
+    def _indexed_size(self):
+        """Return the file size the index was built for, or None."""
+        cached = self.path + '.off.npy'
+        if not os.path.exists(cached):
+            return None
+        offsets = np.load(cached, mmap_mode='r')
+        return int(offsets[-1]) if len(offsets) else None
+
+    def build_index(self):
+        """(Re)build and save the index and game offsets of the file."""
+        reader = self.reader
+        self.index.build(reader)
+        self.index.save(self.path)
+        offsets = np.append(np.asarray(reader.offsets, dtype=np.int64), len(reader.data))
+        np.save(self.path + '.off.npy', offsets)
+
+    def _lookup(self, moves):
+        if len(moves):
+            return self.index.lookup(moves)
+        # every game starts from the empty board
+        entries = np.zeros(len(self.reader), dtype=INDEX_DTYPE)
+        entries['game'] = np.arange(len(self.reader))
+        return entries, 0
+
+    def games(self, moves):
+        """Return (games, plies, results) arrays of the games that reached
+        the position after moves, and the ply at which they did."""
+        entries, _ = self._lookup(moves)
+        games = entries['game'].astype(np.int64)
+        return games, np.array(entries['ply']), self.reader.results(games)
+
+    def continuations(self, moves):
+        """Opening statistics: return {move: [games, black wins, white
+        wins, draws]} over the moves played next from the position after
+        moves, in the orientation of moves."""
+        entries, sym = self._lookup(moves)
+        reader = self.reader
+        games = entries['game'].astype(np.int64)
+        plies = entries['ply'].astype(np.int64)
+        going_on = plies < reader.plies(games)
+        games, plies = games[going_on], plies[going_on]
+        played = reader.moves_at(games, plies)
+        # into the canonical orientation, then back into that of moves
+        canonical = self.index.sym[entries['sym'][going_on], played]
+        inverse = np.argsort(self.index.sym[sym])
+        next_moves = inverse[canonical]
+        results = reader.results(games)
+        size = self.reader.width * self.reader.height
+        counts = [np.bincount(next_moves, minlength=size)]
+        for result in (BLACK_WIN, WHITE_WIN, DRAW):
+            counts.append(np.bincount(next_moves[results == result], minlength=size))
+        return dict((move, [int(c[move]) for c in counts])
+                    for move in np.flatnonzero(counts[0]).tolist())
+
+    def close(self):
+        self.reader.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Game records and position index')
+    sub = parser.add_subparsers(dest='command')
+    index = sub.add_parser('index', help='build the position index of a record file')
+    index.add_argument('path')
+    lookup = sub.add_parser('lookup', help='games and continuations of a position')
+    lookup.add_argument('path')
+    lookup.add_argument('moves', help='comma separated moves from the empty board')
+    args = parser.parse_args()
+
+    if args.command == 'index':
+        db = GameDatabase(args.path)
+        db.build_index()
+        print('%d games, %d positions' % (len(db.reader), len(db.index.entries)))
+    elif args.command == 'lookup':
+        db = GameDatabase(args.path)
+        if db.index.entries is None:
+            sys.exit('no index, run: python game_record.py index %s' % args.path)
+        moves = [int(m) for m in args.moves.split(',') if m]
+        print('%d games reached this position' % len(db.games(moves)[0]))
+        stats = db.continuations(moves)
+        for move, (n, black, white, draws) in sorted(stats.items(), key=lambda x: -x[1][0]):
+            print('%3d: %5d games  black %5d  white %5d  draws %5d' % (move, n, black, white, draws))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
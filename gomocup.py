@@ -0,0 +1,242 @@
+"""
+gomocup.py
+Headless engine for Gomoku tournament managers (Gomocup / Piskvork
+protocol) over stdin and stdout.
+
+    python gomocup.py [--engine mcts|searcher] [--depth D] [--turn-time S]
+        [--warm-tree FILE.gmt]
+
+Supported commands: START, RESTART, BEGIN, TURN, BOARD ... DONE, TAKEBACK,
+INFO, ABOUT and END. Coordinates are "x,y" with x the column and y the
+row, both from 0. Square boards from 5x5 to 25x25 are supported, with
+9x9 until START says otherwise; 15x15 and 19x19 are the usual ones.
+
+Nothing heavier than the standard library is imported until the engine
+is needed for the first move, and tkinter is never imported, so the
+engine starts fast and runs without a display.
+"""
+
+import argparse
+import sys
+import time
+
+SIZE = 9
+MIN_SIZE = 5
+MAX_SIZE = 25
+# keep this much of every time limit in reserve, for the reply and the
+# manager's own overhead
+SAFETY = 0.15
+MIN_TIME = 0.05
+
+
+class GomocupEngine(object):
+    """Protocol state: the board, the time limits and the engine."""
+
+    def __init__(self, engine='mcts', depth=6, turn_time=5.0, out=sys.stdout,
+                 warm_tree=None):
+        self.engine_name = engine
+        self.depth = depth
+        # tree checkpoint for MCTS to start from, see tree_checkpoint.py
+        self.warm_tree = warm_tree
+        self.out = out
+        self.player = None
+        self.size = SIZE
+        self.grid = [[0] * SIZE for _ in range(SIZE)]
+        self.me = 1
+        self.last_move = -1
+        # limits from INFO, in seconds; None when not given
+        self.timeout_turn = turn_time
+        self.timeout_match = None
+        self.time_left = None
+        self.used = 0.0
+        self.board_lines = None
+
+    def send(self, line):
+        self.out.write(line + '\n')
+        self.out.flush()
+
+    # engine --------------------------------------------------------------
+
+    def _load(self):
+        """Import and create the engine on first use."""
+        if self.player is not None:
+            return
+        if self.engine_name == 'searcher':
+            from player import SearcherPlayer
+            self.player = SearcherPlayer(self.depth)
+        else:
+            import warnings
+            warnings.filterwarnings("ignore")
+            from mcts import MCTSPlayer
+            self.player = MCTSPlayer(warm_tree=self.warm_tree)
+
+    def budget(self):
+        """Return the seconds to spend on this move."""
+        budget = self.timeout_turn if self.timeout_turn else MIN_TIME
+        left = self.time_left
+        if left is None and self.timeout_match is not None:
+            left = self.timeout_match - self.used
+        if left is not None:
+            empties = sum(row.count(0) for row in self.grid)
+            # spread the remaining time over our share of the empty points
+            budget = min(budget, left / max(empties // 2, 1))
+        return max(budget * (1 - SAFETY) - 0.02, MIN_TIME)
+
+    def think(self, received):
+        """Choose and play a move for self.me; received is the time the
+        command arrived, which the budget counts from."""
+        self._load()
+        limit = self.budget() - (time.time() - received)
+        limit = max(limit, MIN_TIME)
+        grid = self.grid
+        size = self.size
+        if not any(any(row) for row in grid):
+            row, col = size // 2, size // 2
+        else:
+            from game_board import Board
+            board = Board(width=size, height=size)
+            board.set_position(grid, self.me, self.last_move)
+            move = self.player.get_action(board, time_limit=limit)
+            row, col = board.move_to_location(move)
+        self.grid[row][col] = self.me
+        self.last_move = row * size + col
+        self.used += time.time() - received
+        self.send('%d,%d' % (col, row))
+
+    # commands ------------------------------------------------------------
+
+    def place(self, text, stone):
+        """Put stone on the point "x,y" of text; return False if it is not
+        an empty point of the board."""
+        try:
+            x, y = [int(v) for v in text.split(',')[:2]]
+        except ValueError:
+            return False
+        if not (0 <= x < self.size and 0 <= y < self.size) or self.grid[y][x]:
+            return False
+        self.grid[y][x] = stone
+        if stone != self.me:
+            self.last_move = y * self.size + x
+        return True
+
+    def reset(self, size=None):
+        if size is not None:
+            self.size = size
+        self.grid = [[0] * self.size for _ in range(self.size)]
+        self.me = 1
+        self.last_move = -1
+        self.used = 0.0
+
+    def handle(self, line):
+        """Process one input line; return False after END."""
+        received = time.time()
+        line = line.strip()
+        if not line:
+            return True
+        if self.board_lines is not None:
+            if line.upper() == 'DONE':
+                self.finish_board(received)
+            else:
+                self.board_lines.append(line)
+            return True
+
+        command, _, args = line.partition(' ')
+        command = command.upper()
+        args = args.strip()
+        if command == 'START':
+            try:
+                size = int(args)
+            except ValueError:
+                size = 0
+            if not MIN_SIZE <= size <= MAX_SIZE:
+                self.send('ERROR boards from %dx%d to %dx%d are supported'
+                          % (MIN_SIZE, MIN_SIZE, MAX_SIZE, MAX_SIZE))
+            else:
+                self.reset(size)
+                self.send('OK')
+        elif command == 'RESTART':
+            self.reset()
+            self.send('OK')
+        elif command == 'BEGIN':
+            self.me = 1
+            self.think(received)
+        elif command == 'TURN':
+            if not any(any(row) for row in self.grid):
+                # the opponent opened, so we play white
+                self.me = 2
+            if self.place(args, 3 - self.me):
+                self.think(received)
+            else:
+                self.send('ERROR invalid move %s' % args)
+        elif command == 'BOARD':
+            self.board_lines = []
+        elif command == 'TAKEBACK':
+            try:
+                x, y = [int(v) for v in args.split(',')[:2]]
+                self.grid[y][x] = 0
+                self.send('OK')
+            except (ValueError, IndexError):
+                self.send('ERROR invalid point %s' % args)
+        elif command == 'INFO':
+            self.info(args)
+        elif command == 'ABOUT':
+            self.send('name="GomokuMCTS", version="1.0", author="RAYFC", country="CA"')
+        elif command == 'END':
+            return False
+        else:
+            self.send('UNKNOWN command %s' % command)
+        return True
+
+    def finish_board(self, received):
+        """Set up the position sent between BOARD and DONE and move."""
+        lines = self.board_lines
+        self.board_lines = None
+        self.grid = [[0] * self.size for _ in range(self.size)]
+        self.last_move = -1
+        own = sum(1 for line in lines if line.split(',')[2:3] == ['1'])
+        # the side to move has as many stones as the opponent if it is black
+        self.me = 1 if own * 2 == len(lines) else 2
+        for line in lines:
+            fields = line.split(',')
+            if len(fields) != 3 or fields[2] not in ('1', '2', '3'):
+                self.send('ERROR invalid board line %s' % line)
+                return
+            stone = self.me if fields[2] == '1' else 3 - self.me
+            if not self.place(line, stone):
+                self.send('ERROR invalid board line %s' % line)
+                return
+        self.think(received)
+
+    def info(self, args):
+        key, _, value = args.partition(' ')
+        key = key.lower()
+        try:
+            number = int(value)
+        except ValueError:
+            return
+        if key == 'timeout_turn':
+            self.timeout_turn = number / 1000.0
+        elif key == 'timeout_match':
+            self.timeout_match = number / 1000.0 if number > 0 else None
+        elif key == 'time_left':
+            self.time_left = number / 1000.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[1])
+    parser.add_argument('--engine', choices=('mcts', 'searcher'), default='mcts')
+    parser.add_argument('--depth', type=int, default=6,
+                        help='maximum BoardSearcher depth (default 6)')
+    parser.add_argument('--turn-time', type=float, default=5.0,
+                        help='seconds per move until INFO timeout_turn says otherwise')
+    parser.add_argument('--warm-tree', help='MCTS tree checkpoint to start from')
+    args = parser.parse_args(argv)
+
+    engine = GomocupEngine(args.engine, args.depth, args.turn_time, warm_tree=args.warm_tree)
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+
+
+if __name__ == '__main__':
+    main()
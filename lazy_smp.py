@@ -0,0 +1,151 @@
+"""
+lazy_smp.py
+Parallel BoardSearcher (Lazy SMP).
+
+Worker processes search the same root at staggered depths and with
+different root move orders. They share their results through a
+SharedTranspositionTable, so each worker's search prunes with what the
+others have already found. The main process takes the deepest result
+that finishes first and stops the other workers.
+"""
+
+import multiprocessing as mp
+import queue
+from board_searcher import BoardSearcher, SearchAborted
+from position_ring import PositionRing
+from transposition import SharedTranspositionTable
+
+# the BoardSearcher and the PositionRing of a worker process, set up by
+# _init_worker
+_searcher = None
+_ring = None
+
+
+def _init_worker(tt_name, ring_name, counter, stop):
+    global _searcher, _ring
+    # number the workers so that each one counts in its own row of the table
+    with counter.get_lock():
+        counter.value += 1
+        worker = counter.value
+    _searcher = BoardSearcher()
+    _searcher.tt = SharedTranspositionTable.attach(tt_name, worker)
+    _searcher.abort = stop.is_set
+    _ring = PositionRing.attach(ring_name)
+
+
+def _search_task(slot, depth, seed):
+    """Search the position in slot of the ring in a worker; return (depth,
+    score, row, col, nodes, seed) or None if the search was stopped."""
+    searcher = _searcher
+    searcher.board, turn = _ring.grid(slot)
+    searcher.root_seed = seed
+    try:
+        score, row, col = searcher.search(turn, depth)
+    except SearchAborted:
+        return None
+    return depth, score, row, col, searcher.nodes, seed
+
+
+class LazySMPSearcher(object):
+    """Multi-process front end of BoardSearcher.
+
+    Worker 0 searches to the requested depth with the static root order;
+    helper i searches to depth + i % 2 with the root order shuffled by seed
+    i. search() returns as soon as one worker has a result of at least the
+    requested depth, preferring the deepest finished result.
+    """
+
+    def __init__(self, workers=4, tt_entries=1 << 20, tt_shards=16):
+        self.workers = workers
+        self.tt = SharedTranspositionTable(tt_entries, tt_shards)
+        self._ctx = mp.get_context()
+        self._stop = self._ctx.Event()
+        self._counter = self._ctx.Value('i', 0)
+        # one position per search is in flight; the ring is sized for the
+        # board of the first search, see _start()
+        self.ring = None
+        self._pool = None
+        # results of the last search, as returned by the workers
+        self.results = []
+        self.nodes = 0
+
+    def _start(self, rows, cols):
+        ring = self.ring
+        if ring is not None and (ring.height, ring.width) != (rows, cols):
+            # the workers are attached to a ring of the old size
+            self._stop_pool()
+            ring.close()
+            self.ring = None
+            self.tt.clear()
+        if self.ring is None:
+            self.ring = PositionRing(slots=4, width=cols, height=rows)
+        if self._pool is None:
+            self._pool = self._ctx.Pool(
+                self.workers, _init_worker,
+                (self.tt.name, self.ring.name, self._counter, self._stop))
+
+    def search(self, board, turn, depth=3):
+        """Search the 2D board for turn, return (score, row, col). A board
+        of another size than the last one restarts the workers."""
+        self._start(len(board), len(board[0]))
+        self._stop.clear()
+        done = queue.Queue()
+        slot = self.ring.put_grid(board, turn)
+        pending = []
+        for i in range(self.workers):
+            if i == 0:
+                task = (slot, depth, None)
+            else:
+                task = (slot, depth + i % 2, i)
+            pending.append(self._pool.apply_async(
+                _search_task, task, callback=done.put,
+                error_callback=lambda error: done.put(error)))
+
+        finished = []
+        try:
+            while len(finished) < len(pending):
+                result = done.get()
+                if isinstance(result, BaseException):
+                    raise result
+                finished.append(result)
+                if result is not None and result[0] >= depth:
+                    break
+        finally:
+            self._stop.set()
+            # wait for the stopped workers so that the pool is idle again
+            for async_result in pending:
+                async_result.wait()
+        self.results = [result.get() for result in pending]
+        finished = [result for result in self.results if result is not None]
+        self.nodes = sum(result[4] for result in finished)
+        # the deepest result wins, then the primary worker's
+        best = max(finished, key=lambda result: (result[0], result[5] is None))
+        return best[1], best[2], best[3]
+
+    def tt_stats(self):
+        """Return the counters of the shared table, see
+        SharedTranspositionTable.stats()."""
+        return self.tt.stats()
+
+    def clear(self):
+        """Forget all stored results, e.g. before a new game."""
+        self.tt.clear()
+
+    def _stop_pool(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+
+    def close(self):
+        self._stop_pool()
+        self.tt.close()
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -5,9 +5,11 @@ warnings.filterwarnings("ignore")
 from board_gui import BoardFrame
 
 def main():
+	# optional board size, e.g. "python main.py 15"
+	size = int(sys.argv[1]) if len(sys.argv) > 1 else 9
 	window = tk.Tk()
 	window.wm_title("GOMOKU GAME")
-	gui_board = BoardFrame(window)
+	gui_board = BoardFrame(window, size)
 	gui_board.pack()
 	window.mainloop()
 
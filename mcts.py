@@ -8,7 +8,14 @@ import time
 from operator import itemgetter
 from board_util import GoBoardUtil
 from player import Player
-from board_evaluator import BoardEvaluator
+from board_evaluator import BoardEvaluator, EvalCache
+from threat_detector import ThreatDetector
+from threat_solver import ThreatSpaceSolver
+from pn_search import PNSearcher, WIN, DRAW
+from mcts_profiler import MCTSProfiler
+from anytime import Snapshot
+from tree_checkpoint import TreeCheckpoint, write_tree
+from pattern_policy import PatternPolicy
 
 class TreeNode(object):
     """A node in the MCTS tree. Each node keeps track of its own value Q,
@@ -81,7 +88,8 @@ class TreeNode(object):
 class MCTS(object):
     """Monte Carlo Tree Search."""
 
-    def __init__(self, policy_value_fn=GoBoardUtil.policy_value, c_puct=5, n_playout=10000):
+    def __init__(self, policy_value_fn=GoBoardUtil.policy_value, c_puct=5, n_playout=10000,
+                 evaluator=None, threat_detector=None, run_time=10):
         """
         policy_value_fn: a function that takes in a board state and outputs
             a list of (action, probability) tuples and also a score in [-1, 1]
@@ -90,34 +98,70 @@ class MCTS(object):
         c_puct: a number in (0, inf) that controls how quickly exploration
             converges to the maximum-value policy. A higher value means
             relying on the prior more.
+        evaluator: the BoardEvaluator passed to policy_value_fn. It is kept
+            for the lifetime of the MCTS, so an evaluator with an EvalCache
+            reuses scores across playouts and moves.
+        threat_detector: an optional ThreatDetector. When given, a leaf whose
+            side to move faces a five or an open four is only expanded with
+            the moves that answer the threat.
+        run_time: seconds of playouts per move. None runs n_playout
+            playouts instead, e.g. for reproducible engine matches.
         """
         self._root = TreeNode(None, 1.0)
         self._policy = policy_value_fn
         self._c_puct = c_puct
-        # self._n_playout = n_playout
-        self.board_evaluator = BoardEvaluator()
-        self.run_time = 10
+        self._n_playout = n_playout
+        if evaluator is None:
+            evaluator = BoardEvaluator()
+        self.board_evaluator = evaluator
+        self.threat_detector = threat_detector
+        self.run_time = run_time
+        self.playouts = 0   # playouts run by the last get_move
+        # an MCTSProfiler to record the phases of get_move, None for none
+        self.profiler = None
+        self._stop = False      # set by stop()
+        self._running = False   # True during get_move
+
     def _playout(self, state):
         """Run a single playout from the root to the leaf, getting a value at
         the leaf and propagating it back through its parents.
         State is modified in-place, so a copy must be provided.
+        The phases are timed in self.profiler when one is set.
         """
+        profiler = self.profiler
+        if profiler is not None:
+            mark = profiler.clock()
         node = self._root
+        depth = 0
         while True:
             if node.is_leaf():
                 break
             # Greedily select next move.
             action, node = node.select(self._c_puct)
             state.do_move(action)
+            depth += 1
+        if profiler is not None:
+            mark = profiler.lap('select', mark, depth)
+            profiler.depths[depth] += 1
 
         # Evaluate the leaf which outputs a list of
         # (action, probability) tuples p and also a score v in [-1, 1]
         # for the current player.
         action_probs, leaf_value = self._policy(state, self.board_evaluator)
+        if profiler is not None:
+            mark = profiler.lap('policy', mark)
         # Check for end of game
         end, winner = state.game_end()
+        if profiler is not None:
+            mark = profiler.lap('game_end', mark)
         if not end:
+            if self.threat_detector is not None:
+                action_probs = self._restrict_to_forced(state, action_probs)
+            before = len(node._children)
             node.expand(action_probs)
+            if profiler is not None:
+                profiler.branching[len(node._children) - before] += 1
+                mark = profiler.lap('expand', mark)
         else:
             # for end state，return the "true" leaf_value
             if winner == -1:  # tie
@@ -132,6 +176,36 @@ class MCTS(object):
         # leaf_value = self._evaluate_rollout(state)
         # Update value and visit count of nodes in this traversal.
         node.update_recursive(-leaf_value)
+        if profiler is not None:
+            profiler.lap('backup', mark)
+
+    def _playout_copy(self, state):
+        """Run a playout on a copy of state and count it."""
+        profiler = self.profiler
+        if profiler is None:
+            self._playout(copy.deepcopy(state))
+        else:
+            mark = profiler.clock()
+            state_copy = copy.deepcopy(state)
+            profiler.lap('copy', mark)
+            self._playout(state_copy)
+        self.playouts += 1
+
+    def _restrict_to_forced(self, state, action_probs):
+        """Keep only the forced moves of state, if there are any.
+        Forced moves missing from action_probs get a uniform share of the
+        prior so that they are always expanded.
+        """
+        kind, forced = self.threat_detector.forced_moves(
+            state.get_2d_board(), state.get_current_player())
+        if not forced:
+            return action_probs
+        probs = dict(action_probs)
+        uniform = 1.0 / len(forced)
+        moves = [state.location_to_move(location) for location in forced]
+        priors = [probs.get(move, 0.0) + uniform for move in moves]
+        total = sum(priors)
+        return [(move, p / total) for move, p in zip(moves, priors)]
 
     def _evaluate_rollout(self, state, limit=1000):
         """Use the rollout policy to play until the end of the game,
@@ -161,13 +235,100 @@ class MCTS(object):
         Return: the selected action
         """
         start = time.time()
-        # for _ in range(self._n_playout):
-        while (time.time() - start) < self.run_time:
-            state_copy = copy.deepcopy(state)
-            self._playout(state_copy)
+        began = time.perf_counter()
+        self.playouts = 0
+        self._running = True
+        try:
+            while self._budget_left(start):
+                self._playout_copy(state)
+        finally:
+            self._finish(began)
         return max(self._root._children.items(),
                    key=lambda act_node: act_node[1]._n_visits)[0]
 
+    def iter_search(self, state, interval=0.5, token=None):
+        """Anytime version of get_move: a generator of anytime.Snapshot.
+
+        Runs playouts within the usual budget and yields a snapshot every
+        interval seconds, then a final one. The search ends early when
+        token (a callable such as anytime.CancelToken) returns True or
+        stop() is called, always after at least one playout.
+        """
+        start = time.time()
+        began = time.perf_counter()
+        report = start + interval
+        self.playouts = 0
+        self._running = True
+        try:
+            while self._budget_left(start):
+                if token is not None and self.playouts and token():
+                    break
+                self._playout_copy(state)
+                if time.time() >= report:
+                    report += interval
+                    yield self.snapshot(start)
+        finally:
+            self._finish(began)
+        yield self.snapshot(start, final=True)
+
+    def snapshot(self, start=None, final=False, top=5):
+        """Return an anytime.Snapshot of the tree: the most visited moves,
+        and the principal variation following the most visited children."""
+        children = list(self._root._children.items())
+        children.sort(key=lambda act_node: act_node[1]._n_visits, reverse=True)
+        pv = []
+        node = self._root
+        while node._children:
+            move, node = max(list(node._children.items()),
+                             key=lambda act_node: act_node[1]._n_visits)
+            if not node._n_visits:
+                break
+            pv.append(move)
+        best = children[0] if children else (None, None)
+        return Snapshot(
+            best_move=best[0],
+            score=float(best[1]._Q) if best[1] is not None else None,
+            top=[(move, child._n_visits, float(child._Q)) for move, child in children[:top]],
+            pv=pv,
+            nodes=self.playouts,
+            depth=len(pv),
+            elapsed=time.time() - start if start is not None else 0.0,
+            final=final)
+
+    def _budget_left(self, start):
+        """Return True while get_move may run another playout."""
+        if self._stop and self.playouts:
+            return False
+        if self.run_time is None:
+            return self.playouts < self._n_playout
+        return time.time() - start < self.run_time
+
+    def stop(self):
+        """Ask a get_move running in another thread to return its current
+        best move after the playout in progress (after at least one).
+        Does nothing if no get_move is running."""
+        if self._running:
+            self._stop = True
+
+    def progress(self):
+        """Return (playouts, best move, visit share of the best move) of the
+        search in progress; safe to call from another thread."""
+        # copying the dict is atomic, iterating it while playouts run is not
+        children = list(self._root._children.items())
+        if not children:
+            return self.playouts, None, 0.0
+        move, node = max(children, key=lambda act_node: act_node[1]._n_visits)
+        total = sum(child._n_visits for _, child in children)
+        return self.playouts, move, node._n_visits / total if total else 0.0
+
+    def _finish(self, began):
+        """End of a search started at perf_counter() time began."""
+        self._running = False
+        self._stop = False
+        if self.profiler is not None:
+            self.profiler.playouts += self.playouts
+            self.profiler.elapsed += time.perf_counter() - began
+
     def update_with_move(self, last_move):
         """Step forward in the tree, keeping everything we already know
         about the subtree.
@@ -178,22 +339,176 @@ class MCTS(object):
         else:
             self._root = TreeNode(None, 1.0)
 
+    def export_tree(self, path, state, min_visits=1):
+        """Save the tree to path (see tree_checkpoint.py), state being the
+        position at its root; nodes with fewer than min_visits visits are
+        saved without their children. Return the number of nodes saved."""
+        return write_tree(path, self._root, state.get_2d_board(),
+                          state.get_current_player(), min_visits)
+
+    def import_tree(self, checkpoint, state, min_visits=1):
+        """Continue from the subtree of a TreeCheckpoint for the position
+        state, if the checkpoint reaches it. Return the visits restored,
+        0 if none."""
+        index = checkpoint.find(state.get_2d_board(), state.get_current_player())
+        if index is None:
+            return 0
+        self._root = checkpoint.tree(index, min_visits)
+        return self._root._n_visits
+
 class MCTSPlayer(Player):
     """AI player based on MCTS"""
-    def __init__(self, c_puct=5, n_playout=2000):
+    def __init__(self, c_puct=5, n_playout=2000, evaluator=None, eval_cache_size=100000,
+                 use_threats=True, solver_mode='vcf', proof_empties=15, proof_nodes=10000,
+                 run_time=10, profile=False, warm_tree=None, prior='minimax'):
+        """
+        n_playout, run_time: the MCTS budget per move, see MCTS.
+        profile: record the MCTS phases of every move; the profile of the
+            last move is in self.profile and the profiles of all moves
+            since reset_player() in self.profiles (as dicts).
+        evaluator: a BoardEvaluator to share with other engines. When None,
+            one is created with an EvalCache of eval_cache_size entries
+            (no cache if eval_cache_size is 0 or None).
+        use_threats: answer forced moves without searching and restrict
+            expansion to the defensive moves when under threat.
+        solver_mode: run the threat-space solver before searching and play
+            a forced win if one is found: None, 'vcf' or 'vct'.
+        proof_empties: once this few empty points are left, try to prove
+            the position with df-pn (proof_nodes nodes) and play the proof
+            move of a win or a draw. 0 disables the terminal-phase solver.
+        warm_tree: a tree checkpoint (TreeCheckpoint or its path, see
+            tree_checkpoint.py). Positions it reaches are searched starting
+            from its tree instead of from scratch.
+        prior: the policy_value_fn of the MCTS: 'minimax' scores every
+            empty point with the evaluator (GoBoardUtil.minimax_policy_value),
+            'pattern' with the fitted pattern weights of pattern_policy.py,
+            which is much cheaper; or a policy_value_fn.
+        """
         super().__init__()
-        self.mcts = MCTS(GoBoardUtil.minimax_policy_value, c_puct, n_playout)
+        if evaluator is None:
+            cache = EvalCache(eval_cache_size) if eval_cache_size else None
+            evaluator = BoardEvaluator(cache)
+        self.evaluator = evaluator
+        self.threat_detector = ThreatDetector(evaluator) if use_threats else None
+        self.solver_mode = solver_mode
+        self.solver = ThreatSpaceSolver(self.threat_detector, max_depth=8, max_nodes=300)
+        self.proof_empties = proof_empties
+        self.pn_searcher = PNSearcher(max_nodes=proof_nodes)
+        if prior == 'minimax':
+            prior = GoBoardUtil.minimax_policy_value
+        elif prior == 'pattern':
+            prior = PatternPolicy.load()
+        self.mcts = MCTS(prior, c_puct, n_playout, evaluator, self.threat_detector, run_time)
+        self.nodes = 0      # playouts spent on the last move
+        # root visit counts {move: visits} of the last move's MCTS, empty
+        # when the move was found without searching
+        self.visits = {}
+        if isinstance(warm_tree, str):
+            warm_tree = TreeCheckpoint(warm_tree)
+        self.warm_tree = warm_tree
+        # visits restored from warm_tree for the last move
+        self.restored = 0
+        self.profile = None
+        self.profiles = []
+        if profile:
+            self.mcts.profiler = MCTSProfiler()
 
     def reset_player(self):
         self.mcts.update_with_move(-1)
+        self.profile = None
+        self.profiles = []
+
+    def stop(self):
+        """Make a get_action running in another thread play its current
+        best move as soon as possible (see MCTS.stop). Only the MCTS phase
+        can be stopped."""
+        self.mcts.stop()
 
-    def get_action(self, board, start=False):
+    def progress(self):
+        """Return (playouts, best move, visit share) of the MCTS in
+        progress, see MCTS.progress."""
+        return self.mcts.progress()
+
+    def get_action(self, board, start=False, time_limit=None):
+        """Return the move to play on board.
+
+        time_limit: seconds for the whole move. The MCTS gets what is left
+            of it after the forced move, solver and proof phases, instead of
+            its run_time.
+        """
         if start:
-            return 40
+            # the centre point
+            return (board.height // 2) * board.width + board.width // 2
+        began = time.time()
         sensible_moves = board.availables
+        self.nodes = 0
+        self.visits = {}
+        self.restored = 0
         if len(sensible_moves) > 0:
-            move = self.mcts.get_move(board)
+            forced = self.forced_move(board)
+            if forced is not None:
+                return forced
+            win = self.solve(board)
+            if win is not None:
+                return win
+            proved = self.prove(board)
+            if proved is not None:
+                return proved
+            if self.warm_tree is not None:
+                self.restored = self.mcts.import_tree(self.warm_tree, board)
+            profiler = self.mcts.profiler
+            if profiler is not None:
+                profiler.reset()
+            run_time = self.mcts.run_time
+            if time_limit is not None:
+                self.mcts.run_time = max(time_limit - (time.time() - began), 0.01)
+            try:
+                move = self.mcts.get_move(board)
+            finally:
+                self.mcts.run_time = run_time
+            self.nodes = self.mcts.playouts
+            self.visits = dict((act, node._n_visits)
+                               for act, node in self.mcts._root._children.items())
+            if profiler is not None:
+                self.profile = profiler
+                self.profiles.append(profiler.to_dict())
             self.mcts.update_with_move(-1)
             return move
         else:
             print("WARNING: the board is full")
+
+    def forced_move(self, board):
+        """Return the move to play without searching (a five to complete or
+        the only defence), or None."""
+        if self.threat_detector is None:
+            return None
+        kind, moves = self.threat_detector.forced_moves(
+            board.get_2d_board(), board.get_current_player())
+        if kind == 'win' or (kind is not None and len(moves) == 1):
+            return board.location_to_move(moves[0])
+        return None
+
+    def solve(self, board):
+        """Return the first move of a forced win found by the threat-space
+        solver, or None."""
+        if not self.solver_mode:
+            return None
+        grid = board.get_2d_board()
+        player = board.get_current_player()
+        if self.solver_mode == 'vct':
+            line = self.solver.solve(grid, player)
+        else:
+            line = self.solver.vcf(grid, player)
+        if line:
+            return board.location_to_move(line[0])
+        return None
+
+    def prove(self, board):
+        """In the terminal phase, return the proof move of a won or drawn
+        position, or None to fall back to MCTS."""
+        if len(board.availables) > self.proof_empties:
+            return None
+        result, move = self.pn_searcher.solve(board)
+        if result in (WIN, DRAW) and move != -1:
+            return move
+        return None
@@ -0,0 +1,75 @@
+"""
+mcts_profiler.py
+Per-phase time and call counts of MCTS playouts.
+
+An MCTS with a profiler set times the phases of its playouts; without
+one the timing hooks are skipped, so profiling costs next to nothing when
+it is off.
+"""
+
+import json
+import time
+from collections import Counter
+
+# board copy, tree descent, policy_value_fn, game_end, expansion, backup
+PHASES = ('copy', 'select', 'policy', 'game_end', 'expand', 'backup')
+
+
+class MCTSProfiler(object):
+    """Time and calls per phase plus leaf depth and branching histograms,
+    accumulated over the playouts of one or more get_move calls."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.seconds = dict((phase, 0.0) for phase in PHASES)
+        self.calls = dict((phase, 0) for phase in PHASES)
+        # leaf depth -> playouts, children per expansion -> expansions
+        self.depths = Counter()
+        self.branching = Counter()
+        self.playouts = 0
+        self.elapsed = 0.0
+
+    clock = staticmethod(time.perf_counter)
+
+    def lap(self, phase, since, calls=1):
+        """Add the time from clock() value since to phase; return now."""
+        now = time.perf_counter()
+        self.seconds[phase] += now - since
+        self.calls[phase] += calls
+        return now
+
+    def to_dict(self):
+        """Return the profile as a JSON-serializable dict."""
+        accounted = sum(self.seconds.values())
+        return {
+            'playouts': self.playouts,
+            'elapsed': self.elapsed,
+            'playouts_per_second': self.playouts / self.elapsed if self.elapsed else 0.0,
+            'phases': dict((phase, {
+                'seconds': self.seconds[phase],
+                'calls': self.calls[phase],
+                'share': self.seconds[phase] / self.elapsed if self.elapsed else 0.0,
+            }) for phase in PHASES),
+            'other_seconds': max(self.elapsed - accounted, 0.0),
+            'depth_histogram': dict((str(k), v) for k, v in sorted(self.depths.items())),
+            'branching_histogram': dict((str(k), v) for k, v in sorted(self.branching.items())),
+        }
+
+    def to_json(self, path=None):
+        """Return the profile as a JSON string, and write it to path if given."""
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text + '\n')
+        return text
+
+    def summary(self):
+        """Return a short table of the phases for printing."""
+        lines = ['%d playouts in %.2f s' % (self.playouts, self.elapsed)]
+        for phase in PHASES:
+            share = self.seconds[phase] / self.elapsed if self.elapsed else 0.0
+            lines.append('%-9s %8.3f s %5.1f%% %8d calls' % (
+                phase, self.seconds[phase], share * 100, self.calls[phase]))
+        return '\n'.join(lines)
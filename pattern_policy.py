@@ -0,0 +1,314 @@
+"""
+pattern_policy.py
+A cheap prior for MCTS: every empty point is scored from the stones
+around it on its four lines, by tables of pattern weights fitted offline
+to the scores of BoardEvaluator.
+
+The pattern of a point in one direction is the 8 points at distance 1 to
+4 on both sides, each one seen twice: for attack as empty, own stone or
+blocked (opponent stone or off the board), and for defence as empty,
+opponent stone or blocked. A pattern and its mirror image share a
+weight. The logit of a move is the sum of its attack and defence weights
+in the four directions, and the prior is the softmax of the logits; all
+the points of a position are scored in one vectorized pass.
+
+The value of a position is tanh of a linear function of the best attack
+and defence scores of its empty points.
+
+The weights are fitted to positions of games played by the evaluator's
+own prior, labelled with the evaluator score of every move (the scores
+that GoBoardUtil.minimax_policy_value computes), by minimising the cross
+entropy between the softmax of the logits and the softmax of the scores
+divided by a temperature:
+
+    python pattern_policy.py fit [--out pattern_weights.npz]
+        [--positions 12000] [--epochs 400] [--seed 2018]
+    python pattern_policy.py check [--weights pattern_weights.npz]
+        [--positions 300] [--seed 7]
+"""
+
+import argparse
+import os
+import random
+import time
+import numpy as np
+
+RADIUS = 4
+OFFSETS = [k for k in range(-RADIUS, RADIUS + 1) if k != 0]
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+CODES = 3 ** len(OFFSETS)
+POWERS = 3 ** np.arange(len(OFFSETS), dtype=np.int32)
+
+# cell (0 empty, 1 black, 2 white, 3 off the board) -> digit of the
+# attack and defence patterns, for each player to move
+DIGITS = {
+    1: np.array([[0, 1, 2, 2], [0, 2, 1, 2]], dtype=np.int32),
+    2: np.array([[0, 2, 1, 2], [0, 1, 2, 2]], dtype=np.int32),
+}
+
+# evaluator scores: temperature of the target prior and of the moves of
+# the sample games, scale of the value
+TEMPERATURE = 2.0
+PLAY_TEMPERATURE = 50.0
+VALUE_SCALE = 200.0
+
+WEIGHTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pattern_weights.npz')
+
+
+def _mirror_codes():
+    """Return, for every pattern code, the code of its mirror image."""
+    digits = (np.arange(CODES)[:, None] // POWERS) % 3
+    return (digits[:, ::-1] * POWERS).sum(axis=1)
+
+
+def canonical_codes():
+    """Return (ids, count): the weight index of every pattern code, equal
+    for a pattern and its mirror image, and the number of weights."""
+    codes = np.arange(CODES)
+    canonical = np.minimum(codes, _mirror_codes())
+    _, ids = np.unique(canonical, return_inverse=True)
+    return ids.astype(np.int32), int(ids.max()) + 1
+
+
+class PatternPolicy(object):
+    """Pattern-weight policy and value; call it as a policy_value_fn."""
+
+    def __init__(self, attack, defence, value, top=8, temperature=1.0):
+        """
+        attack, defence: weights of the CODES patterns.
+        value: coefficients of (1, best attack, best defence) of the value.
+        top: number of moves returned, the most likely ones (None for all).
+        temperature: the logits are divided by it; above 1 flattens the
+            prior, which is fitted to be sharp.
+        """
+        # logit = sum of table[code + offset] over both parts and directions
+        self.table = np.concatenate([attack, defence]).astype(np.float64)
+        self.value = np.asarray(value, dtype=np.float64)
+        self.top = top
+        self.temperature = temperature
+        self._offset = np.array([0, CODES], dtype=np.int32)[:, None, None]
+        self._size = None
+
+    @classmethod
+    def load(cls, path=WEIGHTS, top=8, temperature=1.0):
+        data = np.load(path)
+        return cls(data['attack'], data['defence'], data['value'], top, temperature)
+
+    def save(self, path):
+        np.savez_compressed(path, attack=self.table[:CODES].astype(np.float32),
+                            defence=self.table[CODES:].astype(np.float32),
+                            value=self.value)
+
+    def _fit(self, width, height):
+        """Build the gather indexes for width x height boards."""
+        stride = width + 2 * RADIUS
+        # move -> index in the flattened board padded with RADIUS cells
+        point = np.array([(m // width + RADIUS) * stride + m % width + RADIUS
+                          for m in range(width * height)], dtype=np.int32)
+        self._point = point
+        self._gather = np.array([[point + k * (dr * stride + dc) for k in OFFSETS]
+                                 for dr, dc in DIRECTIONS], dtype=np.int32)
+        self._padded = np.full((height + 2 * RADIUS) * stride, 3, dtype=np.int8)
+        self._size = (width, height)
+
+    def codes(self, board):
+        """Return the pattern codes of every point of board, shape
+        (2 attack/defence, 4 directions, points)."""
+        if self._size != (board.width, board.height):
+            self._fit(board.width, board.height)
+        padded = self._padded
+        padded[self._point] = 0
+        if board.states:
+            padded[self._point[list(board.states)]] = list(board.states.values())
+        digits = DIGITS[board.current_player][:, padded][:, self._gather]
+        return digits.transpose(0, 1, 3, 2) @ POWERS
+
+    def scores(self, board):
+        """Return (attack, defence) scores of every point of board."""
+        parts = self.table[self.codes(board) + self._offset].sum(axis=1)
+        return parts[0], parts[1]
+
+    def __call__(self, board, evaluator=None):
+        """Return a list of (action, probability) tuples for the empty
+        points of board and a value in [-1, 1] for the player to move.
+        evaluator is not used; it is accepted to match policy_value_fn."""
+        moves = np.array(board.availables)
+        attack, defence = self.scores(board)
+        attack, defence = attack[moves], defence[moves]
+        logits = attack + defence
+        if self.top is not None and len(moves) > self.top:
+            keep = np.argpartition(-logits, self.top)[:self.top]
+            moves, logits = moves[keep], logits[keep]
+        probs = np.exp((logits - logits.max()) / self.temperature)
+        probs /= probs.sum()
+        value = np.tanh(self.value[0] + self.value[1] * attack.max()
+                        + self.value[2] * defence.max())
+        return list(zip(moves.tolist(), probs.tolist())), value
+
+
+# fitting -----------------------------------------------------------------
+
+def evaluator_scores(board, evaluator):
+    """Return the evaluator score of playing each empty point of board, for
+    the player to move (as in GoBoardUtil.minimax_policy_value)."""
+    grid = board.get_2d_board()
+    player = board.current_player
+    width = board.width
+    scores = []
+    for move in board.availables:
+        row, col = move // width, move % width
+        grid[row][col] = player
+        scores.append(-evaluator.evaluate(grid, 3 - player))
+        grid[row][col] = 0
+    return np.array(scores, dtype=np.float64)
+
+
+def sample_positions(count, seed=2018, size=9, temperature=PLAY_TEMPERATURE, explore=0.1):
+    """Return count (board, scores) pairs from games played by sampling
+    moves from the softmax of the evaluator scores, or with probability
+    explore a random move next to a stone. Games start from a random
+    stone near the centre."""
+    import copy
+    from board_evaluator import BoardEvaluator
+    from game_board import Board
+    rng = random.Random(seed)
+    evaluator = BoardEvaluator(rows=size, cols=size)
+    positions = []
+    while len(positions) < count:
+        board = Board(width=size, height=size)
+        board.init_board(rng.randint(0, 1))
+        centre = size // 2
+        board.do_move((centre + rng.randint(-1, 1)) * size + centre + rng.randint(-1, 1))
+        while len(positions) < count:
+            end, _ = board.game_end()
+            if end:
+                break
+            scores = evaluator_scores(board, evaluator)
+            positions.append((copy.deepcopy(board), scores))
+            if rng.random() < explore:
+                near = [m for m in board.availables
+                        if any(abs(m // size - s // size) <= 1 and abs(m % size - s % size) <= 1
+                               for s in board.states)]
+                move = rng.choice(near or board.availables)
+            else:
+                weights = np.exp((scores - scores.max()) / temperature)
+                move = rng.choices(board.availables, weights=weights.tolist())[0]
+            board.do_move(move)
+    return positions
+
+
+def _features(policy, positions, ids, count):
+    """Return (features, starts, moves) of positions: the weight indexes of
+    every (position, move) row, shape (rows, 8), the first row of each
+    position and the move of every row."""
+    features, starts, moves = [], [], []
+    rows = 0
+    for board, _ in positions:
+        codes = policy.codes(board)
+        available = np.array(board.availables)
+        weight = ids[codes] + np.array([0, count], dtype=np.int32)[:, None, None]
+        features.append(weight[:, :, available].reshape(8, -1).T)
+        starts.append(rows)
+        moves.append(available)
+        rows += len(available)
+    return np.concatenate(features), np.array(starts), np.concatenate(moves)
+
+
+def _segment_softmax(logits, starts, segment):
+    high = np.maximum.reduceat(logits, starts)
+    exp = np.exp(logits - high[segment])
+    return exp / np.add.reduceat(exp, starts)[segment]
+
+
+def fit(positions, epochs=400, rate=0.05, l2=1e-5, temperature=TEMPERATURE, log=None):
+    """Return a PatternPolicy fitted to (board, scores) positions."""
+    ids, count = canonical_codes()
+    policy = PatternPolicy(np.zeros(CODES), np.zeros(CODES), np.zeros(3))
+    features, starts, _ = _features(policy, positions, ids, count)
+    lengths = np.diff(np.append(starts, len(features)))
+    segment = np.repeat(np.arange(len(starts)), lengths)
+    scores = np.concatenate([s for _, s in positions])
+    target = _segment_softmax(scores / temperature, starts, segment)
+
+    # full-batch Adam on the cross entropy
+    weights = np.zeros(2 * count)
+    m = np.zeros_like(weights)
+    v = np.zeros_like(weights)
+    for epoch in range(1, epochs + 1):
+        logits = weights[features].sum(axis=1)
+        probs = _segment_softmax(logits, starts, segment)
+        delta = (probs - target) / len(starts)
+        grad = np.bincount(features.ravel(), np.repeat(delta, 8), minlength=len(weights))
+        grad += l2 * weights
+        m = 0.9 * m + 0.1 * grad
+        v = 0.999 * v + 0.001 * grad * grad
+        weights -= rate * (m / (1 - 0.9 ** epoch)) / (np.sqrt(v / (1 - 0.999 ** epoch)) + 1e-8)
+        if log is not None and (epoch % 50 == 0 or epoch == epochs):
+            loss = -np.sum(target * np.log(probs + 1e-12)) / len(starts)
+            log('epoch %d: cross entropy %.4f' % (epoch, loss))
+    policy.table = np.concatenate([weights[:count][ids], weights[count:][ids]])
+
+    # value: least squares of atanh(target) on (1, best attack, best defence)
+    rows, labels = [], []
+    for board, board_scores in positions:
+        attack, defence = policy.scores(board)
+        available = board.availables
+        rows.append((1.0, attack[available].max(), defence[available].max()))
+        labels.append(np.arctanh(np.clip(np.tanh(board_scores.max() / VALUE_SCALE),
+                                         -0.99, 0.99)))
+    policy.value = np.linalg.lstsq(np.array(rows), np.array(labels), rcond=None)[0]
+    return policy
+
+
+def agreement(policy, positions, top=5):
+    """Return (best, in_top): the fractions of positions where the most
+    likely move of policy is one of the best moves of the evaluator, and
+    where one of the best moves is among its top most likely moves."""
+    best = in_top = 0
+    for board, scores in positions:
+        logits = sum(policy.scores(board))[board.availables]
+        good = scores >= scores.max() - 1e-9
+        order = np.argsort(-logits)
+        best += good[order[0]]
+        in_top += good[order[:top]].any()
+    return best / len(positions), in_top / len(positions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pattern-weight prior for MCTS')
+    sub = parser.add_subparsers(dest='command')
+    fit_parser = sub.add_parser('fit', help='fit the weights to evaluator-labelled positions')
+    fit_parser.add_argument('--out', default=WEIGHTS)
+    fit_parser.add_argument('--positions', type=int, default=12000)
+    fit_parser.add_argument('--epochs', type=int, default=400)
+    fit_parser.add_argument('--size', type=int, default=9)
+    fit_parser.add_argument('--seed', type=int, default=2018)
+    check = sub.add_parser('check', help='compare the weights with the evaluator')
+    check.add_argument('--weights', default=WEIGHTS)
+    check.add_argument('--positions', type=int, default=300)
+    check.add_argument('--size', type=int, default=9)
+    check.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    if args.command == 'fit':
+        start = time.perf_counter()
+        positions = sample_positions(args.positions, args.seed, args.size)
+        print('%d positions labelled in %.1f s' % (len(positions), time.perf_counter() - start))
+        start = time.perf_counter()
+        policy = fit(positions, args.epochs, log=print)
+        print('fitted in %.1f s' % (time.perf_counter() - start))
+        policy.save(args.out)
+        best, in_top = agreement(policy, positions)
+        print('training positions: best move %.1f%%, a best move in the top 5 %.1f%%' % (
+            best * 100, in_top * 100))
+    elif args.command == 'check':
+        policy = PatternPolicy.load(args.weights)
+        positions = sample_positions(args.positions, args.seed, args.size)
+        best, in_top = agreement(policy, positions)
+        print('best move %.1f%%, a best move in the top 5 %.1f%%' % (best * 100, in_top * 100))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,8 @@
+import random
+from anytime import CancelToken
+from board_searcher import BoardSearcher
+
+
 class Player(object):
     def __init__(self):
         self.playerId = None
@@ -28,3 +33,51 @@ class HumanPlayer(Player):
             print("invalid move")
             move = self.get_action(board)
         return move
+
+
+class RandomPlayer(Player):
+    """Plays a uniformly random legal move, as a baseline opponent."""
+
+    def __init__(self, seed=None):
+        super().__init__()
+        self.rng = random.Random(seed)
+        self.nodes = 0
+
+    def get_action(self, board):
+        return self.rng.choice(board.availables)
+
+
+class SearcherPlayer(Player):
+    """Player that picks its moves with BoardSearcher."""
+
+    def __init__(self, depth=2, **options):
+        """
+        depth: the search depth per move.
+        options: BoardSearcher attributes to override, e.g. use_pvs=False
+            or solver_mode='vct'.
+        """
+        super().__init__()
+        self.searcher = BoardSearcher()
+        for name, value in options.items():
+            if not hasattr(self.searcher, name):
+                raise ValueError('BoardSearcher has no option {}'.format(name))
+            setattr(self.searcher, name, value)
+        self.depth = depth
+        self.nodes = 0
+
+    def get_action(self, board, time_limit=None):
+        """Return the move to play on board. With time_limit (seconds) the
+        search deepens up to depth until the time is up and plays the
+        result of the deepest completed iteration."""
+        searcher = self.searcher
+        searcher.board = [list(row) for row in board.get_2d_board()]
+        searcher.nodes = searcher.qnodes = 0
+        if time_limit is None:
+            score, row, col = searcher.search(board.get_current_player(), self.depth)
+        else:
+            for snapshot in searcher.iter_search(board.get_current_player(), self.depth,
+                                                 CancelToken(time_limit)):
+                pass
+            row, col = snapshot.best_move
+        self.nodes = searcher.nodes + searcher.qnodes
+        return board.location_to_move((row, col))
@@ -0,0 +1,245 @@
+"""
+pn_search.py
+Depth-first proof-number search (df-pn) for exact game results.
+
+The solver proves whether the side to move wins, loses or draws a
+game_board.Board, within a node budget and a transposition table size.
+"""
+
+from board_util import EMPTY, GoBoardUtil
+from threat_detector import ThreatDetector, line_windows
+from zobrist import ZobristHash
+
+WIN = 'win'
+LOSS = 'loss'
+DRAW = 'draw'
+UNKNOWN = 'unknown'
+
+INF = 10 ** 9
+
+
+class BudgetExceeded(Exception):
+    """Raised inside the solver when the node budget is used up."""
+    pass
+
+
+class PNSearcher(object):
+    """df-pn solver over game_board.Board.
+
+    Each proof answers "does the attacker win?". A position is solved with
+    up to two proofs: one with the side to move as attacker (win), then one
+    with the opponent as attacker (loss); if both are disproved it is a draw.
+    """
+
+    def __init__(self, max_nodes=100000, max_entries=500000):
+        """
+        max_nodes: maximum number of expanded nodes per solve() call.
+        max_entries: maximum number of transposition table entries. An
+            entry takes roughly 150 bytes, so the default is about 75 MB.
+        """
+        self.max_nodes = max_nodes
+        self.max_entries = max_entries
+        self.detector = ThreatDetector()
+        self._zobrist = None
+        self.nodes = 0
+        self.tt = {}
+
+    def solve(self, board, max_nodes=None):
+        """Solve board for the side to move.
+
+        Return (result, move): result is WIN, LOSS, DRAW or UNKNOWN, move is
+        the proof move (the winning move for WIN, a move that keeps the draw
+        for DRAW) as a board move, or -1.
+        """
+        if max_nodes is None:
+            max_nodes = self.max_nodes
+        self._limit = max_nodes
+        self.nodes = 0
+        width, height = board.width, board.height
+        if (self._zobrist is None or self._zobrist.width != width
+                or self._zobrist.height != height):
+            self._zobrist = ZobristHash(width, height)
+        self._width = width
+        grid = [[board.states.get(row * width + col, EMPTY) for col in range(width)]
+                for row in range(height)]
+        turn = board.get_current_player()
+        h = self._zobrist.hash_board(board)
+
+        try:
+            if self.__prove(grid, turn, h, turn):
+                return WIN, self.__proof_move(grid, turn, h, lambda pn, dn: pn == 0)
+            if self.__prove(grid, turn, h, GoBoardUtil.opponent(turn)):
+                return LOSS, -1
+            return DRAW, self.__proof_move(grid, turn, h, lambda pn, dn: dn == 0)
+        except BudgetExceeded:
+            return UNKNOWN, -1
+
+    def __prove(self, grid, turn, h, attacker):
+        """Run df-pn on the root; return True if attacker wins."""
+        self.tt = {}
+        self._attacker = attacker
+        pn, dn = self.__mid(grid, turn, h, INF - 1, INF - 1)
+        if pn != 0 and dn != 0:
+            raise BudgetExceeded()
+        return pn == 0
+
+    def __proof_move(self, grid, turn, h, proven):
+        """Return the first root move whose entry satisfies proven(pn, dn)."""
+        terminal, moves = self.__moves(grid, turn)
+        if terminal is not None:
+            # decided without search: complete the five if there is one,
+            # otherwise every move keeps the result
+            moves = self.detector.winning_moves(grid, turn) or [
+                (i, j) for i, line in enumerate(grid)
+                for j, stone in enumerate(line) if stone == EMPTY]
+            return moves[0][0] * self._width + moves[0][1] if moves else -1
+        zobrist = self._zobrist
+        for row, col in moves:
+            move = row * self._width + col
+            entry = self.tt.get(zobrist.update(h, move, turn))
+            if entry is not None and proven(entry[0], entry[1]):
+                return move
+        return -1
+
+    def __live_points(self, grid, turn):
+        """Return (attacker_live, points): whether the attacker can still
+        make five, and the empty points on a line of 5 that one side can
+        still fill with its moves left.
+
+        Extra stones never hurt their owner, so a move outside every live
+        line is no better than any other move and need not be searched.
+        """
+        attacker = self._attacker
+        defender = GoBoardUtil.opponent(attacker)
+        empties = sum(line.count(EMPTY) for line in grid)
+        left = {attacker: empties // 2, defender: empties // 2}
+        left[turn] = (empties + 1) // 2
+        attacker_live = False
+        points = set()
+        for window in line_windows(len(grid), len(grid[0])):
+            owner = EMPTY
+            need = 0
+            for row, col in window:
+                stone = grid[row][col]
+                if stone == EMPTY:
+                    need += 1
+                elif owner == EMPTY:
+                    owner = stone
+                elif stone != owner:
+                    break
+            else:
+                if owner == EMPTY:
+                    sides = [side for side in (attacker, defender) if need <= left[side]]
+                else:
+                    sides = [owner] if need <= left[owner] else []
+                if not sides:
+                    continue
+                if attacker in sides:
+                    attacker_live = True
+                points.update(point for point in window
+                              if grid[point[0]][point[1]] == EMPTY)
+        return attacker_live, points
+
+    def __moves(self, grid, turn):
+        """Return (terminal, moves) for the side to move.
+
+        terminal is (pn, dn) if the node is decided without searching,
+        otherwise None and moves holds the candidate (row, col) moves.
+        """
+        detector = self.detector
+        attacker = self._attacker
+        opponent = GoBoardUtil.opponent(turn)
+        if detector.winning_moves(grid, turn):
+            return ((0, INF) if turn == attacker else (INF, 0)), []
+        attacker_live, points = self.__live_points(grid, turn)
+        if not attacker_live:
+            # full board, or no line of 5 left for the attacker
+            return (INF, 0), []
+        blocks = detector.winning_moves(grid, opponent)
+        if len(blocks) > 1:
+            return ((INF, 0) if turn == attacker else (0, INF)), []
+        if blocks:
+            return None, blocks
+        threats = detector.open_four_moves(grid, opponent)
+        if threats:
+            moves = detector.defend_points(grid, turn, threats)
+            if not moves:
+                return ((INF, 0) if turn == attacker else (0, INF)), []
+            return None, moves
+
+        # try points next to many stones first
+        def crowd(point):
+            row, col = point
+            n = 0
+            for r in range(max(row - 1, 0), min(row + 2, len(grid))):
+                for c in range(max(col - 1, 0), min(col + 2, len(grid[0]))):
+                    if grid[r][c] != EMPTY:
+                        n += 1
+            return n
+        return None, sorted(points, key=crowd, reverse=True)
+
+    def __store(self, h, pn, dn):
+        tt = self.tt
+        if h not in tt and len(tt) >= self.max_entries:
+            # keep the proved results, drop the unfinished ones
+            for key in [k for k, (p, d) in tt.items() if p and d]:
+                del tt[key]
+            if len(tt) >= self.max_entries:
+                return
+        tt[h] = (pn, dn)
+
+    def __mid(self, grid, turn, h, thpn, thdn):
+        """Multiple iterative deepening: search until the node's proof or
+        disproof number reaches its threshold; return (pn, dn)."""
+        self.nodes += 1
+        if self.nodes > self._limit:
+            raise BudgetExceeded()
+        terminal, moves = self.__moves(grid, turn)
+        if terminal is not None:
+            self.__store(h, *terminal)
+            return terminal
+
+        tt = self.tt
+        zobrist = self._zobrist
+        width = self._width
+        is_or = turn == self._attacker
+        opponent = GoBoardUtil.opponent(turn)
+        children = [(row, col, row * width + col) for row, col in moves]
+        keys = [zobrist.update(h, move, turn) for _, _, move in children]
+
+        while True:
+            pn_dn = [tt.get(key, (1, 1)) for key in keys]
+            if is_or:
+                pn = min(p for p, _ in pn_dn)
+                dn = min(INF, sum(d for _, d in pn_dn))
+            else:
+                pn = min(INF, sum(p for p, _ in pn_dn))
+                dn = min(d for _, d in pn_dn)
+            if pn >= thpn or dn >= thdn or pn == 0 or dn == 0:
+                self.__store(h, pn, dn)
+                return pn, dn
+
+            # select the most proving child and the second best value
+            best = 0
+            second = INF
+            index = 0 if is_or else 1
+            for i in range(1, len(pn_dn)):
+                if pn_dn[i][index] < pn_dn[best][index]:
+                    second = pn_dn[best][index]
+                    best = i
+                elif pn_dn[i][index] < second:
+                    second = pn_dn[i][index]
+            child_pn, child_dn = pn_dn[best]
+            if is_or:
+                child_thpn = min(thpn, second + 1)
+                child_thdn = min(INF - 1, thdn - dn + child_dn)
+            else:
+                child_thpn = min(INF - 1, thpn - pn + child_pn)
+                child_thdn = min(thdn, second + 1)
+
+            row, col, _ = children[best]
+            grid[row][col] = turn
+            try:
+                self.__mid(grid, opponent, keys[best], child_thpn, child_thdn)
+            finally:
+                grid[row][col] = EMPTY
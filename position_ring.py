@@ -0,0 +1,119 @@
+"""
+position_ring.py
+Compact positions in a shared memory ring buffer, for sending positions to
+worker processes without pickling boards.
+
+A position is a record of int8 cells (row-major, 0 empty, 1 black,
+2 white), the side to move, the last move (-1 if none) and the move
+count. The parent process writes a position into the next slot with
+put_board() or put_grid() and passes only the slot index to a worker,
+which opens the ring by name and reads the position back with board()
+or grid(). Slots are reused in turn, so no more than `slots` tasks may
+be in flight at a time.
+"""
+
+from multiprocessing import shared_memory
+import numpy as np
+from game_board import Board
+
+# header words: slots, width, height
+_HEADER = 3
+
+
+def position_dtype(width=9, height=9):
+    """Return the numpy record type of one position."""
+    return np.dtype([('cells', np.int8, (width * height,)),
+                     ('side', np.int8),
+                     ('last_move', np.int16),
+                     ('moves', np.int16)])
+
+
+class PositionRing(object):
+    """Ring buffer of positions in multiprocessing.shared_memory."""
+
+    def __init__(self, slots=64, width=9, height=9, name=None, create=True):
+        header = _HEADER * 8
+        if create:
+            size = header + slots * position_dtype(width, height).itemsize
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            np.ndarray(_HEADER, dtype=np.int64, buffer=self.shm.buf)[:] = (slots, width, height)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            slots, width, height = (int(v) for v in
+                                    np.ndarray(_HEADER, dtype=np.int64, buffer=self.shm.buf))
+        self.owner = create
+        self.slots = slots
+        self.width = width
+        self.height = height
+        records = np.ndarray(slots, dtype=position_dtype(width, height),
+                             buffer=self.shm.buf, offset=header)
+        self.cells = records['cells']
+        self.side = records['side']
+        self.last_move = records['last_move']
+        self.moves = records['moves']
+        self._next = 0
+
+    @classmethod
+    def attach(cls, name):
+        """Open a ring created by another process."""
+        return cls(name=name, create=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def _slot(self):
+        slot = self._next
+        self._next = (slot + 1) % self.slots
+        return slot
+
+    def put_grid(self, grid, side, last_move=-1):
+        """Write a 2D grid with side to move into the next slot, return the
+        slot index."""
+        slot = self._slot()
+        cells = self.cells[slot]
+        cells[:] = np.asarray(grid, dtype=np.int8).reshape(-1)
+        self.side[slot] = side
+        self.last_move[slot] = last_move
+        self.moves[slot] = np.count_nonzero(cells)
+        return slot
+
+    def put_board(self, board):
+        """Write a game_board.Board into the next slot, return the slot
+        index."""
+        slot = self._slot()
+        cells = self.cells[slot]
+        cells[:] = 0
+        if board.states:
+            moves = np.fromiter(board.states.keys(), dtype=np.int64, count=len(board.states))
+            cells[moves] = np.fromiter(board.states.values(), dtype=np.int8,
+                                       count=len(board.states))
+        self.side[slot] = board.current_player
+        self.last_move[slot] = board.last_move
+        self.moves[slot] = len(board.states)
+        return slot
+
+    def grid(self, slot):
+        """Return (grid, side) of a slot, grid as a 2D list."""
+        grid = self.cells[slot].reshape(self.height, self.width).tolist()
+        return grid, int(self.side[slot])
+
+    def board(self, slot):
+        """Return the position of a slot as a game_board.Board."""
+        board = Board(width=self.width, height=self.height)
+        grid = self.cells[slot].reshape(self.height, self.width).tolist()
+        board.set_position(grid, int(self.side[slot]), int(self.last_move[slot]))
+        return board
+
+    def close(self):
+        """Detach from the shared memory; the creator also frees it."""
+        del self.cells, self.side, self.last_move, self.moves
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
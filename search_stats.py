@@ -0,0 +1,89 @@
+"""
+search_stats.py
+Statistics of BoardSearcher searches, for tuning move ordering and
+spotting regressions.
+"""
+
+import json
+
+
+class SearchStats(object):
+    """Counters of one search, or of several merged together.
+
+    nodes[ply]: full-width nodes visited at each ply from the root, summed
+        over the iterations of iterative deepening.
+    qnodes: quiescence nodes.
+    cutoffs[i]: beta cutoffs caused by the i-th move tried at a node
+        (0 is the first move), a measure of move ordering.
+    eval_calls, eval_scored, eval_seconds: BoardEvaluator.evaluate() calls,
+        those that analysed the board (cache misses) and their time.
+    line_calls: BoardEvaluator.analysis_line() calls.
+    elapsed: wall time of the search, in seconds.
+    """
+
+    def __init__(self):
+        self.searches = 0
+        self.nodes = []
+        self.qnodes = 0
+        self.cutoffs = {}
+        self.eval_calls = 0
+        self.eval_scored = 0
+        self.eval_seconds = 0.0
+        self.line_calls = 0
+        self.elapsed = 0.0
+
+    @property
+    def total_nodes(self):
+        return sum(self.nodes)
+
+    @property
+    def total_cutoffs(self):
+        return sum(self.cutoffs.values())
+
+    def first_move_cutoff_rate(self):
+        """Return the share of cutoffs caused by the first move tried."""
+        total = self.total_cutoffs
+        return self.cutoffs.get(0, 0) / total if total else 0.0
+
+    def merge(self, other):
+        """Add the counters of other to these, e.g. to collect a game."""
+        self.searches += other.searches
+        for ply, n in enumerate(other.nodes):
+            if ply < len(self.nodes):
+                self.nodes[ply] += n
+            else:
+                self.nodes.append(n)
+        self.qnodes += other.qnodes
+        for index, n in other.cutoffs.items():
+            self.cutoffs[index] = self.cutoffs.get(index, 0) + n
+        self.eval_calls += other.eval_calls
+        self.eval_scored += other.eval_scored
+        self.eval_seconds += other.eval_seconds
+        self.line_calls += other.line_calls
+        self.elapsed += other.elapsed
+        return self
+
+    def to_dict(self):
+        return {
+            'searches': self.searches,
+            'nodes': list(self.nodes),
+            'total_nodes': self.total_nodes,
+            'qnodes': self.qnodes,
+            'cutoffs': dict((str(k), v) for k, v in sorted(self.cutoffs.items())),
+            'first_move_cutoff_rate': self.first_move_cutoff_rate(),
+            'eval_calls': self.eval_calls,
+            'eval_scored': self.eval_scored,
+            'eval_seconds': self.eval_seconds,
+            'line_calls': self.line_calls,
+            'elapsed': self.elapsed,
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def __repr__(self):
+        return ('SearchStats(nodes={}, qnodes={}, cutoffs={}, first={:.0%}, eval_calls={}, '
+                'eval_seconds={:.3f}, line_calls={}, elapsed={:.3f})').format(
+                    self.nodes, self.qnodes, self.total_cutoffs,
+                    self.first_move_cutoff_rate(), self.eval_calls, self.eval_seconds,
+                    self.line_calls, self.elapsed)
@@ -0,0 +1,243 @@
+"""
+selfplay.py
+Self-play training data: MCTSPlayer plays against itself in parallel
+worker processes, and every position it searched is written to
+fixed-size .npy shards through memory-mapped writes.
+
+    python selfplay.py generate DIR [--games 16] [--workers 4] [--n-playout 400] [--size 9]
+    python selfplay.py read DIR [--batch-size 256]
+
+A shard is a structured array of RECORD rows (see record_dtype):
+
+    state:  uint8[4, height, width], the Board.current_state() planes
+    probs:  float32[width * height], the root visit distribution of the
+            MCTS, indexed by move (one-hot on the move played when it was
+            found without searching)
+    z:      int8, final result for the player to move: 1, 0 or -1
+    move:   int16, the move played
+
+Each worker writes its own shards, named wWW-SSSSS.npy; only the last
+one of a worker can be shorter than --shard-size. The reader maps the
+shards and yields batches without loading any shard whole.
+"""
+
+import argparse
+import glob
+import multiprocessing as mp
+import os
+import random
+import time
+import numpy as np
+from arena import random_openings
+from feature_encoder import FeatureEncoder
+from game_board import Board
+from mcts import MCTSPlayer
+
+
+def record_dtype(width=9, height=9):
+    return np.dtype([
+        ('state', np.uint8, (4, height, width)),
+        ('probs', np.float32, (width * height,)),
+        ('z', np.int8),
+        ('move', np.int16),
+    ])
+
+
+class ShardWriter(object):
+    """Appends records to memory-mapped .npy shards of shard_size rows."""
+
+    def __init__(self, directory, prefix, shard_size=4096, dtype=None):
+        self.directory = directory
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.dtype = dtype if dtype is not None else record_dtype()
+        self.paths = []
+        self.shard = None
+        self.filled = 0
+        self.written = 0
+
+    def _open(self):
+        path = os.path.join(self.directory, '%s-%05d.npy' % (self.prefix, len(self.paths)))
+        self.shard = np.lib.format.open_memmap(path, mode='w+', dtype=self.dtype,
+                                               shape=(self.shard_size,))
+        self.paths.append(path)
+        self.filled = 0
+
+    def _flush(self):
+        self.shard.flush()
+        del self.shard
+        self.shard = None
+
+    def write(self, records):
+        """Append a structured array of records."""
+        start = 0
+        while start < len(records):
+            if self.shard is None:
+                self._open()
+            count = min(len(records) - start, self.shard_size - self.filled)
+            self.shard[self.filled:self.filled + count] = records[start:start + count]
+            self.filled += count
+            self.written += count
+            start += count
+            if self.filled == self.shard_size:
+                self._flush()
+
+    def close(self):
+        """Flush the open shard, cutting it down to the rows written."""
+        if self.shard is None:
+            return
+        if self.filled == 0:
+            path = self.paths.pop()
+            self._flush()
+            os.remove(path)
+            return
+        path = self.paths[-1]
+        partial = path + '.part'
+        os.rename(path, partial)
+        full = self.shard
+        self.shard = None
+        short = np.lib.format.open_memmap(path, mode='w+', dtype=self.dtype,
+                                          shape=(self.filled,))
+        short[:] = full[:self.filled]
+        short.flush()
+        del short, full
+        os.remove(partial)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def play_game(player, opening=(), size=9):
+    """Let player play both sides of a game on a size x size board after
+    the opening moves and return one record per searched position."""
+    board = Board(width=size, height=size)
+    board.init_board()
+    for move in opening:
+        board.do_move(move)
+    encoder = FeatureEncoder(board.width, board.height)
+    size = board.width * board.height
+    records = np.zeros(size, dtype=record_dtype(board.width, board.height))
+    players = np.zeros(size, dtype=np.int8)
+    count = 0
+    end, winner = board.game_end()
+    while not end:
+        record = records[count]
+        encoder.encode(board, record['state'])
+        players[count] = board.get_current_player()
+        move = player.get_action(board)
+        visits = player.visits
+        if visits:
+            total = float(sum(visits.values()))
+            for act, n in visits.items():
+                record['probs'][act] = n / total
+        else:
+            record['probs'][move] = 1.0
+        record['move'] = move
+        count += 1
+        board.do_move(move)
+        end, winner = board.game_end()
+    records = records[:count]
+    if winner != -1:
+        records['z'] = np.where(players[:count] == winner, 1, -1)
+    return records
+
+
+def _worker(task):
+    """Play games in one process and write them to its own shards."""
+    worker, directory, openings, shard_size, options, seed, size = task
+    random.seed(seed)
+    np.random.seed(seed)
+    player = MCTSPlayer(**options)
+    start = time.time()
+    with ShardWriter(directory, 'w%02d' % worker, shard_size,
+                     record_dtype(size, size)) as writer:
+        for opening in openings:
+            writer.write(play_game(player, opening, size))
+    return {'worker': worker, 'games': len(openings), 'positions': writer.written,
+            'seconds': time.time() - start, 'shards': len(writer.paths)}
+
+
+def generate(directory, games=16, workers=4, shard_size=4096, opening=2, seed=2018,
+             size=9, **options):
+    """Play games on size x size boards in workers processes; return the
+    report of each worker. options are passed to MCTSPlayer."""
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    openings = random_openings(games, opening, seed, size)
+    tasks = [(w, directory, openings[w::workers], shard_size, options, seed + w, size)
+             for w in range(workers)]
+    pool = mp.Pool(workers)
+    try:
+        return pool.map(_worker, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def shard_paths(directory):
+    return sorted(glob.glob(os.path.join(directory, 'w*-*.npy')))
+
+
+def iter_batches(directory, batch_size=256):
+    """Yield (states, probs, z) batches from the shards of directory, with
+    states as float32 planes. Shards are memory-mapped and read one batch
+    at a time; a batch does not span shards."""
+    for path in shard_paths(directory):
+        shard = np.load(path, mmap_mode='r')
+        for start in range(0, len(shard), batch_size):
+            batch = shard[start:start + batch_size]
+            yield (batch['state'].astype(np.float32), np.array(batch['probs']),
+                   np.array(batch['z']))
+        del shard
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Self-play training data')
+    sub = parser.add_subparsers(dest='command')
+    gen = sub.add_parser('generate', help='play games and write shards')
+    gen.add_argument('directory')
+    gen.add_argument('--games', type=int, default=16)
+    gen.add_argument('--workers', type=int, default=4)
+    gen.add_argument('--n-playout', type=int, default=400, help='playouts per move')
+    gen.add_argument('--shard-size', type=int, default=4096, help='positions per shard')
+    gen.add_argument('--opening', type=int, default=2, help='random plies before the engine plays')
+    gen.add_argument('--seed', type=int, default=2018)
+    gen.add_argument('--size', type=int, default=9, help='board width and height')
+    read = sub.add_parser('read', help='stream the shards of a directory')
+    read.add_argument('directory')
+    read.add_argument('--batch-size', type=int, default=256)
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        if args.size < 5:
+            gen.error('--size must be at least 5')
+        reports = generate(args.directory, args.games, args.workers, args.shard_size,
+                           args.opening, args.seed, args.size, n_playout=args.n_playout,
+                           run_time=None)
+        for r in sorted(reports, key=lambda r: r['worker']):
+            print('worker %2d: %3d games %6d positions %3d shards %7.1f s %7.2f positions/s'
+                  % (r['worker'], r['games'], r['positions'], r['shards'], r['seconds'],
+                     r['positions'] / r['seconds'] if r['seconds'] else 0.0))
+        print('total: %d positions' % sum(r['positions'] for r in reports))
+    elif args.command == 'read':
+        start = time.time()
+        positions = batches = 0
+        results = {1: 0, 0: 0, -1: 0}
+        for states, probs, z in iter_batches(args.directory, args.batch_size):
+            positions += len(z)
+            batches += 1
+            for value, n in zip(*np.unique(z, return_counts=True)):
+                results[int(value)] += int(n)
+        elapsed = time.time() - start
+        print('%d positions in %d batches, z +1/0/-1: %d/%d/%d, %.0f positions/s'
+              % (positions, batches, results[1], results[0], results[-1],
+                 positions / elapsed if elapsed else 0.0))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,342 @@
+"""
+threat_detector.py
+Find forcing moves on a 2D board: fives to complete, fours and open threes
+to make, and the moves a side is required to play in reply to them.
+
+Boards are 2D lists as used by BoardEvaluator and BoardSearcher:
+board[row][col] is EMPTY, BLACK or WHITE. Moves are (row, col) tuples.
+"""
+
+from board_evaluator import BoardEvaluator
+from board_util import EMPTY, GoBoardUtil
+
+# horizontal, vertical, left-hand diagonal, right-hand diagonal
+DIRECTIONS = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+# lines of 5 points for each board size, see line_windows()
+_WINDOWS = {}
+
+
+def line_windows(rows, cols):
+    """Return all lines of 5 points on a rows x cols board as tuples of
+    (row, col). The result is cached per board size."""
+    windows = _WINDOWS.get((rows, cols))
+    if windows is None:
+        windows = []
+        for row in range(rows):
+            for col in range(cols):
+                for dr, dc in DIRECTIONS:
+                    end_r, end_c = row + 4 * dr, col + 4 * dc
+                    if 0 <= end_r < rows and 0 <= end_c < cols:
+                        windows.append(tuple((row + k * dr, col + k * dc) for k in range(5)))
+        _WINDOWS[(rows, cols)] = windows
+    return windows
+
+
+class Threats(object):
+    """Threat summary of a position, indexed by stone (BLACK/WHITE)."""
+
+    def __init__(self):
+        # moves that complete a five
+        self.wins = {}
+        # moves that make a four (cFour) or an open four (four)
+        self.fours = {}
+        # moves that make an unstoppable four (open four or double four)
+        self.open_fours = {}
+        # moves the side has to choose from, empty if it is not under threat
+        self.defenses = {}
+
+    def __repr__(self):
+        return 'Threats(wins={}, open_fours={}, defenses={})'.format(
+            self.wins, self.open_fours, self.defenses)
+
+
+class ThreatDetector(object):
+    """Detect fives, fours and open threes for either side.
+
+    Moves are classified with the pattern codes of BoardEvaluator
+    (five, four, cFour, three). Lines are checked exactly: a move makes a
+    four when it leaves an empty point that would complete a five through it,
+    and an open four when it leaves two or more such points.
+    """
+
+    def __init__(self, evaluator=None):
+        if evaluator is None:
+            evaluator = BoardEvaluator()
+        self.five = evaluator.five
+        self.four = evaluator.four
+        self.cFour = evaluator.cFour
+        self.three = evaluator.three
+
+    @staticmethod
+    def _run(board, row, col, dr, dc, stone):
+        """Return the number of stones before and after (row, col) along
+        (dr, dc) that are contiguous with it."""
+        rows = len(board)
+        cols = len(board[0])
+        before = 0
+        r, c = row - dr, col - dc
+        while 0 <= r < rows and 0 <= c < cols and board[r][c] == stone:
+            before += 1
+            r -= dr
+            c -= dc
+        after = 0
+        r, c = row + dr, col + dc
+        while 0 <= r < rows and 0 <= c < cols and board[r][c] == stone:
+            after += 1
+            r += dr
+            c += dc
+        return before, after
+
+    def makes_five(self, board, row, col, stone):
+        """Check if playing stone on the empty point (row, col) makes five."""
+        run = self._run
+        for dr, dc in DIRECTIONS:
+            before, after = run(board, row, col, dr, dc, stone)
+            if before + after >= 4:
+                return True
+        return False
+
+    def _five_points(self, board, row, col, dr, dc, stone):
+        """Return the empty points along (dr, dc) that complete a five
+        including the stone already on (row, col)."""
+        rows = len(board)
+        cols = len(board[0])
+        run = self._run
+        points = []
+        for k in range(-4, 5):
+            if k == 0:
+                continue
+            r, c = row + k * dr, col + k * dc
+            if not (0 <= r < rows and 0 <= c < cols) or board[r][c] != EMPTY:
+                continue
+            before, after = run(board, r, c, dr, dc, stone)
+            # the five has to pass through (row, col)
+            if before + after >= 4 and k - before <= 0 <= k + after:
+                points.append((r, c))
+        return points
+
+    def window_points(self, board, stone, need):
+        """Return the sorted empty points that lie on a line of 5 holding at
+        least need stones of the given colour and none of the opponent's.
+
+        A point with need=4 completes a five, a point with need=3 makes a
+        four; every five, four or open three move is found among them.
+        """
+        points = set()
+        for window in line_windows(len(board), len(board[0])):
+            n = 0
+            empties = []
+            for row, col in window:
+                v = board[row][col]
+                if v == stone:
+                    n += 1
+                elif v == EMPTY:
+                    empties.append((row, col))
+                else:
+                    break
+            else:
+                if n >= need:
+                    points.update(empties)
+        return sorted(points)
+
+    def scan(self, board):
+        """Return (fives, fours) for both colours in one pass over the
+        lines of 5: fives[stone] are the points that complete a five and
+        fours[stone] the points that make a four (or a five)."""
+        fives = {1: set(), 2: set()}
+        fours = {1: set(), 2: set()}
+        for window in line_windows(len(board), len(board[0])):
+            owner = EMPTY
+            n = 0
+            empties = []
+            for row, col in window:
+                v = board[row][col]
+                if v == EMPTY:
+                    empties.append((row, col))
+                elif owner == EMPTY:
+                    owner = v
+                    n = 1
+                elif v == owner:
+                    n += 1
+                else:
+                    break
+            else:
+                if n >= 3:
+                    fours[owner].update(empties)
+                    if n == 4:
+                        fives[owner].update(empties)
+        for stone in (1, 2):
+            fives[stone] = sorted(fives[stone])
+            fours[stone] = sorted(fours[stone])
+        return fives, fours
+
+    def open_fours_among(self, board, stone, points):
+        """Return the points of points (e.g. fours from scan()) that leave
+        stone two or more five points."""
+        count = self._count_five_points
+        return [(i, j) for i, j in points if count(board, i, j, stone) >= 2]
+
+    def move_patterns(self, board, row, col, stone):
+        """Return the pattern code made by playing stone on the empty point
+        (row, col) in each of the 4 directions (0 if nothing forcing)."""
+        five = self.five
+        four = self.four
+        cFour = self.cFour
+        three = self.three
+        five_points = self._five_points
+        patterns = [0, 0, 0, 0]
+        board[row][col] = stone
+        try:
+            for d, (dr, dc) in enumerate(DIRECTIONS):
+                before, after = self._run(board, row, col, dr, dc, stone)
+                if before + after >= 4:
+                    patterns[d] = five
+                    continue
+                points = five_points(board, row, col, dr, dc, stone)
+                if len(points) >= 2:
+                    patterns[d] = four
+                    continue
+                if points:
+                    patterns[d] = cFour
+                    continue
+                # open three: one more stone on the line makes an open four
+                for k in range(-4, 5):
+                    r, c = row + k * dr, col + k * dc
+                    if (k == 0 or not (0 <= r < len(board) and 0 <= c < len(board[0]))
+                            or board[r][c] != EMPTY):
+                        continue
+                    board[r][c] = stone
+                    n = len(five_points(board, row, col, dr, dc, stone))
+                    board[r][c] = EMPTY
+                    if n >= 2:
+                        patterns[d] = three
+                        break
+        finally:
+            board[row][col] = EMPTY
+        return patterns
+
+    def move_class(self, board, row, col, stone):
+        """Return the strongest pattern code made by playing stone on
+        (row, col). Two fours in different lines count as an open four."""
+        patterns = self.move_patterns(board, row, col, stone)
+        if self.five in patterns:
+            return self.five
+        if self.four in patterns or patterns.count(self.cFour) >= 2:
+            return self.four
+        if self.cFour in patterns:
+            return self.cFour
+        if self.three in patterns:
+            return self.three
+        return 0
+
+    def winning_moves(self, board, stone):
+        """Return all moves that complete a five for stone."""
+        return self.window_points(board, stone, 4)
+
+    def _count_five_points(self, board, row, col, stone):
+        """Return the number of distinct five points for stone after it is
+        played on (row, col)."""
+        points = set()
+        board[row][col] = stone
+        try:
+            for dr, dc in DIRECTIONS:
+                points.update(self._five_points(board, row, col, dr, dc, stone))
+        finally:
+            board[row][col] = EMPTY
+        return len(points)
+
+    def four_moves(self, board, stone):
+        """Return all moves that make a four (open or not) for stone."""
+        return self.window_points(board, stone, 3)
+
+    def open_four_moves(self, board, stone):
+        """Return all moves that leave two or more five points for stone,
+        i.e. an open four or a double four."""
+        count = self._count_five_points
+        return [(i, j) for i, j in self.window_points(board, stone, 3)
+                if count(board, i, j, stone) >= 2]
+
+    def three_moves(self, board, stone):
+        """Return all moves that make an open three (and no four) for stone."""
+        three = self.three
+        move_class = self.move_class
+        return [(i, j) for i, j in self.window_points(board, stone, 2)
+                if move_class(board, i, j, stone) == three]
+
+    def forced_moves(self, board, turn):
+        """Return (kind, moves) for the side to move:
+
+        ('win', moves): turn can complete a five.
+        ('block', moves): the opponent threatens a five, turn has to play on
+            one of these points (more than one means the game is lost).
+        ('defend', moves): the opponent can make an open four next move.
+            moves are the points that stop every such threat, plus the fours
+            turn can make to gain tempo.
+        (None, []): nothing is forced.
+        """
+        wins = self.winning_moves(board, turn)
+        if wins:
+            return 'win', wins
+        opponent = GoBoardUtil.opponent(turn)
+        blocks = self.winning_moves(board, opponent)
+        if blocks:
+            return 'block', blocks
+        threats = self.open_four_moves(board, opponent)
+        if threats:
+            return 'defend', self.defend_points(board, turn, threats)
+        return None, []
+
+    def defend_points(self, board, turn, threats):
+        """Return the moves for turn that leave the opponent without any of
+        the open-four moves in threats, followed by turn's own fours."""
+        rows = len(board)
+        cols = len(board[0])
+        opponent = GoBoardUtil.opponent(turn)
+        count = self._count_five_points
+        candidates = []
+        seen = set()
+        for row, col in threats:
+            for dr, dc in DIRECTIONS:
+                for k in range(-4, 5):
+                    r, c = row + k * dr, col + k * dc
+                    if (0 <= r < rows and 0 <= c < cols and board[r][c] == EMPTY
+                            and (r, c) not in seen):
+                        seen.add((r, c))
+                        candidates.append((r, c))
+        defenses = []
+        for r, c in candidates:
+            # a stone of our own can only remove opponent threats, so it is
+            # enough to recheck the known ones
+            board[r][c] = turn
+            try:
+                stopped = all((t_r, t_c) == (r, c) or count(board, t_r, t_c, opponent) < 2
+                              for t_r, t_c in threats)
+            finally:
+                board[r][c] = EMPTY
+            if stopped:
+                defenses.append((r, c))
+        for move in self.four_moves(board, turn):
+            if move not in defenses:
+                defenses.append(move)
+        return defenses
+
+    def analyze(self, board):
+        """Return the Threats of both sides on board."""
+        threats = Threats()
+        for stone in (1, 2):
+            threats.wins[stone] = self.winning_moves(board, stone)
+            threats.fours[stone] = self.four_moves(board, stone)
+            threats.open_fours[stone] = self.open_four_moves(board, stone)
+        for stone in (1, 2):
+            opponent = GoBoardUtil.opponent(stone)
+            if threats.wins[stone]:
+                threats.defenses[stone] = []
+            elif threats.wins[opponent]:
+                threats.defenses[stone] = list(threats.wins[opponent])
+            elif threats.open_fours[opponent]:
+                threats.defenses[stone] = self.defend_points(
+                    board, stone, threats.open_fours[opponent])
+            else:
+                threats.defenses[stone] = []
+        return threats
@@ -0,0 +1,171 @@
+"""
+threat_solver.py
+Threat-space search for forced wins: victory by continuous fours (VCF) and
+victory by continuous threats (VCT, fours and open threes).
+
+Only the attacker's forcing moves and the defender's forced replies are
+searched, so a forced win many moves deep is found long before a
+full-width search would reach it.
+"""
+
+from itertools import chain
+from board_util import EMPTY, GoBoardUtil
+from threat_detector import ThreatDetector
+
+
+class NodeLimitExceeded(Exception):
+    """Raised inside the solver when the node budget is used up."""
+    pass
+
+
+class ThreatSpaceSolver(object):
+    """VCF/VCT solver on a 2D board (board[row][col] in EMPTY/BLACK/WHITE).
+
+    A result is the main line of the win as a list of (row, col) moves,
+    starting and ending with an attacker move and alternating with the
+    defender's replies, or None for "no forced win".
+    """
+
+    def __init__(self, detector=None, max_depth=10, max_nodes=2000):
+        """
+        max_depth: maximum number of attacker moves in a sequence.
+        max_nodes: maximum number of positions visited by one call.
+        """
+        if detector is None:
+            detector = ThreatDetector()
+        self.detector = detector
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.nodes = 0
+        # True if the last call ran out of nodes, i.e. "no forced win"
+        # only means none was found within the budget
+        self.aborted = False
+        self._failed = {}
+
+    def vcf(self, board, turn, max_depth=None, max_nodes=None):
+        """Search for a win by continuous fours for turn."""
+        return self._solve(board, turn, False, max_depth, max_nodes)
+
+    def vct(self, board, turn, max_depth=None, max_nodes=None):
+        """Search for a win by continuous fours and open threes for turn."""
+        return self._solve(board, turn, True, max_depth, max_nodes)
+
+    def solve(self, board, turn, max_depth=None, max_nodes=None, use_vct=True):
+        """Try VCF first, then VCT with the remaining node budget."""
+        if max_nodes is None:
+            max_nodes = self.max_nodes
+        line = self.vcf(board, turn, max_depth, max_nodes)
+        if line is not None or not use_vct:
+            return line
+        used = self.nodes
+        aborted = self.aborted
+        if used >= max_nodes:
+            return None
+        line = self.vct(board, turn, max_depth, max_nodes - used)
+        self.nodes += used
+        self.aborted = self.aborted or aborted
+        return line
+
+    def _solve(self, board, turn, vct, max_depth, max_nodes):
+        if max_depth is None:
+            max_depth = self.max_depth
+        if max_nodes is None:
+            max_nodes = self.max_nodes
+        self.nodes = 0
+        self.aborted = False
+        self._limit = max_nodes
+        self._failed = {}
+        # the search plays moves on the board and takes them back
+        board = [list(row) for row in board]
+        try:
+            # iterative deepening finds the shortest win first and keeps a
+            # deep line from hiding a short one
+            for depth in range(1, max_depth + 1):
+                line = self._attack(board, turn, depth, vct)
+                if line is not None:
+                    return line
+            return None
+        except NodeLimitExceeded:
+            self.aborted = True
+            return None
+
+    def _count(self):
+        self.nodes += 1
+        if self.nodes > self._limit:
+            raise NodeLimitExceeded()
+
+    def _attack(self, board, attacker, depth, vct):
+        """Attacker to move: return the winning line or None."""
+        self._count()
+        detector = self.detector
+        wins = detector.winning_moves(board, attacker)
+        if wins:
+            return [wins[0]]
+        if depth <= 0:
+            return None
+        key = (bytes(chain.from_iterable(board)), vct)
+        if self._failed.get(key, -1) >= depth:
+            return None
+
+        defender = GoBoardUtil.opponent(attacker)
+        blocks = detector.winning_moves(board, defender)
+        if len(blocks) > 1:
+            candidates = []
+        elif blocks:
+            # the block has to be a threat itself for the attack to go on
+            candidates = blocks
+        else:
+            fours = detector.four_moves(board, attacker)
+            open_fours = set(detector.open_four_moves(board, attacker))
+            candidates = [m for m in fours if m in open_fours]
+            candidates += [m for m in fours if m not in open_fours]
+            if vct:
+                candidates += detector.three_moves(board, attacker)
+
+        for row, col in candidates:
+            board[row][col] = attacker
+            try:
+                line = self._defend(board, attacker, depth - 1, vct)
+            finally:
+                board[row][col] = EMPTY
+            if line is not None:
+                return [(row, col)] + line
+        self._failed[key] = depth
+        return None
+
+    def _defend(self, board, attacker, depth, vct):
+        """Defender to move after an attacker move: return the winning line
+        against the defender's best reply, or None if the defender escapes."""
+        self._count()
+        detector = self.detector
+        defender = GoBoardUtil.opponent(attacker)
+        if detector.winning_moves(board, defender):
+            return None
+        wins = detector.winning_moves(board, attacker)
+        if len(wins) >= 2:
+            return [wins[0], wins[1]]
+        if wins:
+            replies = wins
+        elif vct:
+            threats = detector.open_four_moves(board, attacker)
+            if not threats:
+                return None
+            replies = detector.defend_points(board, defender, threats)
+            if not replies:
+                # nothing stops the threat, any reply loses
+                replies = threats[:1]
+        else:
+            return None
+
+        line = None
+        for row, col in replies:
+            board[row][col] = defender
+            try:
+                sub = self._attack(board, attacker, depth, vct)
+            finally:
+                board[row][col] = EMPTY
+            if sub is None:
+                return None
+            if line is None:
+                line = [(row, col)] + sub
+        return line
@@ -0,0 +1,190 @@
+"""
+transposition.py
+Transposition table in shared memory, readable and writable by every
+search process without pickling.
+
+The table is a flat array of int64 words in one shared memory block:
+
+    header      magic, entries, shards, bucket size, counter rows
+    counters    one row of (probes, hits, collisions, overwrites, stores)
+                per process, so that counting needs no lock
+    entries     shards x (entries / shards) slots of two words each
+
+Each slot holds the key XOR the data and the data itself. A reader
+accepts a slot only if the two words XOR back to its key, so a slot torn
+by a concurrent write from another process reads as a miss instead of a
+wrong result, and neither probes nor stores take a lock. A key maps to a
+shard and, inside it, to a bucket of consecutive slots; a store replaces
+the same key, an empty slot or else the shallowest entry of the bucket.
+"""
+
+from multiprocessing import shared_memory
+import numpy as np
+
+# bound types of a stored score
+EXACT = 0
+LOWER = 1   # score is a lower bound (fail high)
+UPPER = 2   # score is an upper bound (fail low)
+
+NO_MOVE = 0xffff
+
+MAGIC = 0x47544254  # "GTBT"
+HEADER = 8
+COUNTERS = ('probes', 'hits', 'collisions', 'overwrites', 'stores')
+
+_MASK64 = (1 << 64) - 1
+
+
+def _signed(value):
+    """Return the 64-bit pattern of value as a signed int64."""
+    value &= _MASK64
+    return value - (1 << 64) if value >> 63 else value
+
+
+def pack(depth, score, flag, move):
+    """Pack an entry into one 64-bit word: score (32 bits, signed), move
+    (16 bits), depth (8 bits) and flag (2 bits)."""
+    return ((score & 0xffffffff) | ((move & 0xffff) << 32)
+            | ((depth & 0xff) << 48) | ((flag & 0x3) << 56))
+
+
+def unpack(data):
+    """Return (depth, score, flag, move) from a packed word."""
+    score = data & 0xffffffff
+    if score >> 31:
+        score -= 1 << 32
+    return (data >> 48) & 0xff, score, (data >> 56) & 0x3, (data >> 32) & 0xffff
+
+
+class SharedTranspositionTable(object):
+    """Fixed-size, sharded table of search results in shared memory.
+
+    Create it in the parent process and open it in the workers with
+    SharedTranspositionTable.attach(name, worker), giving each process
+    its own worker number (below counter_rows) for the counters.
+    """
+
+    def __init__(self, entries=1 << 18, shards=16, bucket=4, counter_rows=64,
+                 name=None, create=True, worker=0):
+        if create:
+            shard_entries = max(bucket, entries // shards // bucket * bucket)
+            entries = shard_entries * shards
+            words = HEADER + counter_rows * len(COUNTERS) + entries * 2
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=words * 8)
+            self.words = self.shm.buf.cast('q')
+            for i, value in enumerate((MAGIC, entries, shards, bucket, counter_rows)):
+                self.words[i] = value
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.words = self.shm.buf.cast('q')
+            if self.words[0] != MAGIC:
+                self.words.release()
+                self.shm.close()
+                raise ValueError('{} is not a transposition table'.format(name))
+        self.owner = create
+        self.entries = self.words[1]
+        self.shards = self.words[2]
+        self.bucket = self.words[3]
+        self.counter_rows = self.words[4]
+        self.shard_entries = self.entries // self.shards
+        self.buckets = self.shard_entries // self.bucket
+        self._base = HEADER + self.counter_rows * len(COUNTERS)
+        # numpy views for the bulk operations; probe() and store() index
+        # the memoryview, which is faster for single words
+        array = np.ndarray(self._base + 2 * self.entries, dtype=np.int64, buffer=self.shm.buf)
+        self.counters = array[HEADER:self._base].reshape(self.counter_rows, len(COUNTERS))
+        self.table = array[self._base:].reshape(self.entries, 2)
+        self.set_worker(worker)
+
+    @classmethod
+    def attach(cls, name, worker=0):
+        """Open a table created by another process."""
+        return cls(name=name, create=False, worker=worker)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def set_worker(self, worker):
+        """Select the counter row of this process."""
+        self._counter = HEADER + (worker % self.counter_rows) * len(COUNTERS)
+
+    def _slot(self, key):
+        """Return the word index of the first slot of key's bucket."""
+        shard = key % self.shards
+        bucket = (key // self.shards) % self.buckets
+        return self._base + 2 * (shard * self.shard_entries + bucket * self.bucket)
+
+    def probe(self, key):
+        """Return (depth, score, flag, move) stored for key, or None."""
+        words = self.words
+        counter = self._counter
+        words[counter] += 1
+        key &= _MASK64
+        index = self._slot(key)
+        occupied = False
+        for i in range(index, index + 2 * self.bucket, 2):
+            check = words[i]
+            data = words[i + 1]
+            if check == 0 and data == 0:
+                continue
+            if (check ^ data) & _MASK64 == key:
+                words[counter + 1] += 1
+                return unpack(data & _MASK64)
+            occupied = True
+        if occupied:
+            words[counter + 2] += 1
+        return None
+
+    def store(self, key, depth, score, flag, move=NO_MOVE):
+        """Store a result for key in its bucket."""
+        words = self.words
+        counter = self._counter
+        words[counter + 4] += 1
+        key &= _MASK64
+        index = self._slot(key)
+        target = None
+        shallowest = None
+        for i in range(index, index + 2 * self.bucket, 2):
+            check = words[i]
+            data = words[i + 1]
+            if check == 0 and data == 0:
+                if target is None:
+                    target = i
+                continue
+            if (check ^ data) & _MASK64 == key:
+                target = i
+                break
+            entry_depth = (data >> 48) & 0xff
+            if shallowest is None or entry_depth < shallowest[0]:
+                shallowest = (entry_depth, i)
+        else:
+            if target is None:
+                target = shallowest[1]
+                words[counter + 3] += 1
+        data = pack(depth, score, flag, move)
+        words[target + 1] = _signed(data)
+        words[target] = _signed(key ^ data)
+
+    def stats(self):
+        """Return the counters summed over all processes, the fill ratio
+        of the table and the hit rate of the probes."""
+        sums = self.counters.sum(axis=0)
+        totals = dict((name, int(sums[k])) for k, name in enumerate(COUNTERS))
+        used = int(np.count_nonzero(self.table.any(axis=1)))
+        totals['fill'] = used / self.entries
+        totals['hit_rate'] = totals['hits'] / totals['probes'] if totals['probes'] else 0.0
+        return totals
+
+    def clear(self):
+        """Empty the table and reset the counters."""
+        self.counters.fill(0)
+        self.table.fill(0)
+
+    def close(self):
+        """Detach from the shared memory; the creator also frees it."""
+        del self.counters, self.table
+        self.words.release()
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
@@ -0,0 +1,248 @@
+"""
+tree_checkpoint.py
+Save an MCTS tree to disk and start later searches from it.
+
+A checkpoint file starts with a 12 byte header (magic "GMTR", version,
+board width and height, side to move at the root, uint32 node count),
+then the root position, one byte per point (row * width + col, 0 empty,
+1 black, 2 white), then one 20 byte record per node in depth-first
+pre-order: the move leading to it, its number of children, the size of
+its subtree, its visits, Q and prior. The subtree of every node is a
+contiguous run of records, so a position deep in a large tree is found
+by skipping over whole subtrees, and only its own records are read from
+the memory-mapped file.
+
+Nodes with fewer than min_visits visits are saved without their
+children, which bounds the size of the file; the root and every node
+kept with its children keep all of them, so priors are not lost.
+
+A checkpoint serves any position reached from its root in the tree,
+whatever the order its stones were played in:
+
+    python tree_checkpoint.py build OUT.gmt [--moves 40,41] [--playouts N]
+        [--min-visits V]
+    python tree_checkpoint.py info OUT.gmt [--moves 40,41,31]
+"""
+
+import argparse
+import gc
+import os
+import struct
+import time
+import numpy as np
+
+MAGIC = b'GMTR'
+VERSION = 1
+FILE_HEADER = struct.Struct('<4sBBBBI')
+
+NODE_DTYPE = np.dtype([('move', '<i2'), ('children', '<u2'), ('size', '<u4'),
+                       ('visits', '<u4'), ('q', '<f4'), ('p', '<f4')])
+
+
+def write_tree(path, root, grid, side, min_visits=1):
+    """Save the tree below root, searched from the position grid (2D
+    list) with side to move; return the number of nodes written. The
+    file is replaced atomically."""
+    moves, children, visits, q, p, parent = [], [], [], [], [], []
+    stack = [(root, -1, -1)]
+    while stack:
+        node, move, up = stack.pop()
+        index = len(moves)
+        moves.append(move)
+        visits.append(node._n_visits)
+        q.append(node._Q)
+        p.append(node._P)
+        parent.append(up)
+        if index == 0 or node._n_visits >= min_visits:
+            kept = list(node._children.items())
+        else:
+            kept = []
+        children.append(len(kept))
+        for action, child in reversed(kept):
+            stack.append((child, action, index))
+    size = [1] * len(moves)
+    for index in range(len(moves) - 1, 0, -1):
+        size[parent[index]] += size[index]
+
+    nodes = np.empty(len(moves), dtype=NODE_DTYPE)
+    nodes['move'] = moves
+    nodes['children'] = children
+    nodes['size'] = size
+    nodes['visits'] = visits
+    nodes['q'] = q
+    nodes['p'] = p
+    height, width = len(grid), len(grid[0])
+    temp = path + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(FILE_HEADER.pack(MAGIC, VERSION, width, height, side, len(nodes)))
+        f.write(bytes(bytearray(stone for row in grid for stone in row)))
+        nodes.tofile(f)
+    os.replace(temp, path)
+    return len(nodes)
+
+
+class TreeCheckpoint(object):
+    """A checkpoint file, memory-mapped."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(FILE_HEADER.size)
+        magic, version, self.width, self.height, self.side, count = FILE_HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('%s is not a tree checkpoint' % path)
+        points = self.width * self.height
+        self.root = np.fromfile(path, dtype=np.uint8, count=points, offset=FILE_HEADER.size)
+        self.nodes = np.memmap(path, dtype=NODE_DTYPE, mode='r', shape=(count,),
+                               offset=FILE_HEADER.size + points)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def find(self, grid, side):
+        """Return the index of the most visited node whose position is
+        grid with side to move, or None if the tree does not reach it."""
+        if len(grid) != self.height or len(grid[0]) != self.width:
+            return None
+        stones = np.asarray(grid, dtype=np.uint8).ravel()
+        root = self.root
+        if np.any(root[root != 0] != stones[root != 0]):
+            return None
+        extra = np.flatnonzero((root == 0) & (stones != 0))
+        black = int(np.count_nonzero(stones[extra] == 1))
+        white = len(extra) - black
+        to_play = {1: black, 2: white}
+        # the moves since the root alternate, starting with self.side
+        first, second = self.side, 3 - self.side
+        if (to_play[first] != (len(extra) + 1) // 2 or to_play[second] != len(extra) // 2
+                or (second if len(extra) % 2 else first) != side):
+            return None
+        wanted = dict((int(move), int(stones[move])) for move in extra)
+        nodes = self.nodes
+        moves, children, size, visits = nodes['move'], nodes['children'], nodes['size'], nodes['visits']
+        best = None
+        # depth-first over the orders of the extra stones that the tree has
+        stack = [(0, self.side, frozenset(wanted))]
+        while stack:
+            index, turn, left = stack.pop()
+            if not left:
+                if best is None or visits[index] > visits[best]:
+                    best = index
+                continue
+            child = index + 1
+            for _ in range(int(children[index])):
+                move = int(moves[child])
+                if move in left and wanted[move] == turn:
+                    stack.append((child, 3 - turn, left - {move}))
+                child += int(size[child])
+        return best
+
+    def visits(self, index=0):
+        return int(self.nodes['visits'][index])
+
+    def tree(self, index=0, min_visits=1):
+        """Return the subtree at index as TreeNodes; nodes with fewer than
+        min_visits visits are loaded without their children."""
+        from mcts import TreeNode
+        end = index + int(self.nodes['size'][index])
+        records = self.nodes[index:end]
+        moves = records['move'].tolist()
+        children = records['children'].tolist()
+        size = records['size'].tolist()
+        visits = records['visits'].tolist()
+        q = records['q'].tolist()
+        p = records['p'].tolist()
+
+        root = TreeNode(None, p[0])
+        root._n_visits = visits[0]
+        root._Q = q[0]
+        # [node, children still to read]
+        stack = [[root, children[0]]]
+        i = 1
+        # creating many objects triggers garbage collections that walk
+        # every tree in memory, and these nodes are all kept anyway
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            while stack:
+                top = stack[-1]
+                if not top[1]:
+                    stack.pop()
+                    continue
+                top[1] -= 1
+                node = TreeNode(top[0], p[i])
+                node._n_visits = visits[i]
+                node._Q = q[i]
+                top[0]._children[moves[i]] = node
+                if children[i] and visits[i] >= min_visits:
+                    stack.append([node, children[i]])
+                    i += 1
+                else:
+                    i += size[i]
+        finally:
+            if collecting:
+                gc.enable()
+        return root
+
+
+def _parse_moves(text):
+    return [int(m) for m in text.replace(',', ' ').split()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MCTS tree checkpoints')
+    sub = parser.add_subparsers(dest='command')
+    build = sub.add_parser('build', help='search a position and save the tree')
+    build.add_argument('path')
+    build.add_argument('--moves', default='', help='moves from the empty board, e.g. 40,41')
+    build.add_argument('--size', type=int, default=9)
+    build.add_argument('--playouts', type=int, default=20000)
+    build.add_argument('--min-visits', type=int, default=2)
+    info = sub.add_parser('info', help='load a checkpoint and time it')
+    info.add_argument('path')
+    info.add_argument('--moves', default='', help='position to restore, as moves from the empty board')
+    info.add_argument('--min-visits', type=int, default=1)
+    args = parser.parse_args()
+
+    from game_board import Board
+    if args.command == 'build':
+        import warnings
+        warnings.filterwarnings("ignore")
+        from mcts import MCTSPlayer
+        board = Board(width=args.size, height=args.size)
+        board.init_board()
+        for move in _parse_moves(args.moves):
+            board.do_move(move)
+        mcts = MCTSPlayer(n_playout=args.playouts, run_time=None).mcts
+        start = time.perf_counter()
+        mcts.get_move(board)
+        searched = time.perf_counter() - start
+        start = time.perf_counter()
+        count = mcts.export_tree(args.path, board, args.min_visits)
+        saved = time.perf_counter() - start
+        print('%d playouts in %.1f s; saved %d nodes (%.1f MB) in %.2f s' % (
+            mcts.playouts, searched, count, os.path.getsize(args.path) / 1e6, saved))
+    elif args.command == 'info':
+        start = time.perf_counter()
+        checkpoint = TreeCheckpoint(args.path)
+        board = Board(width=checkpoint.width, height=checkpoint.height)
+        board.init_board()
+        for move in _parse_moves(args.moves):
+            board.do_move(move)
+        index = checkpoint.find(board.get_2d_board(), board.get_current_player())
+        if index is None:
+            print('%d nodes; the position is not in the tree' % len(checkpoint))
+            return
+        root = checkpoint.tree(index, args.min_visits)
+        elapsed = time.perf_counter() - start
+        print('%d nodes, %.1f MB; restored %d visits (node %d) in %.3f s' % (
+            len(checkpoint), os.path.getsize(args.path) / 1e6, root._n_visits, index, elapsed))
+        best = sorted(root._children.items(), key=lambda item: -item[1]._n_visits)[:5]
+        for move, node in best:
+            print('  %3d: %6d visits  Q %+.3f' % (move, node._n_visits, node._Q))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+zobrist.py
+Zobrist hashing of Gomoku positions.
+
+The random table is generated from a fixed seed, so every process that
+builds a ZobristHash for the same board size gets the same keys and
+hashes can be shared between processes and stored on disk.
+"""
+
+import random
+
+SEED = 0x5EED
+
+
+class ZobristHash(object):
+    """64-bit position hash: the XOR of one random key per (point, stone)
+    and a side-to-move key when it is white's turn."""
+
+    def __init__(self, width=9, height=9, seed=SEED):
+        rng = random.Random(seed)
+        self.width = width
+        self.height = height
+        # keys[point][stone], stone 0 (empty) hashes to 0
+        self.keys = [(0, rng.getrandbits(64), rng.getrandbits(64))
+                     for _ in range(width * height)]
+        self.turn_key = rng.getrandbits(64)
+
+    def hash_grid(self, grid, turn=1):
+        """Hash a 2D board (grid[row][col]) with turn to move."""
+        keys = self.keys
+        width = self.width
+        h = 0
+        for row, line in enumerate(grid):
+            base = row * width
+            for col, stone in enumerate(line):
+                if stone:
+                    h ^= keys[base + col][stone]
+        if turn == 2:
+            h ^= self.turn_key
+        return h
+
+    def hash_board(self, board):
+        """Hash a game_board.Board, including the side to move."""
+        keys = self.keys
+        h = 0
+        for move, stone in board.states.items():
+            h ^= keys[move][stone]
+        if board.get_current_player() == 2:
+            h ^= self.turn_key
+        return h
+
+    def update(self, h, move, stone):
+        """Return the hash after stone is played on point move (or taken
+        back from it); the side to move flips either way."""
+        return h ^ self.keys[move][stone] ^ self.turn_key